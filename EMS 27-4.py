@@ -1,444 +1,145 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import json
-import os
-import requests
-import hashlib
-import random
+from tkinter import ttk, messagebox
+import bisect
+import itertools
+import math
+import queue
+import time
+import numpy as np
 from datetime import datetime
+from ems_core import (Attempt, AttemptJournal, ChangeBus, Database, DataWatcher, Exam,
+                      ExamGenerator, ExamPreview, ExamVariant, ExportJob, GradingEngine, ImportJob,
+                      ItemAnalysis, Question, Result, ScoreStats, Student, Teacher)
 
-# Ensure data directory exists
-if not os.path.exists('data'):
-    os.makedirs('data')
+# Treeview reconciliation
 
-# Tạo file json nếu chưa tồn tại
 
-def initialize_json_files():
-    files = {
-        'users.json': {'teachers': [], 'students': []},
-        'questions.json': {'questions': []},
-        'exams.json': {'exams': []},
-        'results.json': {'results': []}
-    }
-
-    for filename, default_data in files.items():
-        filepath = os.path.join('data', filename)
-        if not os.path.exists(filepath):
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, ensure_ascii=False, indent=4)
-
-
-initialize_json_files()
-
-# Base User class
-
-class User:
-    def __init__(self, username, password, full_name):
-        self.username = username
-        # Hash the password for security
-        self.password = hashlib.sha256(password.encode()).hexdigest()
-        self.full_name = full_name
-
-    def to_dict(self):
-        return {
-            'username': self.username,
-            'password': self.password,
-            'full_name': self.full_name
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        user = cls(data['username'], '', data['full_name'])
-        user.password = data['password']  # Already hashed
-        return user
-
-# Teacher class
-
-
-class Teacher(User):
-    def __init__(self, username, password, full_name):
-        super().__init__(username, password, full_name)
-        self.role = 'teacher'
-
-    def to_dict(self):
-        data = super().to_dict()
-        data['role'] = self.role
-        return data
-
-# Student class
-
-
-class Student(User):
-    def __init__(self, username, password, full_name):
-        super().__init__(username, password, full_name)
-        self.role = 'student'
-
-    def to_dict(self):
-        data = super().to_dict()
-        data['role'] = self.role
-        return data
-
-# Question class
-
-
-class Question:
-    def __init__(self, id=None, text='', options=None, correct_answer=0, category=''):
-        self.id = id if id else self._generate_id()
-        self.text = text
-        self.options = options if options else ['', '', '', '']
-        self.correct_answer = correct_answer
-        self.category = category
-
-    def _generate_id(self):
-        return f"q_{datetime.now().strftime('%Y%m%d%H%M%S')}_{random.randint(1000, 9999)}"
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'text': self.text,
-            'options': self.options,
-            'correct_answer': self.correct_answer,
-            'category': self.category
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        return cls(
-            id=data['id'],
-            text=data['text'],
-            options=data['options'],
-            correct_answer=data['correct_answer'],
-            category=data['category']
-        )
-
-# Exam class
-
-
-class Exam:
-    def __init__(self, id=None, title='', description='', questions=None, time_limit=60):
-        self.id = id if id else self._generate_id()
-        self.title = title
-        self.description = description
-        self.questions = questions if questions else []
-        self.time_limit = time_limit  # in minutes
-
-    def _generate_id(self):
-        return f"e_{datetime.now().strftime('%Y%m%d%H%M%S')}_{random.randint(1000, 9999)}"
-
-    def add_question(self, question_id):
-        if question_id not in self.questions:
-            self.questions.append(question_id)
-
-    def remove_question(self, question_id):
-        if question_id in self.questions:
-            self.questions.remove(question_id)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'questions': self.questions,
-            'time_limit': self.time_limit
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        return cls(
-            id=data['id'],
-            title=data['title'],
-            description=data['description'],
-            questions=data['questions'],
-            time_limit=data['time_limit']
-        )
-
-# Result class
-
-
-class Result:
-    def __init__(self, student_username, exam_id, score, answers=None, date=None):
-        self.student_username = student_username
-        self.exam_id = exam_id
-        self.score = score
-        self.answers = answers if answers else {}
-        self.date = date if date else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    def to_dict(self):
-        return {
-            'student_username': self.student_username,
-            'exam_id': self.exam_id,
-            'score': self.score,
-            'answers': self.answers,
-            'date': self.date
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        return cls(
-            student_username=data['student_username'],
-            exam_id=data['exam_id'],
-            score=data['score'],
-            answers=data['answers'],
-            date=data['date']
-        )
-
-# Database handler
-
-
-class Database:
-    @staticmethod
-    def load_data(filename):
-        filepath = os.path.join('data', filename)
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Return empty data if file doesn't exist or is invalid
-            if filename == 'users.json':
-                return {'teachers': [], 'students': []}
-            elif filename == 'questions.json':
-                return {'questions': []}
-            elif filename == 'exams.json':
-                return {'exams': []}
-            elif filename == 'results.json':
-                return {'results': []}
-            return {}
+class TreeSync:
+    # Brings a Treeview in line with a list of (iid, values) rows by applying
+    # only the inserts, updates, moves and deletes that are needed, so
+    # selection and scroll position survive a refresh. A shadow copy of what was
+    # applied last avoids reading rows back from Tk. After every change each
+    # row's stripe is set from its index, only rows whose stripe flipped are
+    # touched
+    EMPTY_IID = '__empty__'
 
-    @staticmethod
-    def save_data(filename, data):
-        filepath = os.path.join('data', filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = {}  # iid -> (values, tag)
+        self.order = []
+        self.empty_values = None
 
     @staticmethod
-    def authenticate_user(username, password):
-        data = Database.load_data('users.json')
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-
-        # Check teachers
-        for teacher_data in data['teachers']:
-            if teacher_data['username'] == username and teacher_data['password'] == hashed_password:
-                return Teacher.from_dict(teacher_data)
-
-        # Check students
-        for student_data in data['students']:
-            if student_data['username'] == username and student_data['password'] == hashed_password:
-                return Student.from_dict(student_data)
-
-        return None
+    def stripe(position):
+        return 'evenrow' if position % 2 == 0 else 'oddrow'
+
+    def apply(self, rows, empty_values=None):
+        self.empty_values = empty_values
+        if not rows and empty_values is not None:
+            rows = [(self.EMPTY_IID, tuple(empty_values))]
+
+        # Start over if something else changed the tree since the last apply
+        children = list(self.tree.get_children())
+        if children != self.order:
+            if children:
+                self.tree.delete(*children)
+            self.rows = {}
+            self.order = []
+
+        wanted = [iid for iid, values in rows]
+        wanted_set = set(wanted)
+        stale = [iid for iid in self.order if iid not in wanted_set]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self.rows[iid]
+
+        # Existing rows only move when their relative order changed
+        kept = [iid for iid in self.order if iid in wanted_set]
+        reorder = kept != [iid for iid in wanted if iid in self.rows]
+
+        for position, (iid, values) in enumerate(rows):
+            values = tuple(values)
+            tag = self.stripe(position)
+            old = self.rows.get(iid)
+            if old is None:
+                self.tree.insert('', position, iid=iid, values=values, tags=(tag,))
+            else:
+                if old[0] != values:
+                    self.tree.item(iid, values=values)
+                if old[1] != tag:
+                    self.tree.item(iid, tags=(tag,))
+                if reorder:
+                    self.tree.move(iid, '', position)
+            self.rows[iid] = (values, tag)
+        self.order = wanted
+
+    def put(self, iid, values):
+        # Insert or update a single row, a new row is appended
+        if list(self.tree.get_children()) != self.order:
+            return False
+        values = tuple(values)
+        old = self.rows.get(iid)
+        if old is not None:
+            if old[0] != values:
+                self.tree.item(iid, values=values)
+                self.rows[iid] = (values, old[1])
+            return True
+        if self.EMPTY_IID in self.rows:
+            self.remove(self.EMPTY_IID)
+        tag = self.stripe(len(self.order))
+        self.tree.insert('', tk.END, iid=iid, values=values, tags=(tag,))
+        self.rows[iid] = (values, tag)
+        self.order.append(iid)
+        return True
 
-    @staticmethod
-    def add_user(user):
-        data = Database.load_data('users.json')
+    def remove(self, iid):
+        # Delete a single row and restripe the rows below it
+        if list(self.tree.get_children()) != self.order:
+            return False
+        if iid not in self.rows:
+            return True
+        position = self.order.index(iid)
+        self.tree.delete(iid)
+        del self.rows[iid]
+        del self.order[position]
+        for position in range(position, len(self.order)):
+            row_iid = self.order[position]
+            values, tag = self.rows[row_iid]
+            if tag != self.stripe(position):
+                self.tree.item(row_iid, tags=(self.stripe(position),))
+                self.rows[row_iid] = (values, self.stripe(position))
+        if not self.order and self.empty_values is not None:
+            self.put(self.EMPTY_IID, self.empty_values)
+        return True
 
-        # Check if username already exists
-        for teacher in data['teachers']:
-            if teacher['username'] == user.username:
+    def apply_events(self, events, make_row):
+        # Apply coalesced change events ({iid: event}) row by row. make_row(item)
+        # gives the (iid, values) of a changed item, or None when it is not
+        # listed (e.g. it does not match the search). Returns False when an
+        # event carries no item or the tree changed underneath, the caller then
+        # redraws the whole list
+        for iid, event in events.items():
+            if event.op == 'delete':
+                applied = self.remove(iid)
+            elif event.data is None:
                 return False
-
-        for student in data['students']:
-            if student['username'] == user.username:
+            else:
+                row = make_row(event.data)
+                applied = self.put(*row) if row else self.remove(iid)
+            if not applied:
                 return False
-
-        # Add user to appropriate list
-        if user.role == 'teacher':
-            data['teachers'].append(user.to_dict())
-        else:
-            data['students'].append(user.to_dict())
-
-        Database.save_data('users.json', data)
         return True
 
-    @staticmethod
-    def get_all_users():
-        data = Database.load_data('users.json')
-        teachers = [Teacher.from_dict(t) for t in data['teachers']]
-        students = [Student.from_dict(s) for s in data['students']]
-        return teachers, students
-
-    @staticmethod
-    def update_user(user):
-        data = Database.load_data('users.json')
-
-        if user.role == 'teacher':
-            for i, teacher in enumerate(data['teachers']):
-                if teacher['username'] == user.username:
-                    data['teachers'][i] = user.to_dict()
-                    Database.save_data('users.json', data)
-                    return True
-        else:
-            for i, student in enumerate(data['students']):
-                if student['username'] == user.username:
-                    data['students'][i] = user.to_dict()
-                    Database.save_data('users.json', data)
-                    return True
-
-        return False
-
-    @staticmethod
-    def delete_user(username, role):
-        data = Database.load_data('users.json')
-
-        if role == 'teacher':
-            data['teachers'] = [t for t in data['teachers']
-                                if t['username'] != username]
-        else:
-            data['students'] = [s for s in data['students']
-                                if s['username'] != username]
-
-        Database.save_data('users.json', data)
-
-    @staticmethod
-    def add_question(question):
-        data = Database.load_data('questions.json')
-        data['questions'].append(question.to_dict())
-        Database.save_data('questions.json', data)
-
-    @staticmethod
-    def get_all_questions():
-        data = Database.load_data('questions.json')
-        return [Question.from_dict(q) for q in data['questions']]
-
-    @staticmethod
-    def get_question_by_id(question_id):
-        data = Database.load_data('questions.json')
-        for q in data['questions']:
-            if q['id'] == question_id:
-                return Question.from_dict(q)
-        return None
-
-    @staticmethod
-    def update_question(question):
-        data = Database.load_data('questions.json')
-        for i, q in enumerate(data['questions']):
-            if q['id'] == question.id:
-                data['questions'][i] = question.to_dict()
-                Database.save_data('questions.json', data)
-                return True
-        return False
-
-    @staticmethod
-    def delete_question(question_id):
-        data = Database.load_data('questions.json')
-        data['questions'] = [
-            q for q in data['questions'] if q['id'] != question_id]
-        Database.save_data('questions.json', data)
-
-        # Also remove this question from any exams
-        exams_data = Database.load_data('exams.json')
-        for exam in exams_data['exams']:
-            if question_id in exam['questions']:
-                exam['questions'].remove(question_id)
-        Database.save_data('exams.json', exams_data)
-
-    @staticmethod
-    def add_exam(exam):
-        data = Database.load_data('exams.json')
-        data['exams'].append(exam.to_dict())
-        Database.save_data('exams.json', data)
-
-    @staticmethod
-    def get_all_exams():
-        data = Database.load_data('exams.json')
-        return [Exam.from_dict(e) for e in data['exams']]
-
-    @staticmethod
-    def get_exam_by_id(exam_id):
-        data = Database.load_data('exams.json')
-        for e in data['exams']:
-            if e['id'] == exam_id:
-                return Exam.from_dict(e)
-        return None
-
-    @staticmethod
-    def update_exam(exam):
-        data = Database.load_data('exams.json')
-        for i, e in enumerate(data['exams']):
-            if e['id'] == exam.id:
-                data['exams'][i] = exam.to_dict()
-                Database.save_data('exams.json', data)
-                return True
-        return False
-
-    @staticmethod
-    def delete_exam(exam_id):
-        data = Database.load_data('exams.json')
-        data['exams'] = [e for e in data['exams'] if e['id'] != exam_id]
-        Database.save_data('exams.json', data)
-
-        # Also remove results for this exam
-        results_data = Database.load_data('results.json')
-        results_data['results'] = [
-            r for r in results_data['results'] if r['exam_id'] != exam_id]
-        Database.save_data('results.json', results_data)
-
-    @staticmethod
-    def add_result(result):
-        data = Database.load_data('results.json')
-        data['results'].append(result.to_dict())
-        Database.save_data('results.json', data)
-
-    @staticmethod
-    def get_results_by_student(student_username):
-        data = Database.load_data('results.json')
-        return [Result.from_dict(r) for r in data['results'] if r['student_username'] == student_username]
-
-    @staticmethod
-    def get_results_by_exam(exam_id):
-        data = Database.load_data('results.json')
-        return [Result.from_dict(r) for r in data['results'] if r['exam_id'] == exam_id]
-
-# Data crawler
-
-
-class DataCrawler:
-    @staticmethod
-    def fetch_trivia_questions(amount=10, category=None):
-        """Fetch trivia questions from Open Trivia Database API"""
-        url = "https://opentdb.com/api.php?amount=50&difficulty=easy&type=multiple"
-        params = {
-            "amount": amount,
-            "type": "multiple"
-        }
-
-        if category:
-            params["category"] = category
-
-        try:
-            response = requests.get(url, params=params)
-            data = response.json()
-
-            if data["response_code"] == 0:
-                questions = []
-                for item in data["results"]:
-                    # Create a list with all options, correct answer first
-                    options = [item["correct_answer"]] + \
-                        item["incorrect_answers"]
-                    # Shuffle the options
-                    random.shuffle(options)
-                    # Find the index of the correct answer
-                    correct_index = options.index(item["correct_answer"])
-
-                    question = Question(
-                        text=item["question"],
-                        options=options,
-                        correct_answer=correct_index,
-                        category=item["category"]
-                    )
-                    questions.append(question)
-
-                return questions
-            else:
-                print(f"API Error: {data['response_code']}")
-                return []
-        except Exception as e:
-            print(f"Error fetching questions: {e}")
-            return []
-
 # Main Application
 
 
 class ExamApp(tk.Tk):
+    # How often change events from Database and the file watcher are applied
+    CHANGE_POLL_MS = 250
+    # Larger bursts of row events for one entity are applied as one reload
+    MAX_ROW_EVENTS = 200
+
     def __init__(self):
         super().__init__()
         self.title("Exam Management System")
@@ -453,6 +154,15 @@ class ExamApp(tk.Tk):
 
         # Initialize frames dictionary
         self.frames = {}
+        self.current_frame = None
+
+        # Change events arrive on other threads and are applied from the Tk loop
+        self.changes = queue.Queue()
+        ChangeBus.subscribe(self.changes.put)
+        self.watcher = DataWatcher()
+        self.watcher.start()
+        self.after(ExamApp.CHANGE_POLL_MS, self.poll_changes)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Show login page
         self.show_frame(LoginPage)
@@ -467,6 +177,37 @@ class ExamApp(tk.Tk):
         self.frames[page_class] = frame
         frame.grid(row=0, column=0, sticky="nsew")
         frame.tkraise()
+        self.current_frame = frame
+
+    def poll_changes(self):
+        # A burst of events is coalesced into the last event per row, as
+        # {entity: {id: event}}, or None for an entity that needs a full reload
+        # (a 'reload' event or more than MAX_ROW_EVENTS rows). Only the page on
+        # screen is told, the others are rebuilt when shown
+        changes = {}
+        try:
+            while True:
+                event = self.changes.get_nowait()
+                if event.op == 'reload' or event.id is None:
+                    changes[event.entity] = None
+                elif changes.setdefault(event.entity, {}) is not None:
+                    changes[event.entity][event.id] = event
+        except queue.Empty:
+            pass
+        for entity, events in changes.items():
+            if events is not None and len(events) > ExamApp.MAX_ROW_EVENTS:
+                changes[entity] = None
+
+        try:
+            if changes and hasattr(self.current_frame, 'on_data_changed'):
+                self.current_frame.on_data_changed(changes)
+        finally:
+            self.after(ExamApp.CHANGE_POLL_MS, self.poll_changes)
+
+    def on_close(self):
+        ChangeBus.unsubscribe(self.changes.put)
+        self.watcher.stop()
+        self.destroy()
 
 # Login Page
 
@@ -980,6 +721,7 @@ class TeacherDashboard(tk.Frame):
             yscrollcommand=scrollbar.set,
             selectmode="browse"
         )
+        self.student_sync = TreeSync(self.student_tree)
         
         self.student_tree.heading('username', text='Username')
         self.student_tree.heading('full_name', text='Full Name')
@@ -1118,6 +860,7 @@ class TeacherDashboard(tk.Frame):
             yscrollcommand=scrollbar.set,
             selectmode="browse"
         )
+        self.question_sync = TreeSync(self.question_tree)
         
         self.question_tree.heading('id', text='ID')
         self.question_tree.heading('text', text='Question')
@@ -1343,6 +1086,7 @@ class TeacherDashboard(tk.Frame):
             yscrollcommand=scrollbar.set,
             selectmode="browse"
         )
+        self.exam_sync = TreeSync(self.exam_tree)
         
         self.exam_tree.heading('id', text='ID')
         self.exam_tree.heading('title', text='Title')
@@ -1489,13 +1233,16 @@ class TeacherDashboard(tk.Frame):
         self.preview_exam_time.pack(anchor=tk.W, pady=(0, 10))
         
         # Questions preview
-        tk.Label(
+        self.preview_questions_label = tk.Label(
             preview_frame, 
             text="Questions:", 
             bg="white",
             fg="#2d3436",
-            font=("Segoe UI", 10, "bold")
-        ).pack(anchor=tk.W, pady=(0, 5))
+            font=("Segoe UI", 10, "bold"),
+            wraplength=350,
+            justify=tk.LEFT
+        )
+        self.preview_questions_label.pack(anchor=tk.W, pady=(0, 5))
         
         # Questions list with scrollbar
         questions_container = tk.Frame(preview_frame, bg="white")
@@ -1599,6 +1346,70 @@ class TeacherDashboard(tk.Frame):
         )
         clear_button.pack(side=tk.LEFT)
 
+        # Date and score range filters
+        range_frame = tk.Frame(container, bg="#f5f7fa")
+        range_frame.pack(fill=tk.X, pady=(0, 10))
+
+        range_entry_style = {
+            "font": ("Segoe UI", 10),
+            "bd": 1,
+            "relief": "solid",
+            "highlightbackground": "#bdc3c7",
+            "highlightcolor": "#3498db",
+            "highlightthickness": 1
+        }
+
+        tk.Label(
+            range_frame,
+            text="Date from (YYYY-MM-DD):",
+            bg="#f5f7fa",
+            fg="#2d3436",
+            font=("Segoe UI", 10)
+        ).pack(side=tk.LEFT)
+        self.date_from_entry = tk.Entry(range_frame, width=12, **range_entry_style)
+        self.date_from_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(
+            range_frame,
+            text="to:",
+            bg="#f5f7fa",
+            fg="#2d3436",
+            font=("Segoe UI", 10)
+        ).pack(side=tk.LEFT)
+        self.date_to_entry = tk.Entry(range_frame, width=12, **range_entry_style)
+        self.date_to_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(
+            range_frame,
+            text="Score from:",
+            bg="#f5f7fa",
+            fg="#2d3436",
+            font=("Segoe UI", 10)
+        ).pack(side=tk.LEFT, padx=(15, 0))
+        self.min_score_entry = tk.Entry(range_frame, width=6, **range_entry_style)
+        self.min_score_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(
+            range_frame,
+            text="to:",
+            bg="#f5f7fa",
+            fg="#2d3436",
+            font=("Segoe UI", 10)
+        ).pack(side=tk.LEFT)
+        self.max_score_entry = tk.Entry(range_frame, width=6, **range_entry_style)
+        self.max_score_entry.pack(side=tk.LEFT, padx=5)
+
+        # Score statistics of the filtered exam or student
+        self.results_stats_label = tk.Label(
+            container,
+            text="",
+            bg="#f5f7fa",
+            fg="#2d3436",
+            font=("Segoe UI", 9),
+            anchor="w"
+        )
+        self.results_stats_label.pack(fill=tk.X, pady=(0, 5))
+
         # Results list container
         list_container = tk.Frame(container, bg="white", bd=1, relief="solid", highlightbackground="#dfe6e9")
         list_container.pack(fill=tk.BOTH, expand=True)
@@ -1615,6 +1426,9 @@ class TeacherDashboard(tk.Frame):
             yscrollcommand=scrollbar.set,
             selectmode="browse"
         )
+        self.results_sync = TreeSync(self.results_tree)
+        # Exam ids of the listed results, so a details lookup reads one shard
+        self.result_exam_ids = {}
         
         self.results_tree.heading('student', text='Student')
         self.results_tree.heading('exam', text='Exam')
@@ -1661,6 +1475,17 @@ class TeacherDashboard(tk.Frame):
             **button_style
         )
         export_button.pack(side=tk.LEFT, padx=5)
+
+        analysis_button = tk.Button(
+            buttons_frame,
+            text="Item Analysis",
+            command=self.show_item_analysis,
+            bg="#9b59b6",
+            fg="white",
+            activebackground="#8e44ad",
+            **button_style
+        )
+        analysis_button.pack(side=tk.LEFT, padx=5)
         
         refresh_button = tk.Button(
             buttons_frame, 
@@ -1678,23 +1503,58 @@ class TeacherDashboard(tk.Frame):
         # Load results
         self.load_results()
 
+    def on_data_changed(self, changes):
+        # Called by ExamApp with the changes since its last poll. Row events
+        # only touch their rows; a reload redraws the list with its current
+        # search or filter still applied
+        if 'user' in changes:
+            if (changes['user'] is None or
+                    not self.student_sync.apply_events(changes['user'], self.student_row)):
+                self.search_students()
+        if 'question' in changes:
+            if (changes['question'] is None or
+                    not self.question_sync.apply_events(changes['question'], self.question_row)):
+                self.search_questions()
+        if 'exam' in changes:
+            if (changes['exam'] is None or
+                    not self.exam_sync.apply_events(changes['exam'], self.exam_row)):
+                self.search_exams()
+        if 'exam' in changes or 'user' in changes:
+            self.update_filter_choices(changes)
+        if changes.keys() & {'result', 'exam', 'user'}:
+            self.update_results(changes)
+
+    def student_row(self, user):
+        search_term = self.student_search_entry.get().strip().lower()
+        if user.role != 'student':
+            return None
+        if search_term and not (search_term in user.username.lower() or
+                                search_term in user.full_name.lower()):
+            return None
+        return (user.username, (user.username, user.full_name))
+
+    def question_row(self, question):
+        search_term = self.question_search_entry.get().strip().lower()
+        if search_term and not (search_term in question.text.lower() or
+                                search_term in question.category.lower()):
+            return None
+        return self.question_rows([question])[0]
+
+    def exam_row(self, exam):
+        search_term = self.exam_search_entry.get().strip().lower()
+        if not (search_term in exam.title.lower() or search_term in exam.description.lower()):
+            return None
+        return (exam.id, (exam.id, exam.title, len(exam.questions)))
+
     def load_students(self):
         try:
-            # Clear existing items with animation effect
-            for item in self.student_tree.get_children():
-                self.student_tree.delete(item)
-            
-            # Show loading state
-            self.update()
-            
             # Get all users
             teachers, students = Database.get_all_users()
 
-            # Add students to the tree with alternating colors
-            for i, student in enumerate(students):
-                self.student_tree.insert('', tk.END, values=(
-                    student.username, student.full_name),
-                    tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+            # Only changed rows are touched, keyed by username
+            self.student_sync.apply([
+                (student.username, (student.username, student.full_name))
+                for student in students])
                 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load students: {str(e)}")
@@ -1707,13 +1567,6 @@ class TeacherDashboard(tk.Frame):
             return
             
         try:
-            # Clear existing items
-            for item in self.student_tree.get_children():
-                self.student_tree.delete(item)
-                
-            # Show searching state
-            self.update()
-            
             # Get all users
             teachers, students = Database.get_all_users()
 
@@ -1723,14 +1576,10 @@ class TeacherDashboard(tk.Frame):
                 if (search_term in student.username.lower() or
                     search_term in student.full_name.lower()):
                     matches.append(student)
-                    
-            if not matches:
-                self.student_tree.insert('', tk.END, values=("No results found", ""))
-            else:
-                for i, student in enumerate(matches):
-                    self.student_tree.insert('', tk.END, values=(
-                        student.username, student.full_name),
-                        tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+
+            self.student_sync.apply([
+                (student.username, (student.username, student.full_name))
+                for student in matches], empty_values=("No results found", ""))
                         
         except Exception as e:
             messagebox.showerror("Error", f"Search failed: {str(e)}")
@@ -1757,7 +1606,6 @@ class TeacherDashboard(tk.Frame):
                 
                 if Database.add_user(student):
                     messagebox.showinfo("Success", "Student added successfully")
-                    self.load_students()
                 else:
                     messagebox.showerror("Error", "Username already exists")
                     
@@ -1794,14 +1642,13 @@ class TeacherDashboard(tk.Frame):
                     if len(password) < 6:
                         messagebox.showwarning("Warning", "Password must be at least 6 characters")
                         return
-                    student.password = hashlib.sha256(password.encode()).hexdigest()
+                    student.password = Student.hash_password(password)
 
                 # Show processing state
                 self.update()
                 
                 if Database.update_user(student):
                     messagebox.showinfo("Success", "Student updated successfully")
-                    self.load_students()
                 else:
                     messagebox.showerror("Error", "Failed to update student")
                     
@@ -1830,26 +1677,21 @@ class TeacherDashboard(tk.Frame):
                 
                 Database.delete_user(username, 'student')
                 messagebox.showinfo("Success", "Student deleted successfully")
-                self.load_students()
                 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to delete student: {str(e)}")
 
+    def question_rows(self, questions):
+        rows = []
+        for question in questions:
+            text = question.text[:50] + "..." if len(question.text) > 50 else question.text
+            rows.append((question.id, (question.id, text, question.category)))
+        return rows
+
     def load_questions(self):
         try:
-            for item in self.question_tree.get_children():
-                self.question_tree.delete(item)
-                
-            # Show loading state
-            self.update()
-            
             questions = Database.get_all_questions()
-            
-            for i, question in enumerate(questions):
-                text = question.text[:50] + "..." if len(question.text) > 50 else question.text
-                self.question_tree.insert('', tk.END, values=(
-                    question.id, text, question.category),
-                    tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+            self.question_sync.apply(self.question_rows(questions))
                     
             self.question_tree.bind('<<TreeviewSelect>>', self.on_question_select)
             
@@ -1892,13 +1734,6 @@ class TeacherDashboard(tk.Frame):
             return
             
         try:
-            for item in self.question_tree.get_children():
-                self.question_tree.delete(item)
-                
-            # Show searching state
-            self.question_tree.insert('', tk.END, values=("Searching...", "", ""))
-            self.update()
-            
             questions = Database.get_all_questions()
             matches = []
             
@@ -1906,15 +1741,9 @@ class TeacherDashboard(tk.Frame):
                 if (search_term in question.text.lower() or
                     search_term in question.category.lower()):
                     matches.append(question)
-                    
-            if not matches:
-                self.question_tree.insert('', tk.END, values=("No results found", "", ""))
-            else:
-                for i, question in enumerate(matches):
-                    text = question.text[:50] + "..." if len(question.text) > 50 else question.text
-                    self.question_tree.insert('', tk.END, values=(
-                        question.id, text, question.category),
-                        tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+
+            self.question_sync.apply(self.question_rows(matches),
+                                     empty_values=("No results found", "", ""))
                         
         except Exception as e:
             messagebox.showerror("Error", f"Search failed: {str(e)}")
@@ -1939,7 +1768,6 @@ class TeacherDashboard(tk.Frame):
                 
                 Database.add_question(question)
                 messagebox.showinfo("Success", "Question added successfully")
-                self.load_questions()
                 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to add question: {str(e)}")
@@ -1967,6 +1795,8 @@ class TeacherDashboard(tk.Frame):
                     messagebox.showwarning("Warning", "All fields are required")
                     return
                     
+                key_changed = question.correct_answer != correct_answer
+
                 question.text = text
                 question.options = options
                 question.correct_answer = correct_answer
@@ -1977,8 +1807,15 @@ class TeacherDashboard(tk.Frame):
                 self.update()
                 
                 if Database.update_question(question):
-                    messagebox.showinfo("Success", "Question updated successfully")
-                    self.load_questions()
+                    message = "Question updated successfully"
+                    # Stored scores of exams using this question are now stale
+                    if key_changed:
+                        counts = Database.regrade_question(question.id)
+                        message += f"\n{counts['changed']} result score(s) were regraded"
+                        if counts['skipped']:
+                            message += (f"\n{counts['skipped']} result(s) were left as they were, "
+                                        f"the questions they were taken with changed")
+                    messagebox.showinfo("Success", message)
                 else:
                     messagebox.showerror("Error", "Failed to update question")
                     
@@ -2007,75 +1844,30 @@ class TeacherDashboard(tk.Frame):
                 
                 Database.delete_question(question_id)
                 messagebox.showinfo("Success", "Question deleted successfully")
-                self.load_questions()
                 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to delete question: {str(e)}")
 
     def import_questions(self):
         try:
+            # The dialog runs the import in the background and reports the outcome
             dialog = ImportQuestionsDialog(self)
             if dialog.result:
-                amount, category = dialog.result
-                
-                # Validate amount
-                if not amount or amount <= 0 or amount > 50:
-                    messagebox.showwarning("Warning", "Please enter a valid number between 1-50")
-                    return
-                
-                # Custom progress dialog
-                progress = tk.Toplevel()
-                progress.title("Importing Questions")
-                progress.geometry("300x100")
-                progress.resizable(False, False)
-                
-                tk.Label(progress, text="Importing questions...").pack(pady=10)
-                progress_bar = ttk.Progressbar(progress, length=250, mode='indeterminate')
-                progress_bar.pack()
-                progress_bar.start()
-                self.update()
-                
-                questions = DataCrawler.fetch_trivia_questions(amount, category)
-                
-                if questions:
-                    success_count = 0
-                    for question in questions:
-                        try:
-                            Database.add_question(question)
-                            success_count += 1
-                        except:
-                            continue
-                            
-                    progress.destroy()
-                    messagebox.showinfo(
-                        "Success", 
-                        f"Successfully imported {success_count}/{len(questions)} questions"
-                    )
-                    self.load_questions()
-                else:
-                    progress.destroy()
-                    messagebox.showerror("Error", "Failed to import questions")
-                    
+                success_count, total = dialog.result
+                messagebox.showinfo(
+                    "Success",
+                    f"Successfully imported {success_count}/{total} questions"
+                    f" ({total - success_count} duplicates skipped)"
+                )
+
         except Exception as e:
-            if 'progress' in locals():
-                progress.destroy()
             messagebox.showerror("Error", f"Import failed: {str(e)}")
 
     def load_exams(self):
         try:
-            for item in self.exam_tree.get_children():
-                self.exam_tree.delete(item)
-                
-            # Show loading state
-            #self.exam_tree.insert('', tk.END, values=("Loading...", "", ""))
-            self.update()
-            
             exams = Database.get_all_exams()
-            
-            for i, exam in enumerate(exams):
-                self.exam_tree.insert('', tk.END, values=(
-                    exam.id, exam.title, len(exam.questions)),
-                    tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+            self.exam_sync.apply([
+                (exam.id, (exam.id, exam.title, len(exam.questions))) for exam in exams])
                     
             self.exam_tree.bind('<<TreeviewSelect>>', self.on_exam_select)
             
@@ -2094,24 +1886,23 @@ class TeacherDashboard(tk.Frame):
                 return
 
             exam_id = exam_values[0]
-            exam = Database.get_exam_by_id(exam_id)
+            preview = ExamPreview.for_exam(exam_id)
             
-            if not exam:
+            if not preview:
                 return
 
             # Update preview with animation
-            self.preview_exam_title.config(text=exam.title)
-            self.preview_exam_desc.config(text=exam.description)
-            self.preview_exam_time.config(text=f"{exam.time_limit} minutes")
+            self.preview_exam_title.config(text=preview.title)
+            self.preview_exam_desc.config(text=preview.description)
+            self.preview_exam_time.config(text=f"{preview.time_limit} minutes")
+            self.preview_questions_label.config(
+                text=f"Questions ({preview.question_count}): {preview.format_categories()}"
+                if preview.categories else "Questions:")
             
             # Clear and update questions list
             self.preview_questions_list.delete(0, tk.END)
-            
-            for question_id in exam.questions:
-                question = Database.get_question_by_id(question_id)
-                if question:
-                    text = question.text[:50] + "..." if len(question.text) > 50 else question.text
-                    self.preview_questions_list.insert(tk.END, text)
+            if preview.question_texts:
+                self.preview_questions_list.insert(tk.END, *preview.question_texts)
                     
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load exam details: {str(e)}")
@@ -2120,14 +1911,6 @@ class TeacherDashboard(tk.Frame):
         try:
             search_term = self.exam_search_entry.get().strip().lower()
             
-            # Clear existing items with animation
-            for item in self.exam_tree.get_children():
-                self.exam_tree.delete(item)
-                
-            # Show searching state
-            self.exam_tree.insert('', tk.END, values=("Searching...", "", ""))
-            self.update()
-            
             exams = Database.get_all_exams()
             matches = []
             
@@ -2135,14 +1918,10 @@ class TeacherDashboard(tk.Frame):
                 if (search_term in exam.title.lower() or 
                     search_term in exam.description.lower()):
                     matches.append(exam)
-                    
-            if not matches:
-                self.exam_tree.insert('', tk.END, values=("No results found", "", ""))
-            else:
-                for i, exam in enumerate(matches):
-                    self.exam_tree.insert('', tk.END, values=(
-                        exam.id, exam.title, len(exam.questions)),
-                        tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+
+            self.exam_sync.apply([
+                (exam.id, (exam.id, exam.title, len(exam.questions))) for exam in matches],
+                empty_values=("No results found", "", ""))
                         
         except Exception as e:
             messagebox.showerror("Error", f"Search failed: {str(e)}")
@@ -2194,7 +1973,6 @@ class TeacherDashboard(tk.Frame):
                     "Exam added successfully",
                     icon='info'
                 )
-                self.load_exams()
                 
         except Exception as e:
             if 'processing_window' in locals():
@@ -2268,7 +2046,6 @@ class TeacherDashboard(tk.Frame):
                         "Exam updated successfully",
                         icon='info'
                     )
-                    self.load_exams()
                 else:
                     processing_window.destroy()
                     messagebox.showerror(
@@ -2323,7 +2100,6 @@ class TeacherDashboard(tk.Frame):
                     "Exam deleted successfully",
                     icon='info'
                 )
-                self.load_exams()
                 
         except Exception as e:
             if 'processing_window' in locals():
@@ -2341,15 +2117,18 @@ class TeacherDashboard(tk.Frame):
             self.student_filter_combobox['values'] = ["Loading..."]
             self.update()
             
+            # Combobox positions map to ids, None means no filter
             exams = Database.get_all_exams()
-            exam_titles = ["All Exams"] + [exam.title for exam in exams]
-            self.exam_filter_combobox['values'] = exam_titles
+            self.exam_filter_titles = ["All Exams"] + [exam.title for exam in exams]
+            self.exam_filter_ids = [None] + [exam.id for exam in exams]
+            self.exam_filter_combobox['values'] = self.exam_filter_titles
             self.exam_filter_combobox.current(0)
 
             teachers, students = Database.get_all_users()
-            student_names = ["All Students"] + \
-                [f"{student.full_name} ({student.username})" for student in students]
-            self.student_filter_combobox['values'] = student_names
+            self.student_filter_names = ["All Students"] + \
+                [self.student_choice(student) for student in students]
+            self.student_filter_ids = [None] + [student.username for student in students]
+            self.student_filter_combobox['values'] = self.student_filter_names
             self.student_filter_combobox.current(0)
             
         except Exception as e:
@@ -2359,38 +2138,160 @@ class TeacherDashboard(tk.Frame):
                 icon='error'
             )
 
+    @staticmethod
+    def student_choice(user):
+        return f"{user.full_name} ({user.username})" if user.role == 'student' else None
+
+    @staticmethod
+    def merge_choices(ids, labels, events, label_of):
+        # Apply row events to a combobox's id and label lists in place.
+        # label_of(item) is None for items that are not listed. Returns False
+        # when an event carries no item
+        for item_id, event in events.items():
+            label = None
+            if event.op != 'delete':
+                if event.data is None:
+                    return False
+                label = label_of(event.data)
+            if item_id in ids:
+                position = ids.index(item_id)
+                if label is None:
+                    del ids[position]
+                    del labels[position]
+                else:
+                    labels[position] = label
+            elif label is not None:
+                ids.append(item_id)
+                labels.append(label)
+        return True
+
+    def update_filter_choices(self, changes):
+        # Keep the filter lists in step with exam and student changes, the
+        # chosen exam and student stay selected
+        try:
+            exam_id, student_username = self.selected_filter_ids()
+            if 'exam' in changes:
+                if (changes['exam'] is None or
+                        not self.merge_choices(self.exam_filter_ids, self.exam_filter_titles,
+                                               changes['exam'], lambda exam: exam.title)):
+                    exams = Database.get_all_exams()
+                    self.exam_filter_titles = ["All Exams"] + [exam.title for exam in exams]
+                    self.exam_filter_ids = [None] + [exam.id for exam in exams]
+                self.exam_filter_combobox['values'] = self.exam_filter_titles
+                self.exam_filter_combobox.current(
+                    self.exam_filter_ids.index(exam_id) if exam_id in self.exam_filter_ids else 0)
+            if 'user' in changes:
+                if (changes['user'] is None or
+                        not self.merge_choices(self.student_filter_ids, self.student_filter_names,
+                                               changes['user'], self.student_choice)):
+                    teachers, students = Database.get_all_users()
+                    self.student_filter_names = ["All Students"] + \
+                        [self.student_choice(student) for student in students]
+                    self.student_filter_ids = [None] + [student.username for student in students]
+                self.student_filter_combobox['values'] = self.student_filter_names
+                self.student_filter_combobox.current(
+                    self.student_filter_ids.index(student_username)
+                    if student_username in self.student_filter_ids else 0)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load filter data: {str(e)}")
+
+    def selected_filter_ids(self):
+        exam_index = self.exam_filter_combobox.current()
+        student_index = self.student_filter_combobox.current()
+        exam_id = self.exam_filter_ids[exam_index] if exam_index > 0 else None
+        student_username = self.student_filter_ids[student_index] if student_index > 0 else None
+        return exam_id, student_username
+
+    def show_results(self, results, empty_message):
+        # Titles and names are kept for the rows added later by change events
+        self.exam_titles = {exam.id: exam.title for exam in Database.get_all_exams()}
+        teachers, students = Database.get_all_users()
+        self.student_names = {student.username: student.full_name for student in students}
+
+        rows = []
+        self.result_exam_ids = {}
+        for result in results:
+            row = self.result_row(result, check_query=False)
+            if row:
+                rows.append(row)
+
+        self.results_sync.apply(rows, empty_values=(empty_message, "", "", ""))
+
+    def result_row(self, result, check_query=True):
+        # The item id is the result id, so details lookups are exact
+        if check_query and not self.matches_results_query(result):
+            return None
+        student_name = self.student_names.get(result.student_username)
+        exam_title = self.exam_titles.get(result.exam_id)
+        if student_name is None or exam_title is None:
+            return None
+        self.result_exam_ids[result.id] = result.exam_id
+        return (result.id, (student_name, exam_title, f"{result.score}%", result.date))
+
+    def matches_results_query(self, result):
+        # The same test Database.query_results applies
+        query = self.results_query
+        if query.get('exam_id') is not None and result.exam_id != query['exam_id']:
+            return False
+        if (query.get('student_username') is not None and
+                result.student_username != query['student_username']):
+            return False
+        if query.get('date_from') and result.date < query['date_from']:
+            return False
+        date_to = query.get('date_to')
+        if date_to and len(date_to) <= 10:
+            date_to += ' 23:59:59'
+        if date_to and result.date > date_to:
+            return False
+        if query.get('min_score') is not None and result.score < query['min_score']:
+            return False
+        if query.get('max_score') is not None and result.score > query['max_score']:
+            return False
+        return True
+
+    def update_results(self, changes):
+        # New results are added as rows. Exams and students only matter here
+        # when they are renamed or deleted, which redraws the query once
+        try:
+            redraw = changes.get('result', {}) is None
+            for entity, names, label_of in (
+                    ('exam', self.exam_titles, lambda exam: exam.title),
+                    ('user', self.student_names,
+                     lambda user: user.full_name if user.role == 'student' else None)):
+                events = changes.get(entity, {})
+                if events is None:
+                    redraw = True
+                    continue
+                for item_id, event in events.items():
+                    if event.op == 'delete' or event.data is None:
+                        redraw = redraw or item_id in names or event.data is None
+                        continue
+                    label = label_of(event.data)
+                    if label is None:
+                        continue
+                    if item_id in names and names[item_id] != label:
+                        redraw = True
+                    names[item_id] = label
+
+            if not redraw and 'result' in changes:
+                redraw = not self.results_sync.apply_events(changes['result'], self.result_row)
+            if redraw:
+                self.refresh_results()
+            elif 'result' in changes:
+                self.update_results_stats(self.results_query.get('exam_id'),
+                                          self.results_query.get('student_username'))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to refresh results: {str(e)}")
+
     def load_results(self):
         try:
-            # Clear existing items with animation
-            for item in self.results_tree.get_children():
-                self.results_tree.delete(item)
-                
+            self.results_query = {}
+            self.results_empty_message = "No results found"
+
             # Show loading state
-            #self.results_tree.insert('', tk.END, values=("Loading...", "", "", ""))
             self.update()
-            
-            exams = {exam.id: exam for exam in Database.get_all_exams()}
-            teachers, students = Database.get_all_users()
-            students_dict = {student.username: student for student in students}
 
-            results_data = Database.load_data('results.json')
-            
-            if not results_data['results']:
-                self.results_tree.insert('', tk.END, values=("No results found", "", "", ""))
-                return
-                
-            for i, result_data in enumerate(results_data['results']):
-                result = Result.from_dict(result_data)
-                student = students_dict.get(result.student_username)
-                exam = exams.get(result.exam_id)
-
-                if student and exam:
-                    self.results_tree.insert('', tk.END, values=(
-                        student.full_name, 
-                        exam.title, 
-                        f"{result.score}%", 
-                        result.date
-                    ), tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+            self.show_results(Database.query_results(), self.results_empty_message)
                     
         except Exception as e:
             messagebox.showerror(
@@ -2401,47 +2302,42 @@ class TeacherDashboard(tk.Frame):
 
     def filter_results(self):
         try:
-            exam_filter = self.exam_filter_var.get()
-            student_filter = self.student_filter_var.get()
-            
-            # Clear existing items with animation
-            for item in self.results_tree.get_children():
-                self.results_tree.delete(item)
-                
+            exam_id, student_username = self.selected_filter_ids()
+
+            date_from = self.date_from_entry.get().strip() or None
+            date_to = self.date_to_entry.get().strip() or None
+            for value in (date_from, date_to):
+                if value:
+                    try:
+                        datetime.strptime(value[:10], '%Y-%m-%d')
+                    except ValueError:
+                        messagebox.showwarning("Warning", "Dates must use the YYYY-MM-DD format")
+                        return
+
+            try:
+                min_score = float(self.min_score_entry.get()) if self.min_score_entry.get().strip() else None
+                max_score = float(self.max_score_entry.get()) if self.max_score_entry.get().strip() else None
+            except ValueError:
+                messagebox.showwarning("Warning", "Scores must be numbers")
+                return
+
             # Show filtering state
-            self.results_tree.insert('', tk.END, values=("Filtering...", "", "", ""))
             self.update()
-            
-            exams = {exam.id: exam for exam in Database.get_all_exams()}
-            teachers, students = Database.get_all_users()
-            students_dict = {student.username: student for student in students}
 
-            results_data = Database.load_data('results.json')
-            matches = []
-            
-            for result_data in results_data['results']:
-                result = Result.from_dict(result_data)
-                student = students_dict.get(result.student_username)
-                exam = exams.get(result.exam_id)
-
-                if student and exam:
-                    exam_match = (exam_filter == "All Exams" or exam.title == exam_filter)
-                    student_match = (student_filter == "All Students" or 
-                                    f"{student.full_name} ({student.username})" == student_filter)
-                    
-                    if exam_match and student_match:
-                        matches.append((student, exam, result))
-                        
-            if not matches:
-                self.results_tree.insert('', tk.END, values=("No matching results", "", "", ""))
-            else:
-                for i, (student, exam, result) in enumerate(matches):
-                    self.results_tree.insert('', tk.END, values=(
-                        student.full_name, 
-                        exam.title, 
-                        f"{result.score}%", 
-                        result.date
-                    ), tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+            # The index only touches results of the selected exam or student
+            self.results_query = {
+                'exam_id': exam_id,
+                'student_username': student_username,
+                'date_from': date_from,
+                'date_to': date_to,
+                'min_score': min_score,
+                'max_score': max_score
+            }
+            self.results_empty_message = "No matching results"
+            matches = Database.query_results(**self.results_query)
+
+            self.update_results_stats(exam_id, student_username)
+            self.show_results(matches, self.results_empty_message)
                     
         except Exception as e:
             messagebox.showerror(
@@ -2450,10 +2346,37 @@ class TeacherDashboard(tk.Frame):
                 icon='error'
             )
 
+    def refresh_results(self):
+        # Re-run the query on screen, e.g. after new results came in
+        try:
+            self.update_results_stats(self.results_query.get('exam_id'),
+                                      self.results_query.get('student_username'))
+            self.show_results(Database.query_results(**self.results_query),
+                              self.results_empty_message)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to refresh results: {str(e)}")
+
+    def update_results_stats(self, exam_id, student_username):
+        # Read from the materialized aggregates instead of scanning results
+        if exam_id is not None:
+            summary = ScoreStats.for_exam(exam_id)
+            self.results_stats_label.config(
+                text=f"Exam statistics - {ScoreStats.format_summary(summary)}")
+        elif student_username is not None:
+            summary = ScoreStats.for_student(student_username)
+            self.results_stats_label.config(
+                text=f"Student statistics - {ScoreStats.format_summary(summary)}")
+        else:
+            self.results_stats_label.config(text="")
+
     def clear_result_filters(self):
         try:
             self.exam_filter_combobox.current(0)
             self.student_filter_combobox.current(0)
+            for entry in (self.date_from_entry, self.date_to_entry,
+                          self.min_score_entry, self.max_score_entry):
+                entry.delete(0, tk.END)
+            self.results_stats_label.config(text="")
             self.load_results()
         except Exception as e:
             messagebox.showerror(
@@ -2473,24 +2396,7 @@ class TeacherDashboard(tk.Frame):
                 )
                 return
 
-            student_name, exam_title, score, date = self.results_tree.item(
-                selected[0], 'values')
-
-            results_data = Database.load_data('results.json')
-            exams = {exam.id: exam.title for exam in Database.get_all_exams()}
-            exam_ids = {title: id for id, title in exams.items()}
-            teachers, students = Database.get_all_users()
-            student_usernames = {
-                student.full_name: student.username for student in students}
-
-            result = None
-            for result_data in results_data['results']:
-                r = Result.from_dict(result_data)
-                if (r.student_username in student_usernames.values() and
-                    r.exam_id in exam_ids.values() and
-                    r.date == date):
-                    result = r
-                    break
+            result = Database.get_result_by_id(selected[0], self.result_exam_ids.get(selected[0]))
 
             if result:
                 ResultDetailsDialog(self, result)
@@ -2508,62 +2414,57 @@ class TeacherDashboard(tk.Frame):
                 icon='error'
             )
 
-    def export_results(self):
+    def show_item_analysis(self):
         try:
-            results = []
-            for item in self.results_tree.get_children():
-                student_name, exam_title, score, date = self.results_tree.item(
-                    item, 'values')
-                results.append({
-                    'Student': student_name,
-                    'Exam': exam_title,
-                    'Score': score,
-                    'Date': date
-                })
-
-            if not results:
+            exam_id, student_username = self.selected_filter_ids()
+            if exam_id is None:
                 messagebox.showwarning(
-                    "Warning", 
-                    "No results to export",
+                    "Warning",
+                    "Please choose an exam in 'Filter by Exam' first",
                     icon='warning'
                 )
                 return
 
-            filename = simpledialog.askstring(
-                "Export Results",
-                "Enter filename (without extension):",
-                parent=self
-            )
-            
-            if not filename:
+            report = ItemAnalysis.for_exam(exam_id)
+            if report and not report.student_count and report.excluded:
+                messagebox.showinfo("Item Analysis",
+                                    "No results were taken with the exam's current questions yet")
+                return
+            if not report or not report.student_count:
+                messagebox.showinfo("Item Analysis", "No results recorded for this exam yet")
                 return
 
-            # Show export progress
-            export_window = tk.Toplevel()
-            export_window.title("Exporting")
-            tk.Label(export_window, text="Exporting results...").pack(pady=10)
-            progress = ttk.Progressbar(export_window, mode='indeterminate')
-            progress.pack(pady=5)
-            progress.start()
-            self.update()
-            
-            with open(f"{filename}.csv", 'w', newline='', encoding='utf-8') as f:
-                import csv
-                writer = csv.DictWriter(
-                    f, fieldnames=['Student', 'Exam', 'Score', 'Date'])
-                writer.writeheader()
-                writer.writerows(results)
-
-            export_window.destroy()
-            messagebox.showinfo(
-                "Success", 
-                f"Results exported to {filename}.csv",
-                icon='info'
+            ItemAnalysisDialog(self, report)
+
+        except Exception as e:
+            messagebox.showerror(
+                "Error", 
+                f"Item analysis failed: {str(e)}",
+                icon='error'
             )
+
+    def export_results(self):
+        try:
+            # Export streams straight from storage, honouring the exam and
+            # student filters rather than what the table happens to show
+            exam_id, student_username = self.selected_filter_ids()
+            dialog = ExportResultsDialog(self, exam_id, student_username)
+            if dialog.result:
+                rows, path = dialog.result
+                if not rows:
+                    messagebox.showwarning(
+                        "Warning", 
+                        "No results to export",
+                        icon='warning'
+                    )
+                    return
+                messagebox.showinfo(
+                    "Success", 
+                    f"{rows} results exported to {path}",
+                    icon='info'
+                )
             
         except Exception as e:
-            if 'export_window' in locals():
-                export_window.destroy()
             messagebox.showerror(
                 "Error", 
                 f"Export failed: {str(e)}",
@@ -2731,6 +2632,7 @@ class StudentDashboard(tk.Frame):
             yscrollcommand=scrollbar.set,
             selectmode="browse"
         )
+        self.exam_sync = TreeSync(self.exam_tree)
         
         self.exam_tree.heading('id', text='ID')
         self.exam_tree.heading('title', text='Title')
@@ -2798,6 +2700,17 @@ class StudentDashboard(tk.Frame):
         container = tk.Frame(parent, bg="#f5f7fa")
         container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # Personal score statistics
+        self.results_stats_label = tk.Label(
+            container,
+            text="",
+            bg="#f5f7fa",
+            fg="#2d3436",
+            font=("Segoe UI", 9),
+            anchor="w"
+        )
+        self.results_stats_label.pack(fill=tk.X, pady=(0, 5))
+
         # Results list container with card-like styling
         list_container = tk.Frame(container, bg="white", bd=1, relief="solid", highlightbackground="#dfe6e9")
         list_container.pack(fill=tk.BOTH, expand=True)
@@ -2814,6 +2727,9 @@ class StudentDashboard(tk.Frame):
             yscrollcommand=scrollbar.set,
             selectmode="browse"
         )
+        self.results_sync = TreeSync(self.results_tree)
+        # Exam ids of the listed results, so a details lookup reads one shard
+        self.result_exam_ids = {}
         
         self.results_tree.heading('exam', text='Exam')
         self.results_tree.heading('score', text='Score')
@@ -2863,22 +2779,62 @@ class StudentDashboard(tk.Frame):
         # Load results
         self.load_results()
 
+    def on_data_changed(self, changes):
+        # Called by ExamApp with the changes since its last poll. Row events
+        # only touch their rows, a reload redraws the list
+        if 'exam' in changes:
+            if (changes['exam'] is None or
+                    not self.exam_sync.apply_events(changes['exam'], self.exam_row)):
+                self.search_exams()
+        if 'exam' in changes or 'result' in changes:
+            self.update_results(changes)
+
+    def exam_row(self, exam):
+        search_term = self.exam_search_entry.get().strip().lower()
+        if not (search_term in exam.title.lower() or search_term in exam.description.lower()):
+            return None
+        return self.exam_rows([exam])[0]
+
+    def result_row(self, result):
+        # Only this student's results are listed
+        if result.student_username != self.controller.current_user.username:
+            return None
+        title = self.exam_titles.get(result.exam_id)
+        if title is None:
+            return None
+        self.result_exam_ids[result.id] = result.exam_id
+        return (result.id, (title, f"{result.score}%", result.date))
+
+    def update_results(self, changes):
+        # A renamed or deleted exam reloads the results, new results are added
+        # as rows
+        events = changes.get('exam', {})
+        reload = events is None
+        for exam_id, event in (events or {}).items():
+            if event.op == 'delete' or event.data is None:
+                reload = reload or exam_id in self.exam_titles or event.data is None
+            elif self.exam_titles.get(exam_id, event.data.title) != event.data.title:
+                reload = True
+            else:
+                self.exam_titles[exam_id] = event.data.title
+
+        if not reload and 'result' in changes:
+            reload = (changes['result'] is None or
+                      not self.results_sync.apply_events(changes['result'], self.result_row))
+        if reload:
+            self.load_results()
+        elif 'result' in changes:
+            summary = ScoreStats.for_student(self.controller.current_user.username)
+            self.results_stats_label.config(text=ScoreStats.format_summary(summary))
+
+    def exam_rows(self, exams):
+        return [(exam.id, (exam.id, exam.title, len(exam.questions), exam.time_limit))
+                for exam in exams]
+
     def load_exams(self):
         try:
-            # Clear existing items with animation
-            for item in self.exam_tree.get_children():
-                self.exam_tree.delete(item)
-                
-            # Show loading state
-            #self.exam_tree.insert('', tk.END, values=("Loading...", "", "", ""))
-            self.update()
-            
             exams = Database.get_all_exams()
-            
-            for i, exam in enumerate(exams):
-                self.exam_tree.insert('', tk.END, values=(
-                    exam.id, exam.title, len(exam.questions), exam.time_limit),
-                    tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+            self.exam_sync.apply(self.exam_rows(exams))
                     
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load exams: {str(e)}")
@@ -2887,14 +2843,6 @@ class StudentDashboard(tk.Frame):
         try:
             search_term = self.exam_search_entry.get().strip().lower()
             
-            # Clear existing items with animation
-            for item in self.exam_tree.get_children():
-                self.exam_tree.delete(item)
-                
-            # Show searching state
-            #self.exam_tree.insert('', tk.END, values=("Searching...", "", "", ""))
-            self.update()
-            
             exams = Database.get_all_exams()
             matches = []
             
@@ -2902,14 +2850,9 @@ class StudentDashboard(tk.Frame):
                 if (search_term in exam.title.lower() or 
                     search_term in exam.description.lower()):
                     matches.append(exam)
-                    
-            if not matches:
-                self.exam_tree.insert('', tk.END, values=("No results found", "", "", ""))
-            else:
-                for i, exam in enumerate(matches):
-                    self.exam_tree.insert('', tk.END, values=(
-                        exam.id, exam.title, len(exam.questions), exam.time_limit),
-                        tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+
+            self.exam_sync.apply(self.exam_rows(matches),
+                                 empty_values=("No results found", "", "", ""))
                         
         except Exception as e:
             messagebox.showerror("Error", f"Search failed: {str(e)}")
@@ -2922,7 +2865,7 @@ class StudentDashboard(tk.Frame):
                 return
 
             exam_id = self.exam_tree.item(selected[0], 'values')[0]
-            exam = Database.get_exam_by_id(exam_id)
+            exam = ExamPreview.for_exam(exam_id)
             
             if not exam:
                 messagebox.showerror("Error", "Exam not found", icon='error')
@@ -2931,7 +2874,7 @@ class StudentDashboard(tk.Frame):
             # Create a styled details dialog
             details = tk.Toplevel()
             details.title("Exam Details")
-            details.geometry("400x300")
+            details.geometry("400x340")
             details.resizable(False, False)
             
             # Header
@@ -2967,9 +2910,17 @@ class StudentDashboard(tk.Frame):
             desc_text.pack(fill=tk.X)
             
             tk.Label(content, 
-                    text=f"Number of Questions: {len(exam.questions)}", 
+                    text=f"Number of Questions: {exam.question_count}", 
                     font=("Segoe UI", 9),
                     anchor="w").pack(fill=tk.X, pady=5)
+
+            if exam.categories:
+                tk.Label(content, 
+                        text=f"Categories: {exam.format_categories()}", 
+                        font=("Segoe UI", 9),
+                        wraplength=360,
+                        justify=tk.LEFT,
+                        anchor="w").pack(fill=tk.X, pady=5)
             
             tk.Label(content, 
                     text=f"Time Limit: {exam.time_limit} minutes", 
@@ -3016,14 +2967,28 @@ class StudentDashboard(tk.Frame):
                         return
                     break
 
-            # Start the exam with a confirmation
-            confirm = messagebox.askyesno(
-                "Start Exam",
-                f"Are you ready to start '{exam.title}'?\n\n"
-                f"Questions: {len(exam.questions)}\n"
-                f"Time Limit: {exam.time_limit} minutes",
-                icon='question'
-            )
+            # An unfinished attempt is resumed with the answers from its journal
+            attempt = Database.get_open_attempt(self.controller.current_user.username, exam_id)
+            if attempt:
+                answered = len(AttemptJournal.replay(attempt.id, attempt.deadline + Attempt.GRACE))
+                minutes, seconds = divmod(int(attempt.remaining()), 60)
+                confirm = messagebox.askyesno(
+                    "Resume Exam",
+                    f"You have an unfinished attempt at '{exam.title}'.\n\n"
+                    f"Answered: {answered}/{len(exam.questions)}\n"
+                    f"Time Remaining: {minutes:02d}:{seconds:02d}\n\n"
+                    f"Do you want to resume it?",
+                    icon='question'
+                )
+            else:
+                # Start the exam with a confirmation
+                confirm = messagebox.askyesno(
+                    "Start Exam",
+                    f"Are you ready to start '{exam.title}'?\n\n"
+                    f"Questions: {len(exam.questions)}\n"
+                    f"Time Limit: {exam.time_limit} minutes",
+                    icon='question'
+                )
             
             if confirm:
                 self.controller.show_frame(ExamPage, exam)
@@ -3033,27 +2998,17 @@ class StudentDashboard(tk.Frame):
 
     def load_results(self):
         try:
-            # Clear existing items with animation
-            for item in self.results_tree.get_children():
-                self.results_tree.delete(item)
-                
-            # Show loading state
-            #self.results_tree.insert('', tk.END, values=("Loading...", "", ""))
-            self.update()
-            
             results = Database.get_results_by_student(self.controller.current_user.username)
-            exams = {exam.id: exam for exam in Database.get_all_exams()}
-            
-            if not results:
-                self.results_tree.insert('', tk.END, values=("No results found", "", ""))
-                return
-                
-            for i, result in enumerate(results):
-                exam = exams.get(result.exam_id)
-                if exam:
-                    self.results_tree.insert('', tk.END, values=(
-                        exam.title, f"{result.score}%", result.date),
-                        tags=('evenrow' if i % 2 == 0 else 'oddrow'))
+            # Titles are kept for the rows added later by change events
+            self.exam_titles = {exam.id: exam.title for exam in Database.get_all_exams()}
+
+            summary = ScoreStats.for_student(self.controller.current_user.username)
+            self.results_stats_label.config(text=ScoreStats.format_summary(summary))
+
+            self.result_exam_ids = {}
+            rows = [self.result_row(result) for result in results]
+            self.results_sync.apply([row for row in rows if row],
+                                    empty_values=("No results found", "", ""))
                         
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load results: {str(e)}")
@@ -3065,17 +3020,10 @@ class StudentDashboard(tk.Frame):
                 messagebox.showwarning("Warning", "Please select a result to view", icon='warning')
                 return
 
-            exam_title, score, date = self.results_tree.item(selected[0], 'values')
-            
-            results = Database.get_results_by_student(self.controller.current_user.username)
-            exams = {exam.id: exam.title for exam in Database.get_all_exams()}
-            exam_ids = {title: id for id, title in exams.items()}
-
-            result = None
-            for r in results:
-                if r.exam_id in exam_ids and exams[r.exam_id] == exam_title and r.date == date:
-                    result = r
-                    break
+            result = Database.get_result_by_id(selected[0], self.result_exam_ids.get(selected[0]))
+            # Students may only open their own results
+            if result and result.student_username != self.controller.current_user.username:
+                result = None
 
             if result:
                 ResultDetailsDialog(self, result)
@@ -3095,6 +3043,94 @@ class StudentDashboard(tk.Frame):
             self.controller.current_user = None
             self.controller.show_frame(LoginPage)
 
+# Question Navigator
+
+
+class QuestionNavigator(tk.Frame):
+    # One Canvas holding a numbered cell per question. Cells are drawn once and
+    # set_state only re-colours a cell whose state actually changed
+    COLUMNS = 10
+    VISIBLE_ROWS = 5
+    CELL_WIDTH = 30
+    CELL_HEIGHT = 24
+    GAP = 4
+    COLORS = {
+        'current': ("#3498db", "white"),
+        'answered': ("#2ecc71", "white"),
+        'unanswered': ("#ecf0f1", "#2d3436")
+    }
+
+    def __init__(self, parent, count, command, bg="white"):
+        super().__init__(parent, bg=bg)
+        self.count = count
+        self.command = command
+        self.states = ['unanswered'] * count
+
+        rows = max(1, -(-count // self.COLUMNS))
+        step_x = self.CELL_WIDTH + self.GAP
+        self.step_y = self.CELL_HEIGHT + self.GAP
+        self.canvas = tk.Canvas(
+            self,
+            width=self.COLUMNS * step_x,
+            height=min(rows, self.VISIBLE_ROWS) * self.step_y,
+            bg=bg,
+            highlightthickness=0,
+            cursor="hand2"
+        )
+        self.canvas.pack(side=tk.LEFT)
+        self.canvas.configure(scrollregion=(0, 0, self.COLUMNS * step_x, rows * self.step_y))
+
+        # Long exams scroll instead of growing the page
+        if rows > self.VISIBLE_ROWS:
+            scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
+            scrollbar.pack(side=tk.LEFT, fill=tk.Y)
+            self.canvas.configure(yscrollcommand=scrollbar.set)
+
+        fill, text_color = self.COLORS['unanswered']
+        self.cells = []
+        for i in range(count):
+            x = (i % self.COLUMNS) * step_x
+            y = (i // self.COLUMNS) * self.step_y
+            rect = self.canvas.create_rectangle(
+                x, y, x + self.CELL_WIDTH, y + self.CELL_HEIGHT, fill=fill, outline="")
+            label = self.canvas.create_text(
+                x + self.CELL_WIDTH / 2, y + self.CELL_HEIGHT / 2,
+                text=str(i + 1), fill=text_color, font=("Segoe UI", 9))
+            self.cells.append((rect, label))
+
+        self.canvas.bind("<Button-1>", self.on_click)
+
+    def on_click(self, event):
+        x = self.canvas.canvasx(event.x)
+        y = self.canvas.canvasy(event.y)
+        column = int(x // (self.CELL_WIDTH + self.GAP))
+        row = int(y // self.step_y)
+        index = row * self.COLUMNS + column
+        if column < self.COLUMNS and 0 <= index < self.count:
+            self.command(index)
+
+    def set_state(self, index, state):
+        if not 0 <= index < self.count or self.states[index] == state:
+            return
+        self.states[index] = state
+        rect, label = self.cells[index]
+        fill, text_color = self.COLORS[state]
+        self.canvas.itemconfig(rect, fill=fill)
+        self.canvas.itemconfig(label, fill=text_color)
+
+    def see(self, index):
+        # Scroll the current cell into view when the grid is taller than shown
+        rows = -(-self.count // self.COLUMNS)
+        if rows <= self.VISIBLE_ROWS:
+            return
+        row_top = (index // self.COLUMNS) / rows
+        row_bottom = (index // self.COLUMNS + 1) / rows
+        top, bottom = self.canvas.yview()
+        if row_top < top:
+            self.canvas.yview_moveto(row_top)
+        elif row_bottom > bottom:
+            self.canvas.yview_moveto(row_bottom - (bottom - top))
+
 # Exam Page
 
 
@@ -3106,16 +3142,28 @@ class ExamPage(tk.Frame):
         self.configure(bg="#f5f7fa")  # Set background color
 
         # Load questions
-        self.questions = []
-        for question_id in exam.questions:
-            question = Database.get_question_by_id(question_id)
-            if question:
-                self.questions.append(question)
+        self.questions = Database.get_questions_for_exam(exam)
+
+        # Per-student question and option order
+        self.variant = ExamVariant(exam.id, controller.current_user.username, len(self.questions))
 
         # Initialize variables
         self.current_question_index = 0
-        self.answers = {}
-        self.remaining_time = exam.time_limit * 60  # Convert to seconds
+
+        # The attempt's stored start time fixes the deadline, so rebuilding the
+        # page resumes the clock instead of resetting it. It is mapped onto the
+        # monotonic clock once, which wall-clock changes cannot disturb
+        self.attempt = Database.start_attempt(controller.current_user.username, exam)
+        self.deadline = time.monotonic() + self.attempt.remaining()
+        self.timer_job = None
+
+        # Every answer is journaled, a resumed attempt starts from the replay
+        # (displayed question index -> displayed option index)
+        replayed = AttemptJournal.replay(self.attempt.id, self.attempt.deadline + Attempt.GRACE)
+        self.answers = {index: option for index, option in replayed.items()
+                        if index < len(self.questions) and
+                        option < len(self.displayed_question(index)[1])}
+        self.journal = AttemptJournal(self.attempt.id)
 
         # Create layout
         self.create_layout()
@@ -3198,6 +3246,7 @@ class ExamPage(tk.Frame):
                 option_frame, 
                 variable=self.option_var, 
                 value=i,
+                command=self.save_current_answer,
                 bg="white",
                 activebackground="white",
                 selectcolor="#3498db"
@@ -3288,40 +3337,28 @@ class ExamPage(tk.Frame):
             font=("Segoe UI", 10)
         ).pack(side=tk.LEFT)
 
-        self.question_buttons_frame = tk.Frame(nav_questions_frame, bg="white")
-        self.question_buttons_frame.pack(side=tk.LEFT, fill=tk.X, expand=True)
-
-        # Create question number buttons with modern styling
-        self.question_buttons = []
-        row, col = 0, 0
-        for i in range(len(self.questions)):
-            btn = tk.Button(
-                self.question_buttons_frame, 
-                text=str(i+1), 
-                width=3,
-                command=lambda idx=i: self.jump_to_question(idx),
-                bg="#ecf0f1",
-                fg="#2d3436",
-                activebackground="#bdc3c7",
-                font=("Segoe UI", 9),
-                bd=0,
-                relief="flat"
-            )
-            btn.grid(row=row, column=col, padx=2, pady=2)
-            self.question_buttons.append(btn)
-
-            col += 1
-            if col > 9:  # 10 buttons per row
-                col = 0
-                row += 1
+        # Single canvas with a cell per question
+        self.navigator = QuestionNavigator(
+            nav_questions_frame, len(self.questions), self.jump_to_question)
+        self.navigator.pack(side=tk.LEFT, padx=(10, 0))
+        for index in self.answers:
+            self.navigator.set_state(index, 'answered')
 
         # Show first question
         self.show_question(0)
 
+    def displayed_question(self, index):
+        # Question at a displayed position and its displayed option order
+        canonical_index = self.variant.question_order[index]
+        question = self.questions[canonical_index]
+        order = self.variant.option_order(canonical_index, len(question.options))
+        return question, [question.options[i] for i in order]
+
     def show_question(self, index):
         if 0 <= index < len(self.questions):
+            previous_index = self.current_question_index
             self.current_question_index = index
-            question = self.questions[index]
+            question, options = self.displayed_question(index)
 
             # Update question number
             self.question_number_label.config(
@@ -3335,8 +3372,8 @@ class ExamPage(tk.Frame):
 
             # Update options
             for i, (radio, text) in enumerate(self.option_buttons):
-                if i < len(question.options):
-                    text.config(text=question.options[i])
+                if i < len(options):
+                    text.config(text=options[i])
                     radio.config(state=tk.NORMAL)
                 else:
                     text.config(text="")
@@ -3354,14 +3391,11 @@ class ExamPage(tk.Frame):
             self.next_button.config(state=tk.NORMAL if index < len(
                 self.questions) - 1 else tk.DISABLED)
 
-            # Update question buttons
-            for i, btn in enumerate(self.question_buttons):
-                if i == index:
-                    btn.config(bg="#3498db", fg="white")  # Current question
-                elif i in self.answers:
-                    btn.config(bg="#2ecc71", fg="white")  # Answered
-                else:
-                    btn.config(bg="#ecf0f1", fg="#2d3436")  # Not answered
+            # Update only the navigator cells that changed
+            self.navigator.set_state(
+                previous_index, 'answered' if previous_index in self.answers else 'unanswered')
+            self.navigator.set_state(index, 'current')
+            self.navigator.see(index)
 
     def prev_question(self):
         # Save current answer
@@ -3387,34 +3421,45 @@ class ExamPage(tk.Frame):
         self.show_question(index)
 
     def save_current_answer(self):
+        # Answers chosen after the deadline do not count
+        if time.monotonic() > self.deadline + Attempt.GRACE:
+            return
+
         # Get selected option
         selected = self.option_var.get()
 
-        # Save answer if an option is selected
-        if selected != -1:
+        # Save answer if an option is selected and journal it when it changed
+        if selected != -1 and self.answers.get(self.current_question_index) != selected:
             self.answers[self.current_question_index] = selected
+            self.journal.append(self.current_question_index, selected)
 
     def update_timer(self):
-        # Update timer display
-        hours = self.remaining_time // 3600
-        minutes = (self.remaining_time % 3600) // 60
-        seconds = self.remaining_time % 60
-
-        self.timer_label.config(
-            text=f"Time Remaining: {hours:02d}:{minutes:02d}:{seconds:02d}")
-
-        # Decrement time
-        self.remaining_time -= 1
+        # Remaining time is recomputed from the clock on every tick, so late
+        # callbacks cannot accumulate into extra time
+        self.timer_job = None
+        remaining = self.deadline - time.monotonic()
 
         # Check if time is up
-        if self.remaining_time < 0:
+        if remaining <= 0:
+            self.save_current_answer()
+            self.timer_label.config(text="Time Remaining: 00:00:00")
             messagebox.showinfo(
                 "Time's Up", "Your time is up! The exam will be submitted automatically.")
             self.submit_exam()
             return
 
-        # Schedule next update
-        self.after(1000, self.update_timer)
+        # Update timer display
+        whole_seconds = math.ceil(remaining)
+        hours = whole_seconds // 3600
+        minutes = (whole_seconds % 3600) // 60
+        seconds = whole_seconds % 60
+
+        self.timer_label.config(
+            text=f"Time Remaining: {hours:02d}:{minutes:02d}:{seconds:02d}")
+
+        # Schedule the next update for when the displayed second changes
+        delay = remaining - (whole_seconds - 1)
+        self.timer_job = self.after(int(delay * 1000) + 1, self.update_timer)
 
     def confirm_submit(self):
         # Save current answer
@@ -3435,26 +3480,39 @@ class ExamPage(tk.Frame):
         # Submit exam
         self.submit_exam()
 
+    def destroy(self):
+        # Leaving the page keeps the attempt open, it can be resumed later
+        if self.timer_job:
+            self.after_cancel(self.timer_job)
+            self.timer_job = None
+        self.journal.close()
+        super().destroy()
+
     def submit_exam(self):
-        # Calculate score
-        correct = 0
-        for i, question in enumerate(self.questions):
-            if i in self.answers and self.answers[i] == question.correct_answer:
-                correct += 1
+        if self.timer_job:
+            self.after_cancel(self.timer_job)
+            self.timer_job = None
+
+        # Map the shuffled answers back to canonical question and option indices
+        answers = self.variant.to_canonical(
+            self.answers, [len(question.options) for question in self.questions])
 
-        score = round((correct / len(self.questions))
-                      * 100, 2) if self.questions else 0
+        # Calculate score
+        score = GradingEngine(self.questions).score(answers)
 
         # Create result
         result = Result(
             student_username=self.controller.current_user.username,
             exam_id=self.exam.id,
             score=score,
-            answers=self.answers
+            answers=answers,
+            question_ids=[question.id for question in self.questions]
         )
 
         # Save result
         Database.add_result(result)
+        self.journal.close()
+        Database.finish_attempt(self.attempt.id)
 
         # Show score
         messagebox.showinfo("Exam Completed", f"Your score: {score}%")
@@ -3948,9 +4006,10 @@ class ExamDialog:
         self.selected_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar2.config(command=self.selected_listbox.yview)
         
-        # Dictionary to map listbox indices to question IDs
-        self.available_question_ids = {}
-        self.selected_question_ids = {}
+        # Question IDs in listbox order
+        self.available_question_ids = []
+        self.selected_question_ids = []
+        self.questions_by_id = {question.id: question for question in self.all_questions}
         
         # Action buttons frame
         action_buttons_frame = tk.Frame(container, bg="white")
@@ -3976,6 +4035,18 @@ class ExamDialog:
             **button_style
         )
         save_button.pack(side=tk.LEFT, padx=10)
+
+        # Random generation button
+        generate_button = tk.Button(
+            action_buttons_frame,
+            text="Generate Randomly",
+            command=self.generate_questions,
+            bg="#9b59b6",
+            fg="white",
+            activebackground="#8e44ad",
+            **button_style
+        )
+        generate_button.pack(side=tk.LEFT, padx=(0, 10))
         
         # Cancel button with modern style
         cancel_button = tk.Button(
@@ -3990,6 +4061,7 @@ class ExamDialog:
         cancel_button.pack(side=tk.LEFT)
         
         # Fill form if editing
+        self.exam = exam
         self.exam_question_ids = []
         if exam:
             self.title_entry.insert(0, exam.title)
@@ -4003,47 +4075,52 @@ class ExamDialog:
         # Wait for dialog to close
         self.dialog.wait_window()
     
+    @staticmethod
+    def _display_text(question):
+        # Truncate question text if too long
+        return question.text[:50] + "..." if len(question.text) > 50 else question.text
+
     def load_questions(self):
         # Clear listboxes and mappings
         self.available_listbox.delete(0, tk.END)
         self.selected_listbox.delete(0, tk.END)
-        self.available_question_ids = {}
-        self.selected_question_ids = {}
-        
-        # Add questions to appropriate listboxes
+        self.available_question_ids = []
+        self.selected_question_ids = []
+
+        # Selected questions keep the exam order
+        for question_id in self.exam_question_ids:
+            question = self.questions_by_id.get(question_id)
+            if question:
+                self._append_selected(question)
+
+        selected = set(self.exam_question_ids)
         for question in self.all_questions:
-            # Truncate question text if too long
-            text = question.text[:50] + "..." if len(question.text) > 50 else question.text
-            
-            if question.id in self.exam_question_ids:
-                index = self.selected_listbox.size()
-                self.selected_listbox.insert(tk.END, text)
-                self.selected_listbox.itemconfig(index, {'bg': '#e8f5e9'})  # Light green background
-                self.selected_question_ids[index] = question.id
-            else:
-                index = self.available_listbox.size()
-                self.available_listbox.insert(tk.END, text)
-                self.available_question_ids[index] = question.id
+            if question.id not in selected:
+                self.available_listbox.insert(tk.END, self._display_text(question))
+                self.available_question_ids.append(question.id)
+
+    def _append_selected(self, question):
+        index = self.selected_listbox.size()
+        self.selected_listbox.insert(tk.END, self._display_text(question))
+        self.selected_listbox.itemconfig(index, {'bg': '#e8f5e9'})  # Light green background
+        self.selected_question_ids.append(question.id)
     
     def search_questions(self):
         search_term = self.search_entry.get().lower()
         
         # Clear available listbox and mapping
         self.available_listbox.delete(0, tk.END)
-        self.available_question_ids = {}
+        self.available_question_ids = []
         
         # Add matching questions to available listbox
+        selected = set(self.exam_question_ids)
         for question in self.all_questions:
-            if question.id not in self.exam_question_ids and (
+            if question.id not in selected and (
                 search_term in question.text.lower() or 
                 search_term in question.category.lower()):
                 
-                # Truncate question text if too long
-                text = question.text[:50] + "..." if len(question.text) > 50 else question.text
-                
-                index = self.available_listbox.size()
-                self.available_listbox.insert(tk.END, text)
-                self.available_question_ids[index] = question.id
+                self.available_listbox.insert(tk.END, self._display_text(question))
+                self.available_question_ids.append(question.id)
     
     def add_question(self):
         # Get selected question
@@ -4051,15 +4128,16 @@ class ExamDialog:
         if not selected:
             return
         
-        # Get question index and ID
+        # Move only this entry between the listboxes
         index = selected[0]
-        question_id = self.available_question_ids.get(index)
+        question_id = self.available_question_ids[index]
         
-        if question_id and question_id not in self.exam_question_ids:
+        if question_id not in self.exam_question_ids:
             self.exam_question_ids.append(question_id)
-        
-        # Reload questions
-        self.load_questions()
+            self._append_selected(self.questions_by_id[question_id])
+
+        self.available_listbox.delete(index)
+        del self.available_question_ids[index]
     
     def remove_question(self):
         # Get selected question
@@ -4067,14 +4145,36 @@ class ExamDialog:
         if not selected:
             return
         
-        # Get question index and ID
+        # Move only this entry between the listboxes
         index = selected[0]
-        question_id = self.selected_question_ids.get(index)
+        question_id = self.selected_question_ids[index]
         
-        if question_id and question_id in self.exam_question_ids:
+        if question_id in self.exam_question_ids:
             self.exam_question_ids.remove(question_id)
-        
-        # Reload questions
+
+        self.selected_listbox.delete(index)
+        del self.selected_question_ids[index]
+        self.available_listbox.insert(tk.END, self._display_text(self.questions_by_id[question_id]))
+        self.available_question_ids.append(question_id)
+
+    def generate_questions(self):
+        generator = ExamGenerator(self.all_questions)
+        dialog = GenerateExamDialog(self.dialog, generator.categories())
+        if not dialog.result:
+            return
+
+        total, quotas, last_k = dialog.result
+        try:
+            exclude = ExamGenerator.recently_used(
+                Database.get_all_exams(), last_k,
+                skip_exam_id=self.exam.id if self.exam else None)
+            self.exam_question_ids = generator.generate(total, quotas, exclude)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Cannot generate exam: {e}", parent=self.dialog)
+            return
+
+        # Render only the generated selection
+        self.search_entry.delete(0, tk.END)
         self.load_questions()
     
     def save(self):
@@ -4096,6 +4196,144 @@ class ExamDialog:
     def cancel(self):
         self.dialog.destroy()
 
+# Generate Exam Dialog
+
+
+class GenerateExamDialog:
+    def __init__(self, parent, categories):
+        self.result = None
+        self.categories = categories
+
+        # Create dialog window with modern styling
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Generate Exam")
+        self.dialog.geometry("500x500")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.configure(bg="#f5f5f5")
+
+        # Main container with card-like styling
+        container = tk.Frame(self.dialog, bg="white", bd=1, relief="solid", padx=20, pady=20)
+        container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Form styling
+        label_style = {"font": ("Segoe UI", 10), "bg": "white", "fg": "#34495e"}
+        entry_style = {
+            "font": ("Segoe UI", 10),
+            "bd": 1,
+            "relief": "solid",
+            "highlightbackground": "#bdc3c7",
+            "highlightcolor": "#3498db",
+            "highlightthickness": 1
+        }
+
+        # Number of questions
+        tk.Label(container, text="Number of Questions:", **label_style).grid(
+            row=0, column=0, sticky=tk.W, pady=8)
+        self.total_var = tk.IntVar(value=min(10, sum(categories.values())))
+        tk.Entry(container, width=10, textvariable=self.total_var, **entry_style).grid(
+            row=0, column=1, sticky=tk.W, pady=8)
+
+        # Exclusion window
+        tk.Label(container, text="Skip questions used in last K exams:", **label_style).grid(
+            row=1, column=0, sticky=tk.W, pady=8)
+        self.last_k_var = tk.IntVar(value=0)
+        tk.Entry(container, width=10, textvariable=self.last_k_var, **entry_style).grid(
+            row=1, column=1, sticky=tk.W, pady=8)
+
+        # Per-category quotas
+        tk.Label(container, text="Category quotas:", **label_style).grid(
+            row=2, column=0, sticky=tk.NW, pady=8)
+
+        quotas_frame = tk.Frame(container, bg="white", bd=1, relief="solid")
+        quotas_frame.grid(row=3, column=0, columnspan=2, sticky=tk.NSEW)
+
+        canvas = tk.Canvas(quotas_frame, bg="white", height=250, width=420, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(quotas_frame, orient="vertical", command=canvas.yview)
+        rows_frame = tk.Frame(canvas, bg="white")
+        rows_frame.bind(
+            "<Configure>",
+            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+        )
+        canvas.create_window((0, 0), window=rows_frame, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        self.quota_vars = {}
+        for row, (category, available) in enumerate(sorted(categories.items())):
+            tk.Label(rows_frame, text=f"{category} ({available})", anchor="w",
+                     **label_style).grid(row=row, column=0, sticky=tk.W, padx=5, pady=2)
+            var = tk.IntVar(value=0)
+            tk.Spinbox(rows_frame, from_=0, to=available, width=5, textvariable=var,
+                       font=("Segoe UI", 10)).grid(row=row, column=1, padx=5, pady=2)
+            self.quota_vars[category] = var
+
+        # Buttons frame
+        buttons_frame = tk.Frame(container, bg="white")
+        buttons_frame.grid(row=4, column=0, columnspan=2, pady=(20, 0))
+
+        # Button styling
+        button_style = {
+            "font": ("Segoe UI", 10),
+            "bd": 0,
+            "padx": 15,
+            "pady": 6,
+            "cursor": "hand2"
+        }
+
+        tk.Button(
+            buttons_frame,
+            text="Generate",
+            command=self.generate,
+            bg="#2ecc71",
+            fg="white",
+            activebackground="#27ae60",
+            **button_style
+        ).pack(side=tk.LEFT, padx=10)
+
+        tk.Button(
+            buttons_frame,
+            text="Cancel",
+            command=self.cancel,
+            bg="#95a5a6",
+            fg="white",
+            activebackground="#7f8c8d",
+            **button_style
+        ).pack(side=tk.LEFT)
+
+        # Wait for dialog to close
+        self.dialog.wait_window()
+
+    def generate(self):
+        try:
+            total = self.total_var.get()
+            last_k = self.last_k_var.get()
+            quotas = {category: var.get() for category, var in self.quota_vars.items()}
+        except tk.TclError:
+            messagebox.showerror("Error", "Please enter whole numbers", parent=self.dialog)
+            return
+
+        if total <= 0:
+            messagebox.showerror("Error", "Number of questions must be positive", parent=self.dialog)
+            return
+
+        if last_k < 0 or any(count < 0 for count in quotas.values()):
+            messagebox.showerror("Error", "Values cannot be negative", parent=self.dialog)
+            return
+
+        if sum(quotas.values()) > total:
+            messagebox.showerror(
+                "Error", "Category quotas exceed the number of questions", parent=self.dialog)
+            return
+
+        self.result = (total, quotas, last_k)
+        self.dialog.destroy()
+
+    def cancel(self):
+        self.dialog.destroy()
+
 # Import Questions Dialog
 
 
@@ -4106,7 +4344,7 @@ class ImportQuestionsDialog:
         # Create dialog window with modern styling
         self.dialog = tk.Toplevel(parent)
         self.dialog.title("Import Questions")
-        self.dialog.geometry("450x300")
+        self.dialog.geometry("450x380")
         self.dialog.resizable(False, False)
         self.dialog.transient(parent)
         self.dialog.grab_set()
@@ -4209,7 +4447,7 @@ class ImportQuestionsDialog:
         }
 
         # Import button with modern style
-        import_button = tk.Button(
+        self.import_button = tk.Button(
             buttons_frame, 
             text="Import", 
             command=self.import_questions,
@@ -4218,10 +4456,10 @@ class ImportQuestionsDialog:
             activebackground="#27ae60",
             **button_style
         )
-        import_button.pack(side=tk.LEFT, padx=10)
+        self.import_button.pack(side=tk.LEFT, padx=10)
 
         # Cancel button with modern style
-        cancel_button = tk.Button(
+        self.cancel_button = tk.Button(
             buttons_frame, 
             text="Cancel", 
             command=self.cancel,
@@ -4230,13 +4468,25 @@ class ImportQuestionsDialog:
             activebackground="#7f8c8d",
             **button_style
         )
-        cancel_button.pack(side=tk.LEFT)
+        self.cancel_button.pack(side=tk.LEFT)
+
+        # Progress of the background import
+        self.status_label = tk.Label(container, text="", **label_style)
+        self.status_label.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(15, 5))
+        self.progress_bar = ttk.Progressbar(container, length=350, mode='determinate')
+        self.progress_bar.grid(row=4, column=0, columnspan=2, sticky=tk.W)
+
+        self.job = None
+        self.dialog.protocol("WM_DELETE_WINDOW", self.cancel)
 
         # Wait for dialog to close
         self.dialog.wait_window()
 
     def import_questions(self):
-        amount = self.amount_var.get()
+        try:
+            amount = self.amount_var.get()
+        except tk.TclError:
+            amount = 0
         category_name = self.category_var.get()
         category_id = self.categories.get(category_name, "")
 
@@ -4245,12 +4495,351 @@ class ImportQuestionsDialog:
                 "Error", "Number of questions must be between 1 and 50")
             return
 
-        self.result = (amount, category_id)
+        # Run the import in the background and poll its progress queue
+        self.import_button.config(state=tk.DISABLED)
+        self.amount_entry.config(state=tk.DISABLED)
+        self.category_combobox.config(state=tk.DISABLED)
+        self.progress_bar.config(maximum=amount * len(ImportJob.STAGES), value=0)
+        self.status_label.config(text="Fetching questions...")
+
+        self.job = ImportJob(amount, category_id or None)
+        self.job.start()
+        self.dialog.after(100, self.poll_job)
+
+    def poll_job(self):
+        try:
+            while True:
+                message = self.job.queue.get_nowait()
+                kind = message[0]
+
+                if kind == 'progress':
+                    stage, done, total = message[1:]
+                    offset = ImportJob.STAGES.index(stage) * total
+                    self.progress_bar.config(maximum=total * len(ImportJob.STAGES),
+                                             value=offset + done)
+                    self.status_label.config(text=f"{stage.capitalize()}: {done}/{total}")
+                elif kind == 'done':
+                    written, total = message[1:]
+                    self.progress_bar.config(value=self.progress_bar['maximum'])
+                    self.result = (written, total)
+                    self.dialog.destroy()
+                    return
+                elif kind == 'cancelled':
+                    self.dialog.destroy()
+                    return
+                elif kind == 'error':
+                    messagebox.showerror("Error", f"Import failed: {message[1]}", parent=self.dialog)
+                    self.reset()
+                    return
+        except queue.Empty:
+            pass
+
+        self.dialog.after(100, self.poll_job)
+
+    def reset(self):
+        self.job = None
+        self.import_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.amount_entry.config(state=tk.NORMAL)
+        self.category_combobox.config(state=tk.NORMAL)
+        self.progress_bar.config(value=0)
+        self.status_label.config(text="")
+
+    def cancel(self):
+        # Stop a running import cleanly, nothing is written after cancellation.
+        # Until poll_job has drained the job's queue a 'done' may still be
+        # waiting there, so poll_job closes the dialog with its result
+        if self.job:
+            self.job.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Cancelling...")
+            return
         self.dialog.destroy()
 
+# Export Results Dialog
+
+
+class ExportResultsDialog:
+    def __init__(self, parent, exam_id=None, student_username=None):
+        self.result = None
+        self.exam_id = exam_id
+        self.student_username = student_username
+
+        # Create dialog window with modern styling
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Export Results")
+        self.dialog.geometry("450x360")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.configure(bg="#f5f5f5")
+
+        # Center the dialog
+        self.dialog.update_idletasks()
+        width = self.dialog.winfo_width()
+        height = self.dialog.winfo_height()
+        x = (self.dialog.winfo_screenwidth() // 2) - (width // 2)
+        y = (self.dialog.winfo_screenheight() // 2) - (height // 2)
+        self.dialog.geometry(f"{width}x{height}+{x}+{y}")
+
+        # Main container with card-like styling
+        container = tk.Frame(self.dialog, bg="white", bd=1, relief="solid", padx=30, pady=20)
+        container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Form styling
+        label_style = {"font": ("Segoe UI", 10), "bg": "white", "fg": "#34495e"}
+        entry_style = {
+            "font": ("Segoe UI", 10),
+            "bd": 1,
+            "relief": "solid",
+            "highlightbackground": "#bdc3c7",
+            "highlightcolor": "#3498db",
+            "highlightthickness": 1
+        }
+
+        # Filename
+        tk.Label(container, text="Filename (without extension):", **label_style).grid(
+            row=0, column=0, sticky=tk.W, pady=10)
+        self.filename_entry = tk.Entry(container, width=22, **entry_style)
+        self.filename_entry.insert(0, "results")
+        self.filename_entry.grid(row=0, column=1, sticky=tk.W, pady=10)
+
+        # Format
+        tk.Label(container, text="Format:", **label_style).grid(
+            row=1, column=0, sticky=tk.W, pady=10)
+        self.format_combobox = ttk.Combobox(
+            container, values=[fmt.upper() for fmt in ExportJob.FORMATS],
+            width=10, state="readonly")
+        self.format_combobox.current(0)
+        self.format_combobox.grid(row=1, column=1, sticky=tk.W, pady=10)
+
+        # Per-question answers
+        self.answers_var = tk.BooleanVar(value=False)
+        self.answers_check = tk.Checkbutton(
+            container, text="Include answers per question", variable=self.answers_var,
+            bg="white", fg="#34495e", font=("Segoe UI", 10), activebackground="white")
+        self.answers_check.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+        scope = "Filtered results" if exam_id or student_username else "All results"
+        tk.Label(container, text=f"Scope: {scope}", **label_style).grid(
+            row=3, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+        # Buttons frame
+        buttons_frame = tk.Frame(container, bg="white")
+        buttons_frame.grid(row=4, column=0, columnspan=2, pady=(15, 0))
+
+        # Button styling
+        button_style = {
+            "font": ("Segoe UI", 10),
+            "bd": 0,
+            "padx": 15,
+            "pady": 6,
+            "cursor": "hand2"
+        }
+
+        self.export_button = tk.Button(
+            buttons_frame, 
+            text="Export", 
+            command=self.export_results,
+            bg="#2ecc71",
+            fg="white",
+            activebackground="#27ae60",
+            **button_style
+        )
+        self.export_button.pack(side=tk.LEFT, padx=10)
+
+        self.cancel_button = tk.Button(
+            buttons_frame, 
+            text="Cancel", 
+            command=self.cancel,
+            bg="#95a5a6",
+            fg="white",
+            activebackground="#7f8c8d",
+            **button_style
+        )
+        self.cancel_button.pack(side=tk.LEFT)
+
+        # Progress of the background export
+        self.status_label = tk.Label(container, text="", **label_style)
+        self.status_label.grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=(15, 5))
+        self.progress_bar = ttk.Progressbar(container, length=350, mode='determinate')
+        self.progress_bar.grid(row=6, column=0, columnspan=2, sticky=tk.W)
+
+        self.job = None
+        self.dialog.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        # Wait for dialog to close
+        self.dialog.wait_window()
+
+    def export_results(self):
+        filename = self.filename_entry.get().strip()
+        if not filename:
+            messagebox.showerror("Error", "Please enter a filename", parent=self.dialog)
+            return
+        fmt = self.format_combobox.get().lower()
+
+        # Run the export in the background and poll its progress queue
+        self.export_button.config(state=tk.DISABLED)
+        self.filename_entry.config(state=tk.DISABLED)
+        self.format_combobox.config(state=tk.DISABLED)
+        self.answers_check.config(state=tk.DISABLED)
+        self.progress_bar.config(maximum=100, value=0)
+        self.status_label.config(text="Exporting results...")
+
+        self.job = ExportJob(ExportJob.output_path(filename, fmt), fmt, self.answers_var.get(),
+                             self.exam_id, self.student_username)
+        self.job.start()
+        self.dialog.after(100, self.poll_job)
+
+    def poll_job(self):
+        try:
+            while True:
+                message = self.job.queue.get_nowait()
+                kind = message[0]
+
+                if kind == 'progress':
+                    bytes_read, total_bytes, rows = message[1:]
+                    self.progress_bar.config(value=100 * bytes_read / total_bytes if total_bytes else 0)
+                    self.status_label.config(text=f"Exported {rows} results...")
+                elif kind == 'done':
+                    self.progress_bar.config(value=100)
+                    self.result = message[1:]
+                    self.dialog.destroy()
+                    return
+                elif kind == 'cancelled':
+                    self.dialog.destroy()
+                    return
+                elif kind == 'error':
+                    messagebox.showerror("Error", f"Export failed: {message[1]}", parent=self.dialog)
+                    self.reset()
+                    return
+        except queue.Empty:
+            pass
+
+        self.dialog.after(100, self.poll_job)
+
+    def reset(self):
+        self.job = None
+        self.export_button.config(state=tk.NORMAL)
+        self.filename_entry.config(state=tk.NORMAL)
+        self.format_combobox.config(state="readonly")
+        self.answers_check.config(state=tk.NORMAL)
+        self.progress_bar.config(value=0)
+        self.status_label.config(text="")
+
     def cancel(self):
+        # A cancelled export removes its partial file
+        if self.job and self.job.is_running():
+            self.job.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Cancelling...")
+            return
         self.dialog.destroy()
 
+# Item Analysis Dialog
+
+
+class ItemAnalysisDialog:
+    def __init__(self, parent, report):
+        self.report = report
+
+        # Create dialog window with modern styling
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Item Analysis")
+        self.dialog.geometry("900x500")
+        self.dialog.transient(parent)
+        self.dialog.configure(bg="#f5f5f5")
+
+        main_frame = tk.Frame(self.dialog, bg="white", bd=1, relief="solid")
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Header with exam summary
+        top_frame = tk.Frame(main_frame, bg="#3498db", padx=15, pady=10)
+        top_frame.pack(fill=tk.X)
+        tk.Label(top_frame,
+                text=f"Exam: {report.exam.title}",
+                font=("Segoe UI", 12, "bold"),
+                bg="#3498db",
+                fg="white").pack(anchor=tk.W)
+        tk.Label(top_frame,
+                text=f"Students: {report.student_count}    "
+                     + (f"(not counted: {report.excluded} taken with other questions)    "
+                        if report.excluded else "")
+                     + "p = share correct, r = point-biserial discrimination",
+                font=("Segoe UI", 10),
+                bg="#3498db",
+                fg="white").pack(anchor=tk.W, pady=(5, 0))
+
+        # Per-question table
+        list_container = tk.Frame(main_frame, bg="white")
+        list_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        scrollbar = ttk.Scrollbar(list_container)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        option_columns = [f"opt{i}" for i in range(report.option_count)]
+        columns = ('no', 'question', 'p', 'r') + tuple(option_columns) + ('blank',)
+        tree = ttk.Treeview(
+            list_container,
+            columns=columns,
+            show='headings',
+            yscrollcommand=scrollbar.set
+        )
+        tree.heading('no', text='#')
+        tree.heading('question', text='Question')
+        tree.heading('p', text='p')
+        tree.heading('r', text='r')
+        tree.heading('blank', text='Blank')
+        tree.column('no', width=40, anchor=tk.CENTER)
+        tree.column('question', width=300, anchor=tk.W)
+        tree.column('p', width=60, anchor=tk.CENTER)
+        tree.column('r', width=60, anchor=tk.CENTER)
+        tree.column('blank', width=60, anchor=tk.CENTER)
+        for i, column in enumerate(option_columns):
+            tree.heading(column, text=chr(ord('A') + i))
+            tree.column(column, width=70, anchor=tk.CENTER)
+
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=tree.yview)
+
+        students = report.student_count
+        for i, question in enumerate(report.questions):
+            text = question.text[:50] + "..." if len(question.text) > 50 else question.text
+            p_value = report.p_values[i]
+            discrimination = report.discrimination[i]
+            # Option share, the correct option is marked with *
+            options = []
+            for j in range(report.option_count):
+                if j < len(question.options):
+                    mark = "*" if j == question.correct_answer else ""
+                    options.append(f"{report.option_counts[i][j] * 100 / students:.0f}%{mark}")
+                else:
+                    options.append("")
+            tree.insert('', tk.END, values=(
+                i + 1,
+                text,
+                "-" if np.isnan(p_value) else f"{p_value:.2f}",
+                "-" if np.isnan(discrimination) else f"{discrimination:.2f}",
+                *options,
+                f"{report.unanswered[i] * 100 / students:.0f}%"
+            ))
+
+        # Close button with modern styling
+        tk.Button(
+            main_frame,
+            text="Close",
+            command=self.dialog.destroy,
+            bg="#3498db",
+            fg="white",
+            activebackground="#2980b9",
+            font=("Segoe UI", 10),
+            bd=0,
+            padx=20,
+            pady=5,
+            relief="flat",
+            cursor="hand2"
+        ).pack(pady=10)
+
 # Result Details Dialog
 
 
@@ -4275,15 +4864,21 @@ class ResultDetailsDialog:
         y = (self.dialog.winfo_screenheight() // 2) - (height // 2)
         self.dialog.geometry(f"{width}x{height}+{x}+{y}")
 
-        # Get exam and questions
+        # Get exam and the questions the result was taken with. Answers of an
+        # older result whose exam changed since cannot be placed any more
         self.exam = Database.get_exam_by_id(result.exam_id)
         self.questions = []
-
+        self.answers = None
         if self.exam:
-            for question_id in self.exam.questions:
-                question = Database.get_question_by_id(question_id)
-                if question:
-                    self.questions.append(question)
+            bank = {question.id: question for question in Database.get_all_questions()}
+            taken = Result.taken_question_ids(result.to_dict(), self.exam, bank)
+            if taken is None:
+                self.questions = Database.get_questions_for_exam(self.exam)
+            else:
+                self.questions = [bank[question_id] for question_id in taken
+                                  if question_id in bank]
+                self.answers = Result.realign(result.answers, taken,
+                                              [question.id for question in self.questions])
 
         # Create layout
         self.create_layout()
@@ -4330,115 +4925,28 @@ class ResultDetailsDialog:
         questions_frame = tk.Frame(main_frame, bg="white")
         questions_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        # Create a canvas with modern scrollbar
-        canvas = tk.Canvas(questions_frame, bg="white", highlightthickness=0)
-        scrollbar = ttk.Scrollbar(
+        # Only the cards near the viewport exist as widgets. Every question has
+        # a slot whose height is estimated until its card has been measured
+        self.canvas = tk.Canvas(questions_frame, bg="white", highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(
             questions_frame, 
             orient="vertical", 
-            command=canvas.yview,
+            command=self.scroll,
             style="Vertical.TScrollbar"
         )
-        scrollable_frame = tk.Frame(canvas, bg="white")
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
 
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-
-        # Add questions with modern card styling
-        for i, question in enumerate(self.questions):
-            # Question frame with card-like styling
-            question_frame = tk.Frame(
-                scrollable_frame, 
-                bg="white",
-                bd=1,
-                relief="solid",
-                padx=10,
-                pady=10
-            )
-            question_frame.pack(fill=tk.X, pady=5, padx=5)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
 
-            # Question number and text
-            header_frame = tk.Frame(question_frame, bg="white")
-            header_frame.pack(fill=tk.X, pady=(0, 10))
+        self.heights = [self.estimate_height(question) for question in self.questions]
+        self.offsets = []
+        self.update_offsets()
+        self.cards = {}  # question index -> card currently showing it
+        self.free_cards = []
 
-            tk.Label(header_frame, 
-                    text=f"Question {i+1}", 
-                    font=("Segoe UI", 10, "bold"),
-                    bg="white").pack(side=tk.LEFT)
-
-            # Show answer status
-            if i in self.result.answers:
-                if self.result.answers[i] == question.correct_answer:
-                    status = "✓ Correct"
-                    color = "#2ecc71"
-                else:
-                    status = "✗ Incorrect"
-                    color = "#e74c3c"
-            else:
-                status = "Not answered"
-                color = "#f39c12"
-
-            tk.Label(header_frame, 
-                    text=status, 
-                    font=("Segoe UI", 10),
-                    fg=color,
-                    bg="white").pack(side=tk.RIGHT)
-
-            # Question text with modern styling
-            question_text = tk.Text(
-                question_frame, 
-                wrap=tk.WORD, 
-                height=3, 
-                width=70,
-                font=("Segoe UI", 10),
-                bg="#f8f9fa",
-                padx=5,
-                pady=5,
-                bd=0,
-                highlightthickness=0
-            )
-            question_text.insert(tk.END, question.text)
-            question_text.config(state=tk.DISABLED)
-            question_text.pack(fill=tk.X, pady=(0, 10))
-
-            # Options with modern styling
-            for j, option in enumerate(question.options):
-                option_frame = tk.Frame(question_frame, bg="white")
-                option_frame.pack(fill=tk.X, pady=2)
-
-                # Determine option background color
-                bg_color = "#f8f9fa"  # Default
-                if j == question.correct_answer:
-                    bg_color = "#e8f5e9"  # Light green for correct answer
-                if i in self.result.answers and self.result.answers[i] == j:
-                    if j == question.correct_answer:
-                        bg_color = "#d4edda"  # Correct answer selected
-                    else:
-                        bg_color = "#f8d7da"  # Wrong answer selected
-
-                # Option label with card-like styling
-                option_label = tk.Label(
-                    option_frame, 
-                    text=option, 
-                    wraplength=600,
-                    justify=tk.LEFT, 
-                    bg=bg_color,
-                    fg="#2d3436",
-                    font=("Segoe UI", 10),
-                    padx=10,
-                    pady=8,
-                    bd=0,
-                    relief="solid",
-                    anchor="w"
-                )
-                option_label.pack(fill=tk.X, expand=True)
+        self.canvas.bind("<Configure>", lambda e: self.render())
+        self.dialog.bind("<MouseWheel>", self.on_mousewheel)
 
         # Close button with modern styling
         close_button = tk.Button(
@@ -4457,6 +4965,156 @@ class ResultDetailsDialog:
         )
         close_button.pack(pady=10)
 
+    # Virtualized question list
+
+    CARD_GAP = 10
+    OVERSCAN = 300  # pixels rendered beyond the viewport
+
+    @staticmethod
+    def estimate_height(question):
+        return 130 + 40 * len(question.options)
+
+    def update_offsets(self):
+        self.offsets = list(itertools.accumulate(
+            (height + self.CARD_GAP for height in self.heights), initial=0))
+        self.canvas.configure(scrollregion=(0, 0, 0, self.offsets[-1]))
+
+    def scroll(self, *args):
+        self.canvas.yview(*args)
+        self.render()
+
+    def on_mousewheel(self, event):
+        self.canvas.yview_scroll(int(-event.delta / 120) or (-1 if event.delta > 0 else 1), "units")
+        self.render()
+
+    def render(self):
+        if not self.questions:
+            return
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        width = max(self.canvas.winfo_width() - 10, 100)
+        first = max(0, bisect.bisect_right(self.offsets, top - self.OVERSCAN) - 1)
+        last = min(len(self.questions), bisect.bisect_left(self.offsets, bottom + self.OVERSCAN))
+        visible = range(first, last)
+
+        # Recycle cards that scrolled out of range
+        for index in [i for i in self.cards if i not in visible]:
+            card = self.cards.pop(index)
+            self.canvas.itemconfigure(card['window'], state='hidden')
+            self.free_cards.append(card)
+
+        measured = False
+        for index in visible:
+            if index in self.cards:
+                continue
+            card = self.free_cards.pop() if self.free_cards else self.create_card()
+            self.fill_card(card, index)
+            self.canvas.itemconfigure(card['window'], width=width)
+            self.cards[index] = card
+
+            # Replace the estimate with the real height once it is known
+            card['frame'].update_idletasks()
+            height = card['frame'].winfo_reqheight()
+            if height != self.heights[index]:
+                self.heights[index] = height
+                measured = True
+
+        if measured:
+            self.update_offsets()
+        for index, card in self.cards.items():
+            self.canvas.coords(card['window'], 5, self.offsets[index] + self.CARD_GAP // 2)
+            self.canvas.itemconfigure(card['window'], state='normal', width=width)
+
+    def create_card(self):
+        # Question frame with card-like styling
+        frame = tk.Frame(self.canvas, bg="white", bd=1, relief="solid", padx=10, pady=10)
+
+        # Question number and answer status
+        header_frame = tk.Frame(frame, bg="white")
+        header_frame.pack(fill=tk.X, pady=(0, 10))
+        number_label = tk.Label(header_frame, font=("Segoe UI", 10, "bold"), bg="white")
+        number_label.pack(side=tk.LEFT)
+        status_label = tk.Label(header_frame, font=("Segoe UI", 10), bg="white")
+        status_label.pack(side=tk.RIGHT)
+
+        # Question text with modern styling
+        question_text = tk.Text(
+            frame, 
+            wrap=tk.WORD, 
+            height=3, 
+            width=70,
+            font=("Segoe UI", 10),
+            bg="#f8f9fa",
+            padx=5,
+            pady=5,
+            bd=0,
+            highlightthickness=0
+        )
+        question_text.pack(fill=tk.X, pady=(0, 10))
+
+        window = self.canvas.create_window(5, 0, window=frame, anchor="nw")
+        return {'frame': frame, 'number': number_label, 'status': status_label,
+                'text': question_text, 'options': [], 'window': window}
+
+    def fill_card(self, card, index):
+        question = self.questions[index]
+        answer = self.answers.get(index) if self.answers is not None else None
+
+        # Show answer status
+        if self.answers is None:
+            status = "Answer unavailable"
+            color = "#7f8c8d"
+        elif answer is not None:
+            if answer == question.correct_answer:
+                status = "✓ Correct"
+                color = "#2ecc71"
+            else:
+                status = "✗ Incorrect"
+                color = "#e74c3c"
+        else:
+            status = "Not answered"
+            color = "#f39c12"
+
+        card['number'].config(text=f"Question {index+1}")
+        card['status'].config(text=status, fg=color)
+
+        card['text'].config(state=tk.NORMAL)
+        card['text'].delete(1.0, tk.END)
+        card['text'].insert(tk.END, question.text)
+        card['text'].config(state=tk.DISABLED)
+
+        # Option labels are kept with the card and reused for the next question
+        while len(card['options']) < len(question.options):
+            card['options'].append(tk.Label(
+                card['frame'], 
+                wraplength=600,
+                justify=tk.LEFT, 
+                fg="#2d3436",
+                font=("Segoe UI", 10),
+                padx=10,
+                pady=8,
+                bd=0,
+                relief="solid",
+                anchor="w"
+            ))
+        for j, option_label in enumerate(card['options']):
+            if j >= len(question.options):
+                option_label.pack_forget()
+                continue
+
+            # Determine option background color
+            bg_color = "#f8f9fa"  # Default
+            if j == question.correct_answer:
+                bg_color = "#e8f5e9"  # Light green for correct answer
+            if answer == j:
+                if j == question.correct_answer:
+                    bg_color = "#d4edda"  # Correct answer selected
+                else:
+                    bg_color = "#f8d7da"  # Wrong answer selected
+
+            option_label.config(text=question.options[j], bg=bg_color)
+            option_label.pack(fill=tk.X, expand=True, pady=2)
+
 # Main function
 
 
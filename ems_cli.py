@@ -0,0 +1,174 @@
+import argparse
+import queue
+import sys
+import time
+from ems_core import Database, ExportJob, ImportJob
+
+# Command-line entry point for batch jobs, e.g. python -m ems_cli export --format csv
+# Runs from the application directory (where data/ lives) and never imports Tk
+
+
+# Progress reporting
+
+
+class Progress:
+    # Progress goes to stderr so stdout stays clean for scripting. Terminals get
+    # one updating line, logs get at most one line per second
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.last_line = 0
+        self.pending = False
+
+    def update(self, text):
+        if self.interactive:
+            self.stream.write(f"\r{text:<60}")
+            self.stream.flush()
+            self.pending = True
+        elif time.monotonic() - self.last_line >= 1:
+            self.stream.write(text + "\n")
+            self.stream.flush()
+            self.last_line = time.monotonic()
+
+    def finish(self, text):
+        if self.pending:
+            self.stream.write("\r" + " " * 60 + "\r")
+            self.pending = False
+        self.stream.write(text + "\n")
+        self.stream.flush()
+
+
+def run_job(job, describe):
+    # Drive a background job from its queue, Ctrl+C cancels it cleanly
+    progress = Progress()
+    job.start()
+    while True:
+        try:
+            message = job.queue.get(timeout=0.2)
+        except queue.Empty:
+            continue
+        except KeyboardInterrupt:
+            job.cancel()
+            progress.update("Cancelling...")
+            continue
+
+        kind = message[0]
+        if kind == 'progress':
+            progress.update(describe(*message[1:]))
+        elif kind == 'done':
+            return message[1:]
+        elif kind == 'cancelled':
+            progress.finish("Cancelled")
+            return None
+        elif kind == 'error':
+            raise RuntimeError(message[1])
+
+# Commands
+
+
+def import_command(args):
+    def describe(stage, done, total):
+        return f"{stage.capitalize()}: {done}/{total}"
+
+    job = ImportJob(args.amount, args.category, args.difficulty, use_cache=not args.no_cache)
+    outcome = run_job(job, describe)
+    if outcome is None:
+        return 1
+    written, total = outcome
+    print(f"Imported {written}/{total} questions ({total - written} duplicates skipped)")
+    return 0
+
+
+def export_command(args):
+    def describe(bytes_read, total_bytes, rows):
+        percent = 100 * bytes_read / total_bytes if total_bytes else 100
+        return f"Exported {rows} results ({percent:.0f}%)"
+
+    path = args.output or ExportJob.output_path('results', args.format)
+    job = ExportJob(path, args.format, args.answers, args.exam, args.student)
+    outcome = run_job(job, describe)
+    if outcome is None:
+        return 1
+    rows, path = outcome
+    print(f"{rows} results exported to {path}")
+    return 0
+
+
+def regrade_command(args):
+    if args.question:
+        counts = Database.regrade_question(args.question)
+    else:
+        counts = Database.regrade_exams(set(args.exam) if args.exam else None)
+    print(f"{counts['changed']} scores changed")
+    if counts['skipped']:
+        print(f"{counts['skipped']} results skipped: the questions they were taken with "
+              f"are no longer available")
+    return 0
+
+
+def compact_command(args):
+    counts = Database.compact(prune_orphans=args.prune_orphans)
+    print(f"Removed {counts['temp_files']} temporary files, {counts['cache_entries']} "
+          f"expired cache entries, {counts['journals']} stale attempt journals "
+          f"and {counts['orphans']} orphaned results")
+    return 0
+
+
+def backup_command(args):
+    print(Database.backup(args.output))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="ems_cli", description="Batch operations for the Exam Management System")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="import trivia questions")
+    import_parser.add_argument("--amount", type=int, default=10, help="number of questions (1-50)")
+    import_parser.add_argument("--category", help="Open Trivia DB category id")
+    import_parser.add_argument("--difficulty", default="easy", choices=["easy", "medium", "hard"])
+    import_parser.add_argument("--no-cache", action="store_true",
+                               help="always fetch from the network")
+    import_parser.set_defaults(handler=import_command)
+
+    export_parser = commands.add_parser("export", help="export results")
+    export_parser.add_argument("--format", default="csv", choices=ExportJob.FORMATS)
+    export_parser.add_argument("--output", help="output path (default: results.<format>)")
+    export_parser.add_argument("--answers", action="store_true",
+                               help="include the answer to every question")
+    export_parser.add_argument("--exam", help="only results of this exam id")
+    export_parser.add_argument("--student", help="only results of this username")
+    export_parser.set_defaults(handler=export_command)
+
+    regrade_parser = commands.add_parser("regrade", help="rescore stored results")
+    regrade_parser.add_argument("--question", help="only exams containing this question id")
+    regrade_parser.add_argument("--exam", action="append", help="exam id (repeatable)")
+    regrade_parser.set_defaults(handler=regrade_command)
+
+    compact_parser = commands.add_parser("compact", help="clean up data files and caches")
+    compact_parser.add_argument("--prune-orphans", action="store_true",
+                                help="delete results of deleted exams and students")
+    compact_parser.set_defaults(handler=compact_command)
+
+    backup_parser = commands.add_parser("backup", help="zip the data directory")
+    backup_parser.add_argument("--output", default="backups", help="directory for the archive")
+    backup_parser.set_defaults(handler=backup_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "import" and not 1 <= args.amount <= 50:
+        print("Number of questions must be between 1 and 50", file=sys.stderr)
+        return 2
+    try:
+        return args.handler(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2859 @@
+import json
+import os
+import queue
+import threading
+import numpy as np
+import bisect
+import codecs
+import csv
+import hashlib
+import hmac
+import html
+import itertools
+import random
+import select
+import shutil
+import socket
+import sys
+import time
+import unicodedata
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+
+# Ensure data directory exists
+if not os.path.exists('data'):
+    os.makedirs('data')
+
+# Tạo file json nếu chưa tồn tại
+
+def initialize_json_files():
+    files = {
+        'users.json': {'teachers': [], 'students': []},
+        'questions.json': {'questions': []},
+        'exams.json': {'exams': []},
+        'attempts.json': {'attempts': []}
+    }
+
+    for filename, default_data in files.items():
+        filepath = os.path.join('data', filename)
+        if not os.path.exists(filepath):
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(default_data, f, ensure_ascii=False, indent=4)
+
+
+initialize_json_files()
+
+# Password hashing
+
+
+class PasswordHasher:
+    # Salted KDF hashes stored as 'scheme$cost$salt$hash' (hex). Schemes are
+    # registered by name with a derive(password, salt, cost) function, new
+    # hashes use DEFAULT_SCHEME at its COST. Unsalted SHA-256 hex digests from
+    # older versions still verify, and needs_upgrade() asks for a rehash
+    SALT_BYTES = 16
+    DEFAULT_SCHEME = 'scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2'
+    # Tunable cost per scheme, kept in the hash so old costs still verify:
+    # scrypt 'n:r:p' (about 60 ms at 2^14), pbkdf2 the iteration count
+    COST = {'scrypt': '16384:8:1', 'pbkdf2': '600000'}
+    SCHEMES = {}
+
+    # Recently verified passwords, so repeated logins of a user skip the KDF.
+    # Entries are an HMAC of the password under a random per-process key and
+    # live in memory only, for at most CACHE_TTL seconds
+    CACHE_SIZE = 1024
+    CACHE_TTL = 300
+    _cache = OrderedDict()
+    _cache_key = os.urandom(32)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def derive_scrypt(password, salt, cost):
+        n, r, p = (int(value) for value in cost.split(':'))
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + (1 << 20), dklen=32)
+
+    @staticmethod
+    def derive_pbkdf2(password, salt, cost):
+        return hashlib.pbkdf2_hmac('sha256', password, salt, int(cost))
+
+    @classmethod
+    def register(cls, scheme, derive, cost):
+        cls.SCHEMES[scheme] = derive
+        cls.COST[scheme] = cost
+
+    @staticmethod
+    def is_legacy(stored):
+        return '$' not in stored
+
+    @classmethod
+    def hash(cls, password, scheme=None):
+        scheme = scheme or cls.DEFAULT_SCHEME
+        cost = cls.COST[scheme]
+        salt = os.urandom(cls.SALT_BYTES)
+        digest = cls.SCHEMES[scheme](password.encode('utf-8'), salt, cost)
+        return f"{scheme}${cost}${salt.hex()}${digest.hex()}"
+
+    @classmethod
+    def _cache_digest(cls, password):
+        return hmac.new(cls._cache_key, password.encode('utf-8'), hashlib.sha256).digest()
+
+    @classmethod
+    def verify(cls, password, stored):
+        if not stored:
+            return False
+        cached_digest = cls._cache_digest(password)
+        now = time.monotonic()
+        with cls._lock:
+            cached = cls._cache.get(stored)
+            if cached and cached[1] > now and hmac.compare_digest(cached[0], cached_digest):
+                return True
+
+        if cls.is_legacy(stored):
+            valid = hmac.compare_digest(
+                hashlib.sha256(password.encode()).hexdigest(), stored)
+        else:
+            try:
+                scheme, cost, salt, digest = stored.split('$')
+                derived = cls.SCHEMES[scheme](password.encode('utf-8'), bytes.fromhex(salt), cost)
+            except (KeyError, ValueError):
+                return False
+            valid = hmac.compare_digest(derived.hex(), digest)
+
+        if valid:
+            cls.remember(password, stored)
+        return valid
+
+    @classmethod
+    def remember(cls, password, stored):
+        # Mark a hash as verified for this password, e.g. right after a rehash
+        with cls._lock:
+            cls._cache[stored] = (cls._cache_digest(password), time.monotonic() + cls.CACHE_TTL)
+            cls._cache.move_to_end(stored)
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+    @classmethod
+    def needs_upgrade(cls, stored):
+        if cls.is_legacy(stored):
+            return True
+        scheme, cost = stored.split('$')[:2]
+        return scheme != cls.DEFAULT_SCHEME or cost != cls.COST[scheme]
+
+
+PasswordHasher.register('scrypt', PasswordHasher.derive_scrypt, PasswordHasher.COST['scrypt'])
+PasswordHasher.register('pbkdf2', PasswordHasher.derive_pbkdf2, PasswordHasher.COST['pbkdf2'])
+
+# Base User class
+
+class User:
+    def __init__(self, username, password, full_name):
+        self.username = username
+        # Hash the password for security, None when the caller sets the hash
+        self.password = User.hash_password(password) if password is not None else None
+        self.full_name = full_name
+
+    @staticmethod
+    def hash_password(password):
+        return PasswordHasher.hash(password)
+
+    def to_dict(self):
+        return {
+            'username': self.username,
+            'password': self.password,
+            'full_name': self.full_name
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        user = cls(data['username'], None, data['full_name'])
+        user.password = data['password']  # Already hashed
+        return user
+
+# Teacher class
+
+
+class Teacher(User):
+    def __init__(self, username, password, full_name):
+        super().__init__(username, password, full_name)
+        self.role = 'teacher'
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['role'] = self.role
+        return data
+
+# Student class
+
+
+class Student(User):
+    def __init__(self, username, password, full_name):
+        super().__init__(username, password, full_name)
+        self.role = 'student'
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['role'] = self.role
+        return data
+
+# Id generator
+
+
+class IdGenerator:
+    # k-sortable ids: "<prefix>_<UTC yyyymmddHHMMSSmmm>_<counter><node>"
+    # The timestamp never goes backwards within a process, the counter makes
+    # ids unique within one millisecond and the node id separates processes
+    _lock = threading.Lock()
+    _last_ms = 0
+    _counter = 0
+    _pid = None
+    _node = None
+
+    COUNTER_LIMIT = 10000
+
+    @classmethod
+    def _node_id(cls):
+        # Re-derive the node id after a fork so child processes never share it
+        pid = os.getpid()
+        if cls._pid != pid:
+            seed = f"{socket.gethostname()}:{pid}:{os.urandom(8).hex()}"
+            cls._node = hashlib.sha1(seed.encode()).hexdigest()[:6]
+            cls._pid = pid
+            cls._last_ms = 0
+            cls._counter = 0
+        return cls._node
+
+    @staticmethod
+    def _format_ms(ms):
+        seconds, millis = divmod(ms, 1000)
+        return time.strftime('%Y%m%d%H%M%S', time.gmtime(seconds)) + f"{millis:03d}"
+
+    @classmethod
+    def next_id(cls, prefix):
+        with cls._lock:
+            node = cls._node_id()
+            now_ms = time.time_ns() // 1_000_000
+
+            if now_ms > cls._last_ms:
+                cls._last_ms = now_ms
+                cls._counter = 0
+            else:
+                # Same millisecond or clock moved back: keep counting from the last timestamp
+                cls._counter += 1
+                if cls._counter >= cls.COUNTER_LIMIT:
+                    cls._last_ms += 1
+                    cls._counter = 0
+
+            return f"{prefix}_{cls._format_ms(cls._last_ms)}_{cls._counter:04d}{node}"
+
+# Question class
+
+
+class Question:
+    def __init__(self, id=None, text='', options=None, correct_answer=0, category=''):
+        self.id = id if id else self._generate_id()
+        self.text = text
+        self.options = options if options else ['', '', '', '']
+        self.correct_answer = correct_answer
+        self.category = category
+
+    def _generate_id(self):
+        return IdGenerator.next_id('q')
+
+    def fingerprint(self):
+        # Dedup key, computed on the normalized text and option set. Stored
+        # questions may predate import normalization (HTML-escaped, odd
+        # spacing), so they are normalized here the same way
+        normalize = DataCrawler.normalize_text
+        key = '\x1f'.join([normalize(self.text).casefold()] +
+                           sorted(normalize(option).casefold() for option in self.options))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'text': self.text,
+            'options': self.options,
+            'correct_answer': self.correct_answer,
+            'category': self.category
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            id=data['id'],
+            text=data['text'],
+            options=data['options'],
+            correct_answer=data['correct_answer'],
+            category=data['category']
+        )
+
+# Exam class
+
+
+class Exam:
+    def __init__(self, id=None, title='', description='', questions=None, time_limit=60,
+                 questions_changed_at=None):
+        self.id = id if id else self._generate_id()
+        self.title = title
+        self.description = description
+        self.questions = questions if questions else []
+        self.time_limit = time_limit  # in minutes
+        # When the question list last changed; answers of older results that
+        # did not record their question ids no longer line up with it
+        self.questions_changed_at = questions_changed_at
+
+    def _generate_id(self):
+        return IdGenerator.next_id('e')
+
+    def add_question(self, question_id):
+        if question_id not in self.questions:
+            self.questions.append(question_id)
+
+    def remove_question(self, question_id):
+        if question_id in self.questions:
+            self.questions.remove(question_id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'questions': self.questions,
+            'time_limit': self.time_limit,
+            'questions_changed_at': self.questions_changed_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            id=data['id'],
+            title=data['title'],
+            description=data['description'],
+            questions=data['questions'],
+            time_limit=data['time_limit'],
+            questions_changed_at=data.get('questions_changed_at')
+        )
+
+# Result class
+
+
+class Result:
+    def __init__(self, student_username, exam_id, score, answers=None, date=None, id=None,
+                 question_ids=None):
+        self.id = id if id else IdGenerator.next_id('r')
+        self.student_username = student_username
+        self.exam_id = exam_id
+        self.score = score
+        self.answers = answers if answers else {}
+        self.date = date if date else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Ids of the graded questions, answers are keyed by position in this list
+        self.question_ids = question_ids
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'student_username': self.student_username,
+            'exam_id': self.exam_id,
+            'score': self.score,
+            'answers': self.answers,
+            'date': self.date
+        }
+        if self.question_ids is not None:
+            data['question_ids'] = self.question_ids
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            student_username=data['student_username'],
+            exam_id=data['exam_id'],
+            score=data['score'],
+            # JSON turns the question index keys into strings
+            answers={int(k): v for k, v in data['answers'].items()},
+            date=data['date'],
+            id=data.get('id'),
+            question_ids=data.get('question_ids')
+        )
+
+    @staticmethod
+    def taken_question_ids(row, exam, bank):
+        # Ids of the questions a stored result (a row or to_dict()) was taken
+        # with, its answers are keyed by position in this list. Older results
+        # did not record them: the exam's current list, less questions missing
+        # from the bank, is used unless it changed after the result was taken.
+        # None when that can no longer be told
+        if row.get('question_ids') is not None:
+            return list(row['question_ids'])
+        if exam.questions_changed_at and row['date'] <= exam.questions_changed_at:
+            return None
+        return [question_id for question_id in exam.questions if question_id in bank]
+
+    @staticmethod
+    def realign(answers, question_ids, target_ids):
+        # Re-key answers from positions in question_ids to positions in
+        # target_ids, answers to questions not in target_ids are dropped
+        positions = {question_id: i for i, question_id in enumerate(target_ids)}
+        realigned = {}
+        for index, option in answers.items():
+            index = int(index)
+            if 0 <= index < len(question_ids) and question_ids[index] in positions:
+                realigned[positions[question_ids[index]]] = option
+        return realigned
+
+# Attempt class
+
+
+class Attempt:
+    # An exam in progress. started_at is wall-clock time so the deadline
+    # survives restarts, the UI maps it onto time.monotonic() for display
+    GRACE = 5  # seconds allowed for the final submit to arrive
+
+    def __init__(self, student_username, exam_id, time_limit, started_at=None, id=None):
+        self.id = id if id else IdGenerator.next_id('a')
+        self.student_username = student_username
+        self.exam_id = exam_id
+        self.time_limit = time_limit  # in minutes
+        self.started_at = started_at if started_at is not None else time.time()
+
+    @property
+    def deadline(self):
+        return self.started_at + self.time_limit * 60
+
+    def remaining(self, now=None):
+        now = time.time() if now is None else now
+        return max(0.0, self.deadline - now)
+
+    def is_overdue(self, now=None):
+        now = time.time() if now is None else now
+        return now > self.deadline + Attempt.GRACE
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'student_username': self.student_username,
+            'exam_id': self.exam_id,
+            'time_limit': self.time_limit,
+            'started_at': self.started_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            student_username=data['student_username'],
+            exam_id=data['exam_id'],
+            time_limit=data['time_limit'],
+            started_at=data['started_at'],
+            id=data['id']
+        )
+
+# Attempt journal
+
+
+class AttemptJournal:
+    # Append-only log of the answers given during an attempt, one line per
+    # click: "<attempt id> <question index> <option> <timestamp>". Appends only
+    # reach the OS page cache, a shared background thread fsyncs every dirty
+    # journal once per FSYNC_INTERVAL so many clicks share one disk flush
+    DIRECTORY = os.path.join('data', 'journal')
+    FSYNC_INTERVAL = 0.2  # in seconds
+
+    _lock = threading.Lock()
+    _dirty = set()
+    _flusher = None
+
+    def __init__(self, attempt_id):
+        if not os.path.exists(AttemptJournal.DIRECTORY):
+            os.makedirs(AttemptJournal.DIRECTORY)
+        self.attempt_id = attempt_id
+        self.file = open(AttemptJournal.path(attempt_id), 'ab', buffering=0)
+
+    @staticmethod
+    def path(attempt_id):
+        return os.path.join(AttemptJournal.DIRECTORY, f"{attempt_id}.log")
+
+    def append(self, question_index, option):
+        self.file.write(f"{self.attempt_id} {question_index} {option} {time.time():.3f}\n".encode())
+        with AttemptJournal._lock:
+            AttemptJournal._dirty.add(self)
+            if AttemptJournal._flusher is None:
+                AttemptJournal._flusher = threading.Thread(
+                    target=AttemptJournal._flush_loop, daemon=True)
+                AttemptJournal._flusher.start()
+
+    def sync(self):
+        if not self.file.closed:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        with AttemptJournal._lock:
+            AttemptJournal._dirty.discard(self)
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    @staticmethod
+    def _flush_loop():
+        while True:
+            time.sleep(AttemptJournal.FSYNC_INTERVAL)
+            with AttemptJournal._lock:
+                dirty = list(AttemptJournal._dirty)
+                AttemptJournal._dirty.clear()
+            for journal in dirty:
+                try:
+                    journal.sync()
+                except (OSError, ValueError):
+                    pass
+
+    @staticmethod
+    def replay(attempt_id, deadline=None):
+        # Rebuild {question index: option}, the last click on a question wins.
+        # A torn final line from a crash and clicks after the deadline are skipped
+        answers = {}
+        try:
+            with open(AttemptJournal.path(attempt_id), 'rb') as f:
+                for line in f:
+                    parts = line.split()
+                    if not line.endswith(b'\n') or len(parts) != 4:
+                        continue
+                    if deadline is not None and float(parts[3]) > deadline:
+                        continue
+                    answers[int(parts[1])] = int(parts[2])
+        except FileNotFoundError:
+            pass
+        return answers
+
+    @staticmethod
+    def discard(attempt_id):
+        try:
+            os.remove(AttemptJournal.path(attempt_id))
+        except FileNotFoundError:
+            pass
+
+# Sharded results storage
+
+
+class ResultShards:
+    # Results are stored per exam in data/results/<exam id>.json, each holding
+    # the usual {'results': [...]}, next to a small manifest.json with
+    # {'shards': {exam_id: {'file': name, 'count': n}}}. The secondary index
+    # by student, {username: {exam_id: n}}, is split over the hash buckets in
+    # data/results/students/ so a write only touches the buckets of its
+    # students. The manifest is saved last on every change, so its version is
+    # the version of the store. A results.json from older versions is split
+    # into shards on first use
+    DIRECTORY = 'results'
+    MANIFEST = os.path.join('results', 'manifest.json')
+    STUDENTS = os.path.join('results', 'students')
+    STUDENT_BUCKETS = 64
+    LEGACY = 'results.json'
+
+    # Held by writers from loading the manifest until it is saved
+    lock = threading.RLock()
+    _manifest = None
+    _version = None
+    _buckets = {}
+
+    @staticmethod
+    def shard_name(exam_id):
+        # Exam ids make safe file names, anything else gets a stable hash
+        if (exam_id and exam_id != 'manifest' and len(exam_id) <= 100 and
+                all(c.isalnum() or c in '-_' for c in exam_id)):
+            return f"{exam_id}.json"
+        return f"x_{hashlib.sha1(exam_id.encode('utf-8')).hexdigest()}.json"
+
+    @staticmethod
+    def shard_file(exam_id):
+        # Relative to data/, like the names Database.load_data takes
+        return os.path.join(ResultShards.DIRECTORY, ResultShards.shard_name(exam_id))
+
+    @staticmethod
+    def shard_version(exam_id):
+        return ChangeBus.file_version(ResultShards.shard_file(exam_id))
+
+    @staticmethod
+    def load_shard(exam_id):
+        return Database.load_data(ResultShards.shard_file(exam_id)).get('results', [])
+
+    @staticmethod
+    def student_bucket(username):
+        number = hashlib.sha1(username.encode('utf-8')).digest()[0] % ResultShards.STUDENT_BUCKETS
+        return os.path.join(ResultShards.STUDENTS, f"{number:02d}.json")
+
+    @classmethod
+    def manifest(cls):
+        # Cached manifest, read again when the file changed on disk
+        with cls.lock:
+            version = ChangeBus.file_version(cls.MANIFEST)
+            if version is None:
+                cls._initialize()
+                version = ChangeBus.file_version(cls.MANIFEST)
+            if version != cls._version:
+                cls._manifest = {'shards': Database.load_data(cls.MANIFEST).get('shards', {})}
+                cls._version = version
+            return cls._manifest
+
+    @classmethod
+    def save_manifest(cls, manifest):
+        with cls.lock:
+            Database.save_data(cls.MANIFEST, manifest)
+            cls._manifest = manifest
+            cls._version = ChangeBus.file_version(cls.MANIFEST)
+
+    @classmethod
+    def exam_ids(cls):
+        with cls.lock:
+            return list(cls.manifest()['shards'])
+
+    @classmethod
+    def _bucket(cls, filename):
+        # Cached student index bucket, read again when the file changed
+        version = ChangeBus.file_version(filename)
+        cached = cls._buckets.get(filename)
+        if cached is None or cached[0] != version:
+            cached = cls._buckets[filename] = (version, Database.load_data(filename))
+        return cached[1]
+
+    @classmethod
+    def student_exam_ids(cls, username):
+        # Through the secondary index, so only this student's shards are read
+        with cls.lock:
+            shards = cls.manifest()['shards']
+            exams = cls._bucket(cls.student_bucket(username)).get(username, {})
+            return [exam_id for exam_id in exams if exam_id in shards]
+
+    @classmethod
+    def _count_students(cls, exam_id, rows, sign):
+        # Add or remove rows in the student index, one save per bucket
+        by_bucket = {}
+        for row in rows:
+            username = row['student_username']
+            by_bucket.setdefault(cls.student_bucket(username), []).append(username)
+        for filename, usernames in by_bucket.items():
+            bucket = cls._bucket(filename)
+            for username in usernames:
+                exams = bucket.setdefault(username, {})
+                exams[exam_id] = exams.get(exam_id, 0) + sign
+                if exams[exam_id] <= 0:
+                    del exams[exam_id]
+                if not exams:
+                    del bucket[username]
+            Database.save_data(filename, bucket)
+            cls._buckets[filename] = (ChangeBus.file_version(filename), bucket)
+
+    @classmethod
+    def write(cls, manifest, exam_id, rows, added=(), removed=()):
+        # Replace one exam's shard and update the index for the rows added
+        # and removed. The caller saves the manifest once all shards of a
+        # change are written
+        if not rows:
+            cls.drop(manifest, exam_id)
+            return
+        Database.save_data(cls.shard_file(exam_id), {'results': rows})
+        manifest['shards'][exam_id] = {'file': cls.shard_name(exam_id), 'count': len(rows)}
+        if added:
+            cls._count_students(exam_id, added, 1)
+        if removed:
+            cls._count_students(exam_id, removed, -1)
+
+    @classmethod
+    def drop(cls, manifest, exam_id):
+        # Delete a whole shard, no other shard is read or written. Returns the
+        # usernames that had results in it
+        rows = cls.load_shard(exam_id)
+        manifest['shards'].pop(exam_id, None)
+        try:
+            os.remove(os.path.join('data', cls.shard_file(exam_id)))
+        except FileNotFoundError:
+            pass
+        cls._count_students(exam_id, rows, -1)
+        return sorted({row['student_username'] for row in rows})
+
+    @classmethod
+    def rebuild_manifest(cls):
+        # The manifest and student index are derived from the shards, rebuild
+        # them after a crash left them out of step
+        with cls.lock:
+            cls.manifest()
+            for filename in os.listdir(os.path.join('data', cls.STUDENTS)):
+                os.remove(os.path.join('data', cls.STUDENTS, filename))
+            cls._buckets = {}
+
+            manifest = {'shards': {}}
+            for filename in sorted(os.listdir(os.path.join('data', cls.DIRECTORY))):
+                if not filename.endswith('.json') or filename == 'manifest.json':
+                    continue
+                rows = Database.load_data(os.path.join(cls.DIRECTORY, filename)).get('results', [])
+                if rows:
+                    exam_id = rows[0]['exam_id']
+                    manifest['shards'][exam_id] = {'file': filename, 'count': len(rows)}
+                    cls._count_students(exam_id, rows, 1)
+            cls.save_manifest(manifest)
+            return manifest
+
+    @classmethod
+    def _initialize(cls):
+        # A new data directory, or one with a results.json from before sharding
+        os.makedirs(os.path.join('data', cls.STUDENTS), exist_ok=True)
+        manifest = {'shards': {}}
+        legacy = os.path.join('data', cls.LEGACY)
+        if os.path.exists(legacy):
+            by_exam = {}
+            for row in Database.load_data(cls.LEGACY)['results']:
+                # Results saved before ids existed get one now
+                if not row.get('id'):
+                    row['id'] = IdGenerator.next_id('r')
+                by_exam.setdefault(row['exam_id'], []).append(row)
+            for exam_id, rows in by_exam.items():
+                cls.write(manifest, exam_id, rows, added=rows)
+        cls.save_manifest(manifest)
+        if os.path.exists(legacy):
+            # Kept for safety, backups and the watcher ignore it
+            os.replace(legacy, legacy + '.migrated')
+
+# Result index
+
+
+class ResultIndex:
+    # In-memory secondary indexes per result shard, built when a shard is
+    # first read, rebuilt only when that shard changes on disk and extended
+    # in place for our own appends. Each index keeps (dates, positions) in
+    # date order so date ranges are a bisect. Writers hold ResultShards.lock
+    # and then take _lock, so readers ask ResultShards for what they need
+    # before taking _lock and never the other way round
+    _lock = threading.RLock()
+    shards = {}
+
+    @staticmethod
+    def _insert(entries, date, position):
+        dates, positions = entries
+        at = bisect.bisect_right(dates, date)
+        dates.insert(at, date)
+        positions.insert(at, position)
+
+    @staticmethod
+    def _add_row(shard, row):
+        position = len(shard['rows'])
+        shard['rows'].append(row)
+        shard['by_id'][row['id']] = position
+        ResultIndex._insert(shard['all'], row['date'], position)
+        ResultIndex._insert(shard['by_student'].setdefault(row['student_username'], ([], [])),
+                            row['date'], position)
+
+    @classmethod
+    def invalidate(cls, exam_id=None):
+        with cls._lock:
+            if exam_id is None:
+                cls.shards.clear()
+            else:
+                cls.shards.pop(exam_id, None)
+
+    @classmethod
+    def shard(cls, exam_id):
+        # The index of one exam's shard, read again if the file changed. The
+        # manifest is loaded first so a results.json is migrated before any
+        # shard is read
+        ResultShards.manifest()
+        with cls._lock:
+            return cls._shard(exam_id)
+
+    @classmethod
+    def _shard(cls, exam_id):
+        # Caller holds _lock
+        version = ResultShards.shard_version(exam_id)
+        shard = cls.shards.get(exam_id)
+        if shard is None or shard['version'] != version:
+            shard = {'version': version, 'rows': [], 'by_id': {}, 'all': ([], []),
+                     'by_student': {}}
+            for row in ResultShards.load_shard(exam_id):
+                cls._add_row(shard, row)
+            cls.shards[exam_id] = shard
+        return shard
+
+    @classmethod
+    def appended(cls, exam_id, rows):
+        # Extend a shard's index after our own append instead of re-reading it
+        with cls._lock:
+            shard = cls.shards.get(exam_id)
+            if shard is not None:
+                for row in rows:
+                    cls._add_row(shard, row)
+                shard['version'] = ResultShards.shard_version(exam_id)
+
+    @classmethod
+    def get(cls, result_id, exam_id=None):
+        # With the result's exam id only that shard is read, otherwise the
+        # shards already in memory are tried first, they hold what is on screen
+        exam_ids = [exam_id] if exam_id is not None else ResultShards.exam_ids()
+        with cls._lock:
+            if exam_id is None:
+                exam_ids = ([e for e in cls.shards if e in exam_ids] +
+                            [e for e in exam_ids if e not in cls.shards])
+            for shard_exam_id in exam_ids:
+                shard = cls._shard(shard_exam_id)
+                position = shard['by_id'].get(result_id)
+                if position is not None:
+                    return Result.from_dict(shard['rows'][position])
+            return None
+
+    @classmethod
+    def query(cls, exam_id=None, student_username=None, date_from=None, date_to=None,
+              min_score=None, max_score=None):
+        # Dates are 'YYYY-MM-DD[ HH:MM:SS]' strings, date_to is inclusive
+        if exam_id is not None:
+            ResultShards.manifest()
+            exam_ids = [exam_id]
+        elif student_username is not None:
+            exam_ids = ResultShards.student_exam_ids(student_username)
+        else:
+            exam_ids = ResultShards.exam_ids()
+        if date_to and len(date_to) <= 10:
+            date_to += ' 23:59:59'
+
+        with cls._lock:
+            matches = []
+            for shard_exam_id in exam_ids:
+                shard = cls._shard(shard_exam_id)
+                if student_username is not None:
+                    entries = shard['by_student'].get(student_username, ([], []))
+                else:
+                    entries = shard['all']
+
+                dates, positions = entries
+                start = bisect.bisect_left(dates, date_from) if date_from else 0
+                end = bisect.bisect_right(dates, date_to) if date_to else len(dates)
+                for position in positions[start:end]:
+                    row = shard['rows'][position]
+                    if min_score is not None and row['score'] < min_score:
+                        continue
+                    if max_score is not None and row['score'] > max_score:
+                        continue
+                    matches.append(row)
+
+            if len(exam_ids) > 1:
+                matches.sort(key=lambda row: row['date'])
+            return [Result.from_dict(row) for row in matches]
+
+# Change notifications
+
+
+class ChangeEvent:
+    # entity is 'user', 'question', 'exam', 'result' or 'attempt' and op is
+    # 'insert', 'update' or 'delete'. op 'reload' (with id None) means any
+    # number of rows may have changed, e.g. a bulk rewrite or another process.
+    # Inserts and updates made by this process carry the written object in
+    # data, so listeners can apply them without reading the file back
+    def __init__(self, entity, id, op, data=None):
+        self.entity = entity
+        self.id = id
+        self.op = op
+        self.data = data
+
+    def __repr__(self):
+        return f"ChangeEvent({self.entity!r}, {self.id!r}, {self.op!r})"
+
+
+class ChangeBus:
+    # Database publishes a ChangeEvent once a write is on disk. Callbacks run
+    # on the writing thread (an import job, the watcher), so UI code should
+    # hand events to its own thread through a queue
+    FILES = {
+        'users.json': 'user',
+        'questions.json': 'question',
+        'exams.json': 'exam',
+        os.path.join('results', 'manifest.json'): 'result',
+        'attempts.json': 'attempt'
+    }
+
+    _lock = threading.Lock()
+    # Held while a data file is swapped in, so the watcher never sees our own
+    # write before its version is recorded
+    write_lock = threading.Lock()
+    _subscribers = []
+    # filename -> file version this process last wrote or saw
+    _versions = {}
+
+    @classmethod
+    def subscribe(cls, callback, entities=None):
+        with cls._lock:
+            cls._subscribers.append((callback, set(entities) if entities else None))
+
+    @classmethod
+    def unsubscribe(cls, callback):
+        with cls._lock:
+            cls._subscribers = [s for s in cls._subscribers if s[0] != callback]
+
+    @classmethod
+    def publish(cls, entity, id=None, op='reload', data=None):
+        event = ChangeEvent(entity, id, op, data)
+        with cls._lock:
+            subscribers = list(cls._subscribers)
+        for callback, entities in subscribers:
+            if entities is None or entity in entities:
+                try:
+                    callback(event)
+                except Exception:
+                    # The write is already committed, a broken subscriber must not undo it
+                    pass
+
+    @staticmethod
+    def file_version(filename):
+        try:
+            stat = os.stat(os.path.join('data', filename))
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def saved(cls, filename):
+        # Called by Database.save_data so the watcher does not report our own writes
+        if filename in cls.FILES:
+            version = cls.file_version(filename)
+            with cls._lock:
+                cls._versions[filename] = version
+
+    @classmethod
+    def changed(cls, filename):
+        # True when the file differs from the version last written or seen
+        with cls.write_lock, cls._lock:
+            version = cls.file_version(filename)
+            if filename in cls._versions and cls._versions[filename] == version:
+                return False
+            cls._versions[filename] = version
+            return True
+
+
+class DataWatcher:
+    # Publishes 'reload' events when another process (ems_server, ems_cli, a
+    # second window) changes a data file. Uses inotify on Linux and otherwise
+    # polls file versions; writes of this process are recognised by version
+    POLL_INTERVAL = 1.0
+    # IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    INOTIFY_MASK = 0x008 | 0x080 | 0x100 | 0x200
+
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or DataWatcher.POLL_INTERVAL
+        self._stop = threading.Event()
+        self._thread = None
+        self._fd = None
+
+    @staticmethod
+    def _inotify_open(directories):
+        # inotify through libc, None where it is not available
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            for directory in directories:
+                if libc.inotify_add_watch(fd, os.fsencode(directory), DataWatcher.INOTIFY_MASK) < 0:
+                    os.close(fd)
+                    return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def uses_inotify(self):
+        return self._fd is not None
+
+    def start(self):
+        # The current files are the baseline, only later changes are reported
+        ResultShards.manifest()
+        for filename in ChangeBus.FILES:
+            ChangeBus.changed(filename)
+        self._fd = DataWatcher._inotify_open(['data', os.path.join('data', ResultShards.DIRECTORY)])
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2 * self.poll_interval)
+            self._thread = None
+
+    def check(self):
+        for filename, entity in ChangeBus.FILES.items():
+            if ChangeBus.changed(filename):
+                ChangeBus.publish(entity)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if self._fd is not None:
+                    ready, _, _ = select.select([self._fd], [], [], self.poll_interval)
+                    if ready:
+                        # Only the wake-up matters, file versions say what changed
+                        try:
+                            while os.read(self._fd, 4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                else:
+                    self._stop.wait(self.poll_interval)
+                if not self._stop.is_set():
+                    self.check()
+        finally:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+# User index
+
+
+class UserIndex:
+    # username -> (user class, stored row), rebuilt only when users.json
+    # changes on disk so logins do not scan every account
+    _lock = threading.Lock()
+    _version = None
+    by_username = {}
+
+    @classmethod
+    def get(cls, username):
+        with cls._lock:
+            version = ChangeBus.file_version('users.json')
+            if version != cls._version or version is None:
+                data = Database.load_data('users.json')
+                cls.by_username = {}
+                # Teachers first, like the original lookup order
+                for user_class, rows in ((Teacher, data['teachers']), (Student, data['students'])):
+                    for row in rows:
+                        cls.by_username.setdefault(row['username'], (user_class, row))
+                cls._version = version
+            return cls.by_username.get(username)
+
+# Database handler
+
+
+class Database:
+    # Guards read-modify-write of users.json, which the server also does from
+    # worker threads when it upgrades password hashes at login
+    users_lock = threading.RLock()
+
+    @staticmethod
+    def load_data(filename):
+        filepath = os.path.join('data', filename)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Return empty data if file doesn't exist or is invalid
+            if filename == 'users.json':
+                return {'teachers': [], 'students': []}
+            elif filename == 'questions.json':
+                return {'questions': []}
+            elif filename == 'exams.json':
+                return {'exams': []}
+            elif filename == 'results.json':
+                return {'results': []}
+            elif filename == 'attempts.json':
+                return {'attempts': []}
+            return {}
+
+    @staticmethod
+    def save_data(filename, data):
+        # Write to a temporary file and swap it in, so a file is never half written.
+        # Result shards and statistics are written without indentation so json
+        # uses its C encoder
+        filepath = os.path.join('data', filename)
+        tmp_path = filepath + '.tmp'
+        compact = filename.startswith((ResultShards.DIRECTORY + os.sep, ScoreStats.DIRECTORY))
+        indent = None if compact else 4
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False, indent=indent))
+        with ChangeBus.write_lock:
+            os.replace(tmp_path, filepath)
+            ChangeBus.saved(filename)
+
+    @staticmethod
+    def authenticate_user(username, password):
+        entry = UserIndex.get(username)
+        if entry is None:
+            return None
+        user_class, row = entry
+        if not PasswordHasher.verify(password, row['password']):
+            return None
+
+        user = user_class.from_dict(row)
+        # Rehash legacy or outdated hashes while the password is at hand
+        if PasswordHasher.needs_upgrade(row['password']):
+            user.password = PasswordHasher.hash(password)
+            Database.update_user(user)
+            PasswordHasher.remember(password, user.password)
+        return user
+
+    @staticmethod
+    def add_user(user):
+        with Database.users_lock:
+            data = Database.load_data('users.json')
+
+            # Check if username already exists
+            for teacher in data['teachers']:
+                if teacher['username'] == user.username:
+                    return False
+
+            for student in data['students']:
+                if student['username'] == user.username:
+                    return False
+
+            # Add user to appropriate list
+            if user.role == 'teacher':
+                data['teachers'].append(user.to_dict())
+            else:
+                data['students'].append(user.to_dict())
+
+            Database.save_data('users.json', data)
+            ChangeBus.publish('user', user.username, 'insert', user)
+            return True
+
+    @staticmethod
+    def get_all_users():
+        data = Database.load_data('users.json')
+        teachers = [Teacher.from_dict(t) for t in data['teachers']]
+        students = [Student.from_dict(s) for s in data['students']]
+        return teachers, students
+
+    @staticmethod
+    def update_user(user):
+        with Database.users_lock:
+            data = Database.load_data('users.json')
+
+            if user.role == 'teacher':
+                for i, teacher in enumerate(data['teachers']):
+                    if teacher['username'] == user.username:
+                        data['teachers'][i] = user.to_dict()
+                        Database.save_data('users.json', data)
+                        ChangeBus.publish('user', user.username, 'update', user)
+                        return True
+            else:
+                for i, student in enumerate(data['students']):
+                    if student['username'] == user.username:
+                        data['students'][i] = user.to_dict()
+                        Database.save_data('users.json', data)
+                        ChangeBus.publish('user', user.username, 'update', user)
+                        return True
+
+            return False
+
+    @staticmethod
+    def delete_user(username, role):
+        with Database.users_lock:
+            data = Database.load_data('users.json')
+
+            if role == 'teacher':
+                data['teachers'] = [t for t in data['teachers']
+                                    if t['username'] != username]
+            else:
+                data['students'] = [s for s in data['students']
+                                    if s['username'] != username]
+
+            Database.save_data('users.json', data)
+        ChangeBus.publish('user', username, 'delete')
+
+    @staticmethod
+    def add_question(question):
+        data = Database.load_data('questions.json')
+        # Never store two questions under the same id
+        if any(q['id'] == question.id for q in data['questions']):
+            question.id = question._generate_id()
+        data['questions'].append(question.to_dict())
+        Database.save_data('questions.json', data)
+        ChangeBus.publish('question', question.id, 'insert', question)
+
+    @staticmethod
+    def add_questions(questions):
+        # Batch insert with a single read and write of questions.json
+        data = Database.load_data('questions.json')
+        existing_ids = {q['id'] for q in data['questions']}
+        added = []
+        for question in questions:
+            if question.id in existing_ids:
+                question.id = question._generate_id()
+            existing_ids.add(question.id)
+            data['questions'].append(question.to_dict())
+            added.append(question)
+        if added:
+            Database.save_data('questions.json', data)
+            for question in added:
+                ChangeBus.publish('question', question.id, 'insert', question)
+        return len(added)
+
+    @staticmethod
+    def get_question_fingerprints():
+        return {question.fingerprint() for question in Database.get_all_questions()}
+
+    @staticmethod
+    def get_all_questions():
+        data = Database.load_data('questions.json')
+        return [Question.from_dict(q) for q in data['questions']]
+
+    @staticmethod
+    def get_questions_for_exam(exam):
+        # Canonical question list of an exam, read with a single load
+        data = Database.load_data('questions.json')
+        by_id = {q['id']: q for q in data['questions']}
+        return [Question.from_dict(by_id[question_id])
+                for question_id in exam.questions if question_id in by_id]
+
+    @staticmethod
+    def get_question_by_id(question_id):
+        data = Database.load_data('questions.json')
+        for q in data['questions']:
+            if q['id'] == question_id:
+                return Question.from_dict(q)
+        return None
+
+    @staticmethod
+    def update_question(question):
+        data = Database.load_data('questions.json')
+        for i, q in enumerate(data['questions']):
+            if q['id'] == question.id:
+                data['questions'][i] = question.to_dict()
+                Database.save_data('questions.json', data)
+                ItemAnalysis.invalidate()
+                ChangeBus.publish('question', question.id, 'update', question)
+                return True
+        return False
+
+    @staticmethod
+    def delete_question(question_id):
+        data = Database.load_data('questions.json')
+        data['questions'] = [
+            q for q in data['questions'] if q['id'] != question_id]
+        Database.save_data('questions.json', data)
+        ChangeBus.publish('question', question_id, 'delete')
+
+        # Also remove this question from any exams
+        exams_data = Database.load_data('exams.json')
+        changed = []
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for exam in exams_data['exams']:
+            if question_id in exam['questions']:
+                exam['questions'].remove(question_id)
+                exam['questions_changed_at'] = now
+                ItemAnalysis.invalidate(exam['id'])
+                changed.append(Exam.from_dict(exam))
+        Database.save_data('exams.json', exams_data)
+        for exam in changed:
+            ChangeBus.publish('exam', exam.id, 'update', exam)
+
+    @staticmethod
+    def add_exam(exam):
+        data = Database.load_data('exams.json')
+        if any(e['id'] == exam.id for e in data['exams']):
+            exam.id = exam._generate_id()
+        data['exams'].append(exam.to_dict())
+        Database.save_data('exams.json', data)
+        ExamPreview.store(exam)
+        ChangeBus.publish('exam', exam.id, 'insert', exam)
+
+    @staticmethod
+    def get_all_exams():
+        data = Database.load_data('exams.json')
+        return [Exam.from_dict(e) for e in data['exams']]
+
+    @staticmethod
+    def get_exam_by_id(exam_id):
+        data = Database.load_data('exams.json')
+        for e in data['exams']:
+            if e['id'] == exam_id:
+                return Exam.from_dict(e)
+        return None
+
+    @staticmethod
+    def update_exam(exam):
+        data = Database.load_data('exams.json')
+        for i, e in enumerate(data['exams']):
+            if e['id'] == exam.id:
+                if e['questions'] != exam.questions:
+                    exam.questions_changed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                else:
+                    exam.questions_changed_at = max(
+                        exam.questions_changed_at or '', e.get('questions_changed_at') or '') or None
+                data['exams'][i] = exam.to_dict()
+                Database.save_data('exams.json', data)
+                ItemAnalysis.invalidate(exam.id)
+                ExamPreview.store(exam)
+                ChangeBus.publish('exam', exam.id, 'update', exam)
+                return True
+        return False
+
+    @staticmethod
+    def delete_exam(exam_id):
+        data = Database.load_data('exams.json')
+        data['exams'] = [e for e in data['exams'] if e['id'] != exam_id]
+        Database.save_data('exams.json', data)
+        ExamPreview.invalidate(exam_id)
+        ChangeBus.publish('exam', exam_id, 'delete')
+
+        # Also remove results for this exam, which is just its shard
+        with ResultShards.lock:
+            manifest = ResultShards.manifest()
+            usernames = ResultShards.drop(manifest, exam_id)
+            ResultShards.save_manifest(manifest)
+        ResultIndex.invalidate(exam_id)
+        ItemAnalysis.invalidate(exam_id)
+        ScoreStats.rebuild_for([exam_id], usernames)
+        ChangeBus.publish('result')
+
+    @staticmethod
+    def get_question_exam_map():
+        # Reverse mapping question id -> ids of the exams that contain it
+        mapping = {}
+        for exam in Database.load_data('exams.json')['exams']:
+            for question_id in exam['questions']:
+                mapping.setdefault(question_id, []).append(exam['id'])
+        return mapping
+
+    @staticmethod
+    def regrade_question(question_id):
+        # Rescore only the results taken with the question: those of exams
+        # containing it and of exams whose question list changed, whose older
+        # results may still hold it. Only their shards are rewritten. Returns
+        # counts like regrade_exams
+        exam_ids = set(Database.get_question_exam_map().get(question_id, []))
+        exam_ids.update(exam.id for exam in Database.get_all_exams() if exam.questions_changed_at)
+        if not exam_ids:
+            return {'changed': 0, 'skipped': 0}
+        return Database.regrade_exams(exam_ids, question_id)
+
+    @staticmethod
+    def regrade_exams(exam_ids=None, question_id=None):
+        # Rescore the results of the given exams (all exams when None), or
+        # only those taken with question_id. Each result is graded against
+        # the questions it was taken with (Result.taken_question_ids). Results
+        # that cannot be matched to their questions any more are skipped.
+        # Returns both counts
+        counts = {'changed': 0, 'skipped': 0}
+        shard_ids = [exam_id for exam_id in ResultShards.exam_ids()
+                     if exam_ids is None or exam_id in exam_ids]
+        if not shard_ids:
+            return counts
+
+        questions = {q.id: q for q in Database.get_all_questions()}
+        exams = {e.id: e for e in Database.get_all_exams() if e.id in shard_ids}
+
+        changed = 0
+        regraded = []
+        usernames = set()
+        with ResultShards.lock:
+            manifest = ResultShards.manifest()
+            for exam_id in shard_ids:
+                if exam_id not in exams:
+                    continue
+                exam = exams[exam_id]
+                rows = ResultShards.load_shard(exam_id)
+                rows_by_questions = {}
+                for row in rows:
+                    question_ids = Result.taken_question_ids(row, exam, questions)
+                    if question_ids is None:
+                        if question_id is None or question_id in exam.questions:
+                            counts['skipped'] += 1
+                        continue
+                    if question_id is not None and question_id not in question_ids:
+                        continue
+                    if any(q not in questions for q in question_ids):
+                        # A question it was graded on has been deleted
+                        counts['skipped'] += 1
+                        continue
+                    rows_by_questions.setdefault(tuple(question_ids), []).append(row)
+
+                exam_changed = 0
+                for question_ids, group in rows_by_questions.items():
+                    engine = GradingEngine([questions[q] for q in question_ids])
+                    report = engine.grade([row['answers'] for row in group])
+                    for row, score in zip(group, report.scores):
+                        if row['score'] != score:
+                            row['score'] = score
+                            usernames.add(row['student_username'])
+                            exam_changed += 1
+                if exam_changed:
+                    ResultShards.write(manifest, exam_id, rows)
+                    ResultIndex.invalidate(exam_id)
+                    ItemAnalysis.invalidate(exam_id)
+                    regraded.append(exam_id)
+                    changed += exam_changed
+            if regraded:
+                ResultShards.save_manifest(manifest)
+
+        if changed:
+            ScoreStats.rebuild_for(regraded, usernames)
+            ChangeBus.publish('result')
+        counts['changed'] = changed
+        return counts
+
+    @staticmethod
+    def compact(prune_orphans=False):
+        # Housekeeping for batch jobs: drop leftover temporary files and expired
+        # cache entries, optionally results whose exam or student is gone, and
+        # rebuild the derived statistics. Returns what was done as counts
+        counts = {'temp_files': 0, 'cache_entries': DataCrawler.prune_cache(), 'orphans': 0,
+                  'journals': 0}
+        ResultShards.manifest()
+        for directory in ('data', os.path.join('data', ResultShards.DIRECTORY),
+                          os.path.join('data', ResultShards.STUDENTS),
+                          os.path.join('data', ScoreStats.DIRECTORY)):
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                if filename.endswith('.tmp'):
+                    os.remove(os.path.join(directory, filename))
+                    counts['temp_files'] += 1
+
+        # Journals of attempts that are no longer open
+        if os.path.exists(AttemptJournal.DIRECTORY):
+            open_ids = {a['id'] for a in Database.load_data('attempts.json')['attempts']}
+            for filename in os.listdir(AttemptJournal.DIRECTORY):
+                if filename.endswith('.log') and filename[:-4] not in open_ids:
+                    AttemptJournal.discard(filename[:-4])
+                    counts['journals'] += 1
+
+        # The manifest is derived from the shards, rebuilding it repairs any
+        # crash between writing a shard and the manifest
+        manifest = ResultShards.rebuild_manifest()
+        if prune_orphans:
+            exam_ids = {exam['id'] for exam in Database.load_data('exams.json')['exams']}
+            teachers, students = Database.get_all_users()
+            usernames = {student.username for student in students}
+            with ResultShards.lock:
+                for exam_id in list(manifest['shards']):
+                    if exam_id not in exam_ids:
+                        # Deleted exam, the whole shard goes
+                        counts['orphans'] += manifest['shards'][exam_id]['count']
+                        ResultShards.drop(manifest, exam_id)
+                        continue
+                    rows = ResultShards.load_shard(exam_id)
+                    removed = [row for row in rows if row['student_username'] not in usernames]
+                    if removed:
+                        counts['orphans'] += len(removed)
+                        kept = [row for row in rows if row['student_username'] in usernames]
+                        ResultShards.write(manifest, exam_id, kept, removed=removed)
+                if counts['orphans']:
+                    ResultShards.save_manifest(manifest)
+            if counts['orphans']:
+                ResultIndex.invalidate()
+                ItemAnalysis.invalidate()
+                ChangeBus.publish('result')
+
+        ScoreStats.rebuild()
+        return counts
+
+    @staticmethod
+    def backup(directory):
+        # Zip every data file and result shard except the API cache, returns
+        # the archive path
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        ResultShards.manifest()
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(directory, f"backup_{stamp}.zip")
+        with zipfile.ZipFile(path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as archive:
+            for folder in ('data', os.path.join('data', ResultShards.DIRECTORY),
+                           os.path.join('data', ResultShards.STUDENTS)):
+                for filename in sorted(os.listdir(folder)):
+                    filepath = os.path.join(folder, filename)
+                    if os.path.isfile(filepath) and filename.endswith('.json'):
+                        archive.write(filepath, filepath)
+        os.replace(path + '.tmp', path)
+        return path
+
+    @staticmethod
+    def grade_overdue_attempt(attempt):
+        # An attempt that ran out without a submit (a crash, a closed window)
+        # is graded on the answers journaled in time, like a late submit.
+        # Returns the stored result, None if the exam is gone
+        exam = Database.get_exam_by_id(attempt.exam_id)
+        if exam is None:
+            return None
+        questions = Database.get_questions_for_exam(exam)
+        option_counts = [len(question.options) for question in questions]
+        variant = ExamVariant(exam.id, attempt.student_username, len(questions))
+        replayed = AttemptJournal.replay(attempt.id, attempt.deadline + Attempt.GRACE)
+        answers = variant.to_canonical(
+            {position: option for position, option in replayed.items()
+             if position < len(questions) and
+             option < option_counts[variant.question_order[position]]},
+            option_counts)
+        result = Result(
+            student_username=attempt.student_username,
+            exam_id=exam.id,
+            score=GradingEngine(questions).score(answers),
+            answers=answers,
+            date=datetime.fromtimestamp(attempt.deadline).strftime('%Y-%m-%d %H:%M:%S'),
+            question_ids=[question.id for question in questions]
+        )
+        Database.add_result(result)
+        return result
+
+    @staticmethod
+    def get_open_attempt(student_username, exam_id):
+        # The unfinished, still running attempt on an exam, if any. An
+        # overdue one is graded and closed
+        for row in Database.load_data('attempts.json')['attempts']:
+            if row['student_username'] == student_username and row['exam_id'] == exam_id:
+                attempt = Attempt.from_dict(row)
+                if not attempt.is_overdue():
+                    return attempt
+                Database.grade_overdue_attempt(attempt)
+                Database.finish_attempt(attempt.id)
+                return None
+        return None
+
+    @staticmethod
+    def start_attempt(student_username, exam):
+        # Resume the open attempt on this exam, or start the clock on a new
+        # one after grading an overdue one
+        data = Database.load_data('attempts.json')
+        for row in data['attempts']:
+            if row['student_username'] == student_username and row['exam_id'] == exam.id:
+                attempt = Attempt.from_dict(row)
+                if not attempt.is_overdue():
+                    return attempt
+                Database.grade_overdue_attempt(attempt)
+                data['attempts'].remove(row)
+                AttemptJournal.discard(attempt.id)
+                overdue = attempt
+                break
+        else:
+            overdue = None
+
+        attempt = Attempt(student_username, exam.id, exam.time_limit)
+        data['attempts'].append(attempt.to_dict())
+        Database.save_data('attempts.json', data)
+        if overdue:
+            ChangeBus.publish('attempt', overdue.id, 'delete')
+        ChangeBus.publish('attempt', attempt.id, 'insert')
+        return attempt
+
+    @staticmethod
+    def finish_attempt(attempt_id):
+        data = Database.load_data('attempts.json')
+        data['attempts'] = [a for a in data['attempts'] if a['id'] != attempt_id]
+        Database.save_data('attempts.json', data)
+        AttemptJournal.discard(attempt_id)
+        ChangeBus.publish('attempt', attempt_id, 'delete')
+
+    @staticmethod
+    def add_result(result):
+        Database.add_results([result])
+
+    @staticmethod
+    def add_results(results):
+        # Append a batch of results, rewriting only the shards of their exams
+        # and the manifest once
+        if not results:
+            return
+        rows_by_exam = {}
+        for result in results:
+            rows_by_exam.setdefault(result.exam_id, []).append(result.to_dict())
+        with ResultShards.lock:
+            manifest = ResultShards.manifest()
+            for exam_id, rows in rows_by_exam.items():
+                current = ResultIndex.shard(exam_id)['rows']
+                ResultShards.write(manifest, exam_id, current + rows, added=rows)
+                ResultIndex.appended(exam_id, rows)
+                ItemAnalysis.invalidate(exam_id)
+            ResultShards.save_manifest(manifest)
+            # Under the shard lock, so a statistics rebuild counts these
+            # results either in its scan or here, never twice or not at all
+            ScoreStats.record(*results)
+        for result in results:
+            ChangeBus.publish('result', result.id, 'insert', result)
+
+    @staticmethod
+    def get_results_by_student(student_username):
+        return ResultIndex.query(student_username=student_username)
+
+    @staticmethod
+    def get_results_by_exam(exam_id):
+        return ResultIndex.query(exam_id=exam_id)
+
+    @staticmethod
+    def get_result_by_id(result_id, exam_id=None):
+        # Pass the result's exam id when known, only its shard is read then
+        return ResultIndex.get(result_id, exam_id)
+
+    @staticmethod
+    def query_results(exam_id=None, student_username=None, date_from=None, date_to=None,
+                      min_score=None, max_score=None):
+        return ResultIndex.query(exam_id, student_username, date_from, date_to,
+                                 min_score, max_score)
+
+    @staticmethod
+    def iter_result_rows(on_progress=None, chunk_size=1 << 20, exam_id=None,
+                         student_username=None):
+        # Stream the results shard by shard. exam_id and student_username only
+        # pick the shards to read, callers still filter the rows.
+        # on_progress(bytes_read, total_bytes) runs per chunk
+        if exam_id is not None:
+            exam_ids = [exam_id]
+        elif student_username is not None:
+            exam_ids = ResultShards.student_exam_ids(student_username)
+        else:
+            exam_ids = ResultShards.exam_ids()
+
+        shards = []
+        for shard_exam_id in exam_ids:
+            filepath = os.path.join('data', ResultShards.shard_file(shard_exam_id))
+            if os.path.exists(filepath):
+                shards.append((filepath, os.path.getsize(filepath)))
+        total = sum(size for filepath, size in shards)
+
+        done = 0
+        for filepath, size in shards:
+            def shard_progress(bytes_read, shard_total, done=done):
+                on_progress(min(done + bytes_read, total), total)
+            yield from Database.iter_json_rows(filepath, shard_progress if on_progress else None,
+                                               chunk_size)
+            done += size
+        if on_progress:
+            on_progress(total, total)
+
+    @staticmethod
+    def iter_json_rows(filepath, on_progress=None, chunk_size=1 << 20):
+        # Decode the array in a {'results': [...]} file one object at a time,
+        # so memory stays flat however large the file is
+        if not os.path.exists(filepath):
+            return
+
+        decoder = json.JSONDecoder()
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        with open(filepath, 'rb') as f:
+            total = os.fstat(f.fileno()).st_size
+            bytes_read = 0
+            buffer = ''
+            pos = 0
+            started = False
+
+            while True:
+                chunk = f.read(chunk_size)
+                bytes_read += len(chunk)
+                buffer = buffer[pos:] + utf8.decode(chunk, final=not chunk)
+                pos = 0
+
+                # Skip ahead to the opening bracket of the results array
+                if not started:
+                    pos = buffer.find('[')
+                    if pos < 0:
+                        if not chunk:
+                            return
+                        pos = len(buffer)
+                        continue
+                    pos += 1
+                    started = True
+
+                while True:
+                    while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                        pos += 1
+                    if pos >= len(buffer):
+                        break
+                    if buffer[pos] == ']':
+                        if on_progress:
+                            on_progress(total, total)
+                        return
+                    try:
+                        row, pos = decoder.raw_decode(buffer, pos)
+                    except ValueError:
+                        # The object continues in the next chunk
+                        break
+                    yield row
+
+                if on_progress:
+                    on_progress(bytes_read, total)
+                if not chunk:
+                    raise ValueError(f"{os.path.basename(filepath)} is incomplete")
+
+# Data crawler
+
+
+class DataCrawler:
+    API_URL = "https://opentdb.com/api.php"
+
+    # On-disk response cache, one file per (amount, category, difficulty)
+    CACHE_DIR = os.path.join('data', 'cache')
+    CACHE_TTL = 24 * 60 * 60  # in seconds
+
+    # Bytes read from the API between checks for a cancelled import
+    READ_CHUNK_SIZE = 4096
+
+    # Replay mode serves every request from the cache and never hits the network
+    replay = os.environ.get('EMS_TRIVIA_REPLAY') == '1'
+
+    @staticmethod
+    def _cache_path(amount, category, difficulty):
+        key = f"{amount}_{category or 'any'}_{difficulty or 'any'}"
+        return os.path.join(DataCrawler.CACHE_DIR, f"trivia_{key}.json")
+
+    @staticmethod
+    def load_cached_payload(amount, category=None, difficulty='easy', ttl=None):
+        """Return a cached API payload, or None if missing or older than ttl"""
+        filepath = DataCrawler._cache_path(amount, category, difficulty)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if ttl is not None and time.time() - entry.get('fetched_at', 0) > ttl:
+            return None
+        return entry.get('payload')
+
+    @staticmethod
+    def save_cached_payload(amount, category, difficulty, payload):
+        if not os.path.exists(DataCrawler.CACHE_DIR):
+            os.makedirs(DataCrawler.CACHE_DIR)
+
+        filepath = DataCrawler._cache_path(amount, category, difficulty)
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': time.time(), 'payload': payload},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+
+    @staticmethod
+    def prune_cache(ttl=None):
+        # Remove cache entries older than ttl, returns how many were removed
+        if not os.path.exists(DataCrawler.CACHE_DIR):
+            return 0
+        ttl = DataCrawler.CACHE_TTL if ttl is None else ttl
+        removed = 0
+        for filename in os.listdir(DataCrawler.CACHE_DIR):
+            if not (filename.startswith('trivia_') and filename.endswith('.json')):
+                continue
+            filepath = os.path.join(DataCrawler.CACHE_DIR, filename)
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    fetched_at = json.load(f).get('fetched_at', 0)
+            except (OSError, json.JSONDecodeError):
+                fetched_at = 0
+            if time.time() - fetched_at > ttl:
+                os.remove(filepath)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def clear_cache():
+        if not os.path.exists(DataCrawler.CACHE_DIR):
+            return 0
+        removed = 0
+        for filename in os.listdir(DataCrawler.CACHE_DIR):
+            if filename.startswith('trivia_') and filename.endswith('.json'):
+                os.remove(os.path.join(DataCrawler.CACHE_DIR, filename))
+                removed += 1
+        return removed
+
+    @staticmethod
+    def normalize_text(text):
+        """Unescape HTML entities, Unicode-normalize and collapse whitespace"""
+        text = html.unescape(text)
+        text = unicodedata.normalize('NFC', text)
+        return ' '.join(text.split())
+
+    @staticmethod
+    def normalize_items(items):
+        # Streaming normalization stage, each raw API item is cleaned exactly once
+        for item in items:
+            yield {
+                "question": DataCrawler.normalize_text(item["question"]),
+                "correct_answer": DataCrawler.normalize_text(item["correct_answer"]),
+                "incorrect_answers": [DataCrawler.normalize_text(a)
+                                      for a in item["incorrect_answers"]],
+                "category": DataCrawler.normalize_text(item["category"])
+            }
+
+    @staticmethod
+    def iter_trivia_questions(items):
+        for item in DataCrawler.normalize_items(items):
+            # Create a list with all options, correct answer first
+            options = [item["correct_answer"]] + \
+                item["incorrect_answers"]
+            # Shuffle the options
+            random.shuffle(options)
+            # Find the index of the correct answer
+            correct_index = options.index(item["correct_answer"])
+
+            yield Question(
+                text=item["question"],
+                options=options,
+                correct_answer=correct_index,
+                category=item["category"]
+            )
+
+    @staticmethod
+    def dedupe_questions(questions, seen=None):
+        # Skip questions whose fingerprint is already in the bank or earlier in the batch
+        seen = set() if seen is None else seen
+        for question in questions:
+            fingerprint = question.fingerprint()
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            yield question
+
+    @staticmethod
+    def parse_trivia_results(items):
+        return list(DataCrawler.iter_trivia_questions(items))
+
+    @staticmethod
+    def fetch_trivia_items(amount=10, category=None, difficulty='easy', use_cache=True, replay=None,
+                           is_cancelled=None):
+        """Fetch raw trivia items from Open Trivia Database API or the cache"""
+        if replay is None:
+            replay = DataCrawler.replay
+
+        if replay:
+            data = DataCrawler.load_cached_payload(amount, category, difficulty)
+            if data is None:
+                print(f"Replay Error: no cached payload for amount={amount}, "
+                      f"category={category or 'any'}, difficulty={difficulty or 'any'}")
+                return []
+            return data["results"]
+
+        if use_cache:
+            data = DataCrawler.load_cached_payload(
+                amount, category, difficulty, ttl=DataCrawler.CACHE_TTL)
+            if data is not None:
+                return data["results"]
+
+        params = {
+            "amount": amount,
+            "type": "multiple"
+        }
+
+        if category:
+            params["category"] = category
+        if difficulty:
+            params["difficulty"] = difficulty
+
+        try:
+            # Imported here so batch jobs that never hit the network start faster
+            import requests
+            # The body is read in chunks so a cancelled import stops between
+            # chunks instead of waiting for the whole response
+            chunks = []
+            with requests.get(DataCrawler.API_URL, params=params, timeout=15,
+                              stream=True) as response:
+                for chunk in response.iter_content(DataCrawler.READ_CHUNK_SIZE):
+                    if is_cancelled and is_cancelled():
+                        return []
+                    chunks.append(chunk)
+            data = json.loads(b''.join(chunks))
+
+            if data["response_code"] == 0:
+                if use_cache:
+                    DataCrawler.save_cached_payload(amount, category, difficulty, data)
+                return data["results"]
+            else:
+                print(f"API Error: {data['response_code']}")
+                return []
+        except Exception as e:
+            if is_cancelled and is_cancelled():
+                return []
+            print(f"Error fetching questions: {e}")
+            # Fall back to an expired cache entry rather than failing offline
+            if use_cache:
+                data = DataCrawler.load_cached_payload(amount, category, difficulty)
+                if data is not None:
+                    return data["results"]
+            return []
+
+    @staticmethod
+    def fetch_trivia_questions(amount=10, category=None, difficulty='easy', use_cache=True, replay=None):
+        """Fetch trivia questions from Open Trivia Database API"""
+        items = DataCrawler.fetch_trivia_items(
+            amount, category, difficulty, use_cache=use_cache, replay=replay)
+        return DataCrawler.parse_trivia_results(items)
+
+# Background question import
+
+
+class ImportJob:
+    # Runs fetch -> normalize -> dedupe -> write on a worker thread and reports
+    # progress as ('progress', stage, done, total), ('done', written, total),
+    # ('cancelled',) or ('error', message) tuples on a thread-safe queue
+    STAGES = ('fetched', 'normalized', 'deduped', 'written')
+
+    def __init__(self, amount, category=None, difficulty='easy', use_cache=True):
+        self.amount = amount
+        self.category = category
+        self.difficulty = difficulty
+        self.use_cache = use_cache
+        self.queue = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _post(self, *message):
+        self.queue.put(message)
+
+    def run(self):
+        try:
+            items = DataCrawler.fetch_trivia_items(
+                self.amount, self.category, self.difficulty, use_cache=self.use_cache,
+                is_cancelled=self.is_cancelled)
+            if self.is_cancelled():
+                self._post('cancelled')
+                return
+            if not items:
+                self._post('error', "No questions could be fetched")
+                return
+
+            total = len(items)
+            self._post('progress', 'fetched', total, total)
+
+            # Normalize and dedupe lazily, one item at a time
+            questions = []
+            normalized = 0
+            deduped = 0
+
+            def counted(source):
+                nonlocal normalized
+                for question in source:
+                    normalized += 1
+                    self._post('progress', 'normalized', normalized, total)
+                    yield question
+
+            existing = Database.get_question_fingerprints()
+            for question in DataCrawler.dedupe_questions(
+                    counted(DataCrawler.iter_trivia_questions(items)), existing):
+                if self.is_cancelled():
+                    self._post('cancelled')
+                    return
+                questions.append(question)
+                deduped += 1
+                self._post('progress', 'deduped', deduped, total)
+
+            if self.is_cancelled():
+                self._post('cancelled')
+                return
+
+            written = Database.add_questions(questions)
+            self._post('progress', 'written', written, total)
+            self._post('done', written, total)
+        except Exception as e:
+            self._post('error', str(e))
+
+# Results export
+
+
+class ExportJob:
+    # Streams results from storage to CSV, JSONL or a columnar directory on a
+    # worker thread. Reports
+    # ('progress', bytes_read, total_bytes, rows), ('done', rows, path),
+    # ('cancelled',) or ('error', message) tuples on a thread-safe queue
+    FORMATS = ('csv', 'jsonl', 'columnar')
+    FIELDS = ['id', 'student_username', 'student_name', 'exam_id', 'exam_title',
+              'score', 'date']
+    CHUNK_ROWS = 5000
+
+    def __init__(self, path, fmt='csv', include_answers=False, exam_id=None,
+                 student_username=None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.include_answers = include_answers
+        self.exam_id = exam_id
+        self.student_username = student_username
+        self.queue = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _post(self, *message):
+        self.queue.put(message)
+
+    @staticmethod
+    def output_path(filename, fmt):
+        # The columnar export is a directory of .npy files
+        return f"{filename}_columnar" if fmt == 'columnar' else f"{filename}.{fmt}"
+
+    @staticmethod
+    def iter_records(include_answers=False, exam_id=None, student_username=None,
+                     on_progress=None):
+        # Join each streamed row with exam titles and student names through
+        # dict lookups. Answers are option letters in the exam's current
+        # question order, moved there from the questions the result was taken
+        # with; None when those can no longer be told
+        exams = {exam.id: exam for exam in Database.get_all_exams()}
+        teachers, students = Database.get_all_users()
+        student_names = {student.username: student.full_name for student in students}
+        if include_answers:
+            bank = {q['id'] for q in Database.load_data('questions.json')['questions']}
+            current = {exam.id: [q for q in exam.questions if q in bank] for exam in exams.values()}
+
+        for row in Database.iter_result_rows(on_progress, exam_id=exam_id,
+                                             student_username=student_username):
+            if exam_id is not None and row['exam_id'] != exam_id:
+                continue
+            if student_username is not None and row['student_username'] != student_username:
+                continue
+
+            exam = exams.get(row['exam_id'])
+            record = {
+                'id': row.get('id', ''),
+                'student_username': row['student_username'],
+                'student_name': student_names.get(row['student_username'], ''),
+                'exam_id': row['exam_id'],
+                'exam_title': exam.title if exam else '',
+                'score': row['score'],
+                'date': row['date']
+            }
+            if include_answers:
+                taken = Result.taken_question_ids(row, exam, bank) if exam else None
+                if taken is None:
+                    record['answers'] = None
+                else:
+                    question_ids = current[exam.id]
+                    letters = [None] * len(question_ids)
+                    for index, option in Result.realign(row.get('answers', {}), taken,
+                                                        question_ids).items():
+                        if option is not None:
+                            letters[index] = chr(65 + option)
+                    record['answers'] = letters
+            yield record
+
+    def answer_columns(self):
+        # CSV rows are flat, so answers get one column per position in the
+        # exams' current question lists
+        exams = Database.get_all_exams()
+        if self.exam_id is not None:
+            exams = [exam for exam in exams if exam.id == self.exam_id]
+        bank = {q['id'] for q in Database.load_data('questions.json')['questions']}
+        width = max((len([q for q in exam.questions if q in bank]) for exam in exams), default=0)
+        return [f"Q{i + 1}" for i in range(width)]
+
+    def run(self):
+        tmp_path = self.path + '.part'
+        try:
+            rows = 0
+            progress = [0, 0]
+
+            def on_progress(bytes_read, total_bytes):
+                progress[:] = [bytes_read, total_bytes]
+
+            if self.fmt == 'columnar':
+                def on_rows(count):
+                    self._post('progress', progress[0], progress[1], count)
+
+                rows = ColumnarExport.write(tmp_path, self.exam_id, self.student_username,
+                                            on_progress, on_rows, self.is_cancelled)
+                if self.is_cancelled():
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    self._post('cancelled')
+                    return
+                ColumnarExport.replace(tmp_path, self.path)
+                self._post('done', rows, self.path)
+                return
+
+            records = self.iter_records(self.include_answers, self.exam_id,
+                                        self.student_username, on_progress)
+
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                if self.fmt == 'csv':
+                    answer_columns = self.answer_columns() if self.include_answers else []
+                    writer = csv.writer(f)
+                    writer.writerow(self.FIELDS + answer_columns)
+
+                # Rows are buffered and written a chunk at a time
+                while True:
+                    if self.is_cancelled():
+                        break
+                    chunk = list(itertools.islice(records, self.CHUNK_ROWS))
+                    if not chunk:
+                        break
+
+                    if self.fmt == 'csv':
+                        lines = []
+                        for record in chunk:
+                            line = [record[field] for field in self.FIELDS]
+                            if self.include_answers:
+                                letters = record['answers'] or []
+                                line.extend(letters[i] or '' if i < len(letters) else ''
+                                            for i in range(len(answer_columns)))
+                            lines.append(line)
+                        writer.writerows(lines)
+                    else:
+                        f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                                        for record in chunk))
+
+                    rows += len(chunk)
+                    self._post('progress', progress[0], progress[1], rows)
+
+            if self.is_cancelled():
+                os.remove(tmp_path)
+                self._post('cancelled')
+                return
+
+            os.replace(tmp_path, self.path)
+            self._post('done', rows, self.path)
+        except Exception as e:
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._post('error', str(e))
+
+# Columnar results export
+
+
+class ColumnarExport:
+    # Results as one .npy file per column, so analysis jobs can np.load them with
+    # mmap_mode='r' instead of parsing JSON. Students and exams are dictionary
+    # encoded (int32 codes into students.npy / exams.npy), dates are
+    # datetime64[s]. Answers are grouped by exam and the question list the
+    # results were taken with: every group gets a dense int8 answers matrix
+    # (answers_<group>.npy, -1 when unanswered) whose columns are the group's
+    # question_ids in the manifest and whose rows are listed in
+    # rows_<group>.npy as positions in the main columns. answer_groups.npy
+    # holds each row's group, -1 for results whose questions can no longer
+    # be told
+    MANIFEST = 'manifest.json'
+    VERSION = 2
+    CHUNK_ROWS = 50000
+
+    @staticmethod
+    def write(directory, exam_id=None, student_username=None, on_progress=None,
+              on_rows=None, is_cancelled=None):
+        exams = {exam.id: exam for exam in Database.get_all_exams()}
+        teachers, students = Database.get_all_users()
+        student_names = {student.username: student.full_name for student in students}
+        bank = {q['id'] for q in Database.load_data('questions.json')['questions']}
+
+        student_codes = {}
+        exam_codes = {}
+        group_codes = {}  # (exam code, question ids) -> group code
+        columns = {'result_ids': [], 'student_codes': [], 'exam_codes': [],
+                   'scores': [], 'dates': [], 'answer_groups': []}
+        answer_chunks = {}
+        pending = {}
+        rows = 0
+
+        def flush():
+            # Pack the buffered answers and columns into numpy chunks
+            for code, answer_dicts in pending.items():
+                answer_chunks.setdefault(code, []).append(
+                    GradingEngine.pack(answer_dicts, len(groups[code][1])).astype(np.int8))
+            pending.clear()
+            for name, dtype in (('result_ids', np.str_), ('student_codes', np.int32),
+                                ('exam_codes', np.int32), ('scores', np.float64),
+                                ('dates', 'datetime64[s]'), ('answer_groups', np.int32)):
+                chunk[name] = np.array(chunk[name], dtype=dtype)
+                columns[name].append(chunk[name])
+                chunk[name] = []
+
+        chunk = {name: [] for name in columns}
+        exam_ids = []
+        groups = []
+        for row in Database.iter_result_rows(on_progress, exam_id=exam_id,
+                                             student_username=student_username):
+            if exam_id is not None and row['exam_id'] != exam_id:
+                continue
+            if student_username is not None and row['student_username'] != student_username:
+                continue
+
+            student_code = student_codes.setdefault(row['student_username'], len(student_codes))
+            exam_code = exam_codes.get(row['exam_id'])
+            if exam_code is None:
+                exam_code = exam_codes[row['exam_id']] = len(exam_ids)
+                exam_ids.append(row['exam_id'])
+
+            exam = exams.get(row['exam_id'])
+            taken = Result.taken_question_ids(row, exam, bank) if exam else row.get('question_ids')
+            if taken is None:
+                group_code = -1
+            else:
+                key = (exam_code, tuple(taken))
+                group_code = group_codes.get(key)
+                if group_code is None:
+                    group_code = group_codes[key] = len(groups)
+                    groups.append(key)
+                pending.setdefault(group_code, []).append(
+                    {int(k): v for k, v in row.get('answers', {}).items() if v is not None})
+
+            chunk['result_ids'].append(row.get('id', ''))
+            chunk['student_codes'].append(student_code)
+            chunk['exam_codes'].append(exam_code)
+            chunk['scores'].append(row['score'])
+            chunk['dates'].append(row['date'])
+            chunk['answer_groups'].append(group_code)
+            rows += 1
+
+            if rows % ColumnarExport.CHUNK_ROWS == 0:
+                flush()
+                if on_rows:
+                    on_rows(rows)
+                if is_cancelled and is_cancelled():
+                    return rows
+        flush()
+
+        os.makedirs(directory, exist_ok=True)
+
+        def save(name, array):
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+
+        for name, chunks in columns.items():
+            save(name, np.concatenate(chunks))
+        usernames = list(student_codes)
+        save('students', np.array(usernames, dtype=np.str_))
+        save('student_names', np.array([student_names.get(u, '') for u in usernames], dtype=np.str_))
+        save('exams', np.array(exam_ids, dtype=np.str_))
+        save('exam_titles', np.array([exams[e].title if e in exams else '' for e in exam_ids],
+                                     dtype=np.str_))
+
+        manifest_exams = []
+        for code, exam_key in enumerate(exam_ids):
+            exam = exams.get(exam_key)
+            manifest_exams.append({
+                'code': code,
+                'id': exam_key,
+                'title': exam.title if exam else '',
+                'question_ids': exam.questions if exam else []
+            })
+
+        all_groups = np.concatenate(columns['answer_groups'])
+        manifest_groups = []
+        for code, (exam_code, question_ids) in enumerate(groups):
+            group_rows = np.flatnonzero(all_groups == code)
+            save(f"rows_{code}", group_rows)
+            save(f"answers_{code}", np.concatenate(answer_chunks[code]))
+            manifest_groups.append({
+                'code': code,
+                'exam_code': exam_code,
+                'question_ids': list(question_ids),
+                'rows': len(group_rows)
+            })
+
+        with open(os.path.join(directory, ColumnarExport.MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({'version': ColumnarExport.VERSION, 'rows': rows, 'exams': manifest_exams,
+                       'answer_groups': manifest_groups}, f, ensure_ascii=False, indent=4)
+        if on_rows:
+            on_rows(rows)
+        return rows
+
+    @staticmethod
+    def replace(tmp_path, path):
+        # Only a previous export is overwritten, never an unrelated directory
+        if os.path.exists(path):
+            if not os.path.exists(os.path.join(path, ColumnarExport.MANIFEST)):
+                raise ValueError(f"{path} exists and is not a columnar export")
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(directory, mmap_mode='r'):
+        # Map every column of an export, answers_<code>/rows_<code> included
+        with open(os.path.join(directory, ColumnarExport.MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        columns = {}
+        for name in os.listdir(directory):
+            if name.endswith('.npy'):
+                columns[name[:-4]] = np.load(os.path.join(directory, name), mmap_mode=mmap_mode)
+        return manifest, columns
+
+# Exam generator
+
+
+class ExamGenerator:
+    # Samples exam questions from a category-bucketed index of the question bank
+    def __init__(self, questions):
+        self.buckets = {}
+        self.all_ids = []
+        self.category_of = {}
+        for question in questions:
+            self.buckets.setdefault(question.category, []).append(question.id)
+            self.all_ids.append(question.id)
+            self.category_of[question.id] = question.category
+
+    def categories(self):
+        return {category: len(ids) for category, ids in self.buckets.items()}
+
+    @staticmethod
+    def recently_used(exams, last_k, skip_exam_id=None):
+        # Question ids used by the last K exams (exams.json keeps creation order)
+        if not last_k:
+            return set()
+        recent = [exam for exam in exams if exam.id != skip_exam_id][-last_k:]
+        return {question_id for exam in recent for question_id in exam.questions}
+
+    def _sample(self, pool, k, excluded, rng, skip_categories=()):
+        # Rejection sampling touches O(k) entries when few are excluded,
+        # filtering the pool is the fallback when most of it is excluded
+        if k <= 0:
+            return []
+
+        def eligible(question_id):
+            return (question_id not in excluded and question_id not in picked and
+                    self.category_of[question_id] not in skip_categories)
+
+        chosen = []
+        picked = set()
+        for _ in range(4 * k + 16):
+            if not pool:
+                break
+            candidate = pool[rng.randrange(len(pool))]
+            if not eligible(candidate):
+                continue
+            chosen.append(candidate)
+            picked.add(candidate)
+            if len(chosen) == k:
+                return chosen
+
+        remaining = [q for q in pool if eligible(q)]
+        needed = k - len(chosen)
+        if len(remaining) < needed:
+            raise ValueError(f"Only {len(chosen) + len(remaining)} eligible questions, {k} requested")
+        return chosen + rng.sample(remaining, needed)
+
+    def generate(self, total, quotas=None, exclude=None, seed=None):
+        quotas = {category: count for category, count in (quotas or {}).items() if count > 0}
+        if sum(quotas.values()) > total:
+            raise ValueError("Category quotas exceed the number of questions")
+
+        rng = random.Random(seed)
+        excluded = set(exclude or ())
+        selection = []
+
+        for category, count in quotas.items():
+            bucket = self.buckets.get(category, [])
+            try:
+                picked = self._sample(bucket, count, excluded, rng)
+            except ValueError as e:
+                raise ValueError(f"Category '{category}': {e}")
+            selection.extend(picked)
+            excluded.update(picked)
+
+        # Fill the rest from the categories without a quota
+        selection.extend(self._sample(self.all_ids, total - len(selection), excluded, rng,
+                                      skip_categories=quotas))
+        rng.shuffle(selection)
+        return selection
+
+# Exam variants
+
+
+class ExamVariant:
+    # Deterministic per-student ordering of an exam's questions and options.
+    # Nothing is stored: the permutations are re-derived from (exam id, username)
+    def __init__(self, exam_id, username, question_count):
+        self.seed = hashlib.sha256(f"{exam_id}\x1f{username}".encode('utf-8')).digest()
+        self.question_order = list(range(question_count))
+        random.Random(self.seed).shuffle(self.question_order)
+        self._option_orders = {}
+
+    def option_order(self, canonical_index, option_count):
+        # Displayed option position -> canonical option index for one question
+        key = (canonical_index, option_count)
+        order = self._option_orders.get(key)
+        if order is None:
+            order = list(range(option_count))
+            random.Random(self.seed + canonical_index.to_bytes(4, 'big')).shuffle(order)
+            self._option_orders[key] = order
+        return order
+
+    def to_canonical(self, answers, option_counts):
+        # Map {displayed question: displayed option} to canonical indices
+        canonical = {}
+        for position, option in answers.items():
+            index = self.question_order[position]
+            canonical[index] = self.option_order(index, option_counts[index])[option]
+        return canonical
+
+# Grading engine
+
+
+class GradeReport:
+    def __init__(self, correct, answered, scores):
+        self.correct = correct                      # students x questions, bool
+        self.answered = answered                    # students x questions, bool
+        self.scores = scores                        # list of percentages per student
+        self.correct_counts = correct.sum(axis=1)   # per student
+        self.question_correct = correct.sum(axis=0)     # per question
+        self.question_answered = answered.sum(axis=0)   # per question
+
+
+class GradingEngine:
+    UNANSWERED = -1
+
+    def __init__(self, questions):
+        # Answer key in canonical question order
+        self.question_count = len(questions)
+        self.key = np.array([q.correct_answer for q in questions], dtype=np.int16)
+
+    def pack_answers(self, answer_dicts):
+        return GradingEngine.pack(answer_dicts, self.question_count)
+
+    @staticmethod
+    def pack(answer_dicts, question_count):
+        # Dense students x questions matrix of chosen options, -1 when unanswered
+        matrix = np.full((len(answer_dicts), question_count), GradingEngine.UNANSWERED, dtype=np.int16)
+        counts = np.fromiter((len(answers) for answers in answer_dicts),
+                             dtype=np.int64, count=len(answer_dicts))
+        total = int(counts.sum())
+        if not total:
+            return matrix
+
+        # Flatten every (question, option) pair without a per-answer Python loop
+        rows = np.repeat(np.arange(len(answer_dicts)), counts)
+        cols = np.fromiter(itertools.chain.from_iterable(answer_dicts),
+                           dtype=np.int64, count=total)
+        values = np.fromiter(itertools.chain.from_iterable(
+            answers.values() for answers in answer_dicts), dtype=np.int16, count=total)
+
+        # Answers to questions no longer in the exam are ignored
+        valid = (cols >= 0) & (cols < question_count)
+        matrix[rows[valid], cols[valid]] = values[valid]
+        return matrix
+
+    def grade_matrix(self, matrix):
+        correct = matrix == self.key
+        answered = matrix != self.UNANSWERED
+        if self.question_count:
+            # Same float arithmetic and rounding as a per-student Python loop
+            ratios = (correct.sum(axis=1) / self.question_count * 100).tolist()
+            scores = [round(ratio, 2) for ratio in ratios]
+        else:
+            scores = [0] * matrix.shape[0]
+        return GradeReport(correct, answered, scores)
+
+    def grade(self, answer_dicts):
+        return self.grade_matrix(self.pack_answers(answer_dicts))
+
+    def score(self, answers):
+        # Live submission of a single attempt
+        return self.grade([answers]).scores[0]
+
+    def regrade(self, results):
+        # Rescore stored results in place, returns the results whose score changed
+        report = self.grade([result.answers for result in results])
+        changed = []
+        for result, score in zip(results, report.scores):
+            if result.score != score:
+                result.score = score
+                changed.append(result)
+        return changed
+
+# Item analysis
+
+
+class ItemAnalysisReport:
+    def __init__(self, exam, questions, matrix, key, excluded=0):
+        self.exam = exam
+        self.questions = questions
+        self.student_count = matrix.shape[0]
+        # Results not taken with every current question are left out
+        self.excluded = excluded
+        self.option_count = max((len(q.options) for q in questions), default=0)
+
+        correct = (matrix == key).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Difficulty: share of students answering each question correctly
+            self.p_values = correct.mean(axis=0) if self.student_count else np.full(len(questions), np.nan)
+
+            # Discrimination: point-biserial correlation between an item and the
+            # total score on the remaining items
+            rest = correct.sum(axis=1, keepdims=True) - correct
+            item_dev = correct - correct.mean(axis=0)
+            rest_dev = rest - rest.mean(axis=0)
+            cov = (item_dev * rest_dev).sum(axis=0)
+            spread = np.sqrt((item_dev ** 2).sum(axis=0) * (rest_dev ** 2).sum(axis=0))
+            self.discrimination = np.where(spread > 0, cov / spread, np.nan)
+
+        # Distractor analysis: how often each option (and no answer) was chosen
+        self.option_counts = np.stack(
+            [(matrix == option).sum(axis=0) for option in range(self.option_count)], axis=1
+        ) if self.option_count else np.zeros((len(questions), 0), dtype=np.int64)
+        self.unanswered = (matrix == GradingEngine.UNANSWERED).sum(axis=0)
+
+
+class ItemAnalysis:
+    # Reports are cached per exam, invalidated by Database writes and by the
+    # exam's result shard changing on disk (e.g. written by another process)
+    _cache = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def invalidate(cls, exam_id=None):
+        with cls._lock:
+            if exam_id is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(exam_id, None)
+
+    @classmethod
+    def for_exam(cls, exam_id):
+        version = ResultShards.shard_version(exam_id)
+        with cls._lock:
+            cached = cls._cache.get(exam_id)
+            if cached and cached[0] == version:
+                return cached[1]
+
+        exam = Database.get_exam_by_id(exam_id)
+        if not exam:
+            return None
+        questions = Database.get_questions_for_exam(exam)
+        question_ids = [question.id for question in questions]
+        current = set(question_ids)
+        bank = {q['id'] for q in Database.load_data('questions.json')['questions']}
+
+        # Answers are moved onto the current question order. Only results
+        # taken with every current question count, a missing column would
+        # read as a wrong answer
+        answers = []
+        excluded = 0
+        for result in Database.get_results_by_exam(exam_id):
+            taken = Result.taken_question_ids(result.to_dict(), exam, bank)
+            if taken is None or not current.issubset(taken):
+                excluded += 1
+                continue
+            if taken == question_ids:
+                answers.append(result.answers)
+            else:
+                answers.append(Result.realign(result.answers, taken, question_ids))
+
+        engine = GradingEngine(questions)
+        matrix = engine.pack_answers(answers)
+        report = ItemAnalysisReport(exam, questions, matrix, engine.key, excluded)
+
+        with cls._lock:
+            cls._cache[exam_id] = (version, report)
+        return report
+
+# Exam previews
+
+
+class ExamPreview:
+    # What the exam lists show for a selected exam, computed when the exam is
+    # saved and kept in a small LRU cache. Each entry remembers the versions of
+    # exams.json and questions.json it was built from, so a change to either
+    # file (from any process) makes it stale
+    CACHE_SIZE = 64
+    TEXT_LENGTH = 50
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, exam, questions):
+        self.id = exam.id
+        self.title = exam.title
+        self.description = exam.description
+        self.time_limit = exam.time_limit
+        self.question_count = len(exam.questions)
+        self.question_texts = [ExamPreview.truncate(q.text) for q in questions]
+        self.categories = {}
+        for question in questions:
+            category = question.category or "Uncategorized"
+            self.categories[category] = self.categories.get(category, 0) + 1
+
+    @staticmethod
+    def truncate(text):
+        if len(text) > ExamPreview.TEXT_LENGTH:
+            return text[:ExamPreview.TEXT_LENGTH] + "..."
+        return text
+
+    def format_categories(self):
+        return ", ".join(f"{category} ({count})" for category, count in
+                         sorted(self.categories.items(), key=lambda item: -item[1]))
+
+    @staticmethod
+    def _version():
+        version = []
+        for filename in ('exams.json', 'questions.json'):
+            try:
+                version.append(os.stat(os.path.join('data', filename)).st_mtime_ns)
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    @classmethod
+    def invalidate(cls, exam_id=None):
+        with cls._lock:
+            if exam_id is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(exam_id, None)
+
+    @classmethod
+    def _put(cls, version, preview):
+        with cls._lock:
+            cls._cache[preview.id] = (version, preview)
+            cls._cache.move_to_end(preview.id)
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+    @classmethod
+    def store(cls, exam):
+        # Called right after the exam is saved
+        version = cls._version()
+        preview = ExamPreview(exam, Database.get_questions_for_exam(exam))
+        cls._put(version, preview)
+        return preview
+
+    @classmethod
+    def for_exam(cls, exam_id):
+        version = cls._version()
+        with cls._lock:
+            cached = cls._cache.get(exam_id)
+            if cached and cached[0] == version:
+                cls._cache.move_to_end(exam_id)
+                return cached[1]
+
+        exam = Database.get_exam_by_id(exam_id)
+        if not exam:
+            return None
+        preview = ExamPreview(exam, Database.get_questions_for_exam(exam))
+        cls._put(version, preview)
+        return preview
+
+# Score statistics
+
+
+class ScoreStats:
+    # Running aggregates per exam and per student, updated in O(1) per
+    # submitted result. They are split over hash buckets in data/stats/
+    # (exams_NN.json, students_NN.json) and cached while a bucket's file is
+    # unchanged, so a submit rewrites only the buckets of its exam and
+    # student. Percentiles come from a sparse histogram with one bucket per
+    # whole percent
+    DIRECTORY = 'stats'
+    FILE_BUCKETS = 64
+    LEGACY = 'stats.json'
+    PASS_SCORE = 50
+    BUCKETS = 101
+
+    # Held around every read-modify-write of the bucket files. It is the
+    # shard lock, so a rebuild's scan of the shards and the results appended
+    # meanwhile can't interleave, and there is no lock order to keep
+    _lock = ResultShards.lock
+    _cache = {}
+
+    @staticmethod
+    def new_aggregate():
+        return {
+            'count': 0,
+            'sum': 0.0,
+            'sum_sq': 0.0,
+            'min': None,
+            'max': None,
+            'passed': 0,
+            'histogram': {}
+        }
+
+    @staticmethod
+    def add_score(aggregate, score):
+        aggregate['count'] += 1
+        aggregate['sum'] += score
+        aggregate['sum_sq'] += score * score
+        aggregate['min'] = score if aggregate['min'] is None else min(aggregate['min'], score)
+        aggregate['max'] = score if aggregate['max'] is None else max(aggregate['max'], score)
+        if score >= ScoreStats.PASS_SCORE:
+            aggregate['passed'] += 1
+        # JSON object keys are strings
+        bucket = str(min(max(int(score), 0), ScoreStats.BUCKETS - 1))
+        aggregate['histogram'][bucket] = aggregate['histogram'].get(bucket, 0) + 1
+
+    @staticmethod
+    def percentile(aggregate, fraction):
+        # Approximate percentile, accurate to the histogram bucket width
+        if not aggregate['count']:
+            return None
+        target = fraction * aggregate['count']
+        running = 0
+        for bucket in sorted(int(b) for b in aggregate['histogram']):
+            running += aggregate['histogram'][str(bucket)]
+            if running >= target:
+                return min(max(bucket + 0.5, aggregate['min']), aggregate['max'])
+        return aggregate['max']
+
+    @staticmethod
+    def summarize(aggregate):
+        if not aggregate or not aggregate['count']:
+            return None
+        count = aggregate['count']
+        mean = aggregate['sum'] / count
+        variance = max(aggregate['sum_sq'] / count - mean * mean, 0.0)
+        return {
+            'count': count,
+            'mean': round(mean, 2),
+            'std': round(variance ** 0.5, 2),
+            'median': ScoreStats.percentile(aggregate, 0.5),
+            'min': aggregate['min'],
+            'max': aggregate['max'],
+            'pass_rate': round(aggregate['passed'] * 100 / count, 2)
+        }
+
+    @staticmethod
+    def bucket_file(kind, key):
+        # kind is 'exams' or 'students'
+        number = hashlib.sha1(key.encode('utf-8')).digest()[0] % ScoreStats.FILE_BUCKETS
+        return os.path.join(ScoreStats.DIRECTORY, f"{kind}_{number:02d}.json")
+
+    @classmethod
+    def _bucket(cls, filename):
+        # Cached bucket, read again when the file changed on disk
+        version = ChangeBus.file_version(filename)
+        cached = cls._cache.get(filename)
+        if cached is None or cached[0] != version:
+            cached = cls._cache[filename] = (version, Database.load_data(filename))
+        return cached[1]
+
+    @classmethod
+    def _ensure(cls):
+        # Built from the result shards on first use, which also replaces a
+        # stats.json from older versions. Returns True if it was built now,
+        # the shards already hold the results being recorded then
+        if not os.path.isdir(os.path.join('data', cls.DIRECTORY)):
+            cls.rebuild()
+            return True
+        return False
+
+    @classmethod
+    def _update(cls, kind, keys, change):
+        # Apply change(bucket, key) to the given keys, saving each touched
+        # bucket once. The caller holds _lock
+        by_file = {}
+        for key in keys:
+            by_file.setdefault(cls.bucket_file(kind, key), []).append(key)
+        for filename, bucket_keys in by_file.items():
+            bucket = cls._bucket(filename)
+            for key in bucket_keys:
+                change(bucket, key)
+            Database.save_data(filename, bucket)
+            cls._cache[filename] = (ChangeBus.file_version(filename), bucket)
+
+    @classmethod
+    def record(cls, *results):
+        scores = {'exams': {}, 'students': {}}
+        for result in results:
+            scores['exams'].setdefault(result.exam_id, []).append(result.score)
+            scores['students'].setdefault(result.student_username, []).append(result.score)
+
+        def add(kind):
+            def change(bucket, key):
+                aggregate = bucket.setdefault(key, cls.new_aggregate())
+                for score in scores[kind][key]:
+                    cls.add_score(aggregate, score)
+            return change
+
+        with cls._lock:
+            if cls._ensure():
+                return
+            for kind in scores:
+                cls._update(kind, scores[kind], add(kind))
+
+    @classmethod
+    def rebuild(cls, results=None):
+        # Full recomputation, for compact and missing statistics. The buckets
+        # are written to a new directory that then replaces the old one
+        with cls._lock:
+            if results is None:
+                results = Database.iter_result_rows()
+            data = {'exams': {}, 'students': {}}
+            for row in results:
+                cls.add_score(
+                    data['exams'].setdefault(row['exam_id'], cls.new_aggregate()), row['score'])
+                cls.add_score(
+                    data['students'].setdefault(row['student_username'], cls.new_aggregate()),
+                    row['score'])
+
+            building = cls.DIRECTORY + '.new'
+            shutil.rmtree(os.path.join('data', building), ignore_errors=True)
+            os.makedirs(os.path.join('data', building))
+            for kind, aggregates in data.items():
+                buckets = {}
+                for key, aggregate in aggregates.items():
+                    filename = os.path.basename(cls.bucket_file(kind, key))
+                    buckets.setdefault(filename, {})[key] = aggregate
+                for filename, bucket in buckets.items():
+                    Database.save_data(os.path.join(building, filename), bucket)
+
+            directory = os.path.join('data', cls.DIRECTORY)
+            if os.path.isdir(directory):
+                # Left behind by a rebuild that was interrupted
+                shutil.rmtree(directory + '.old', ignore_errors=True)
+                os.replace(directory, directory + '.old')
+            os.replace(os.path.join('data', building), directory)
+            shutil.rmtree(directory + '.old', ignore_errors=True)
+            cls._cache = {}
+            if os.path.exists(os.path.join('data', cls.LEGACY)):
+                os.remove(os.path.join('data', cls.LEGACY))
+        return data
+
+    @classmethod
+    def rebuild_for(cls, exam_ids=(), usernames=()):
+        # Recompute the aggregates of some exams and students after a delete or
+        # regrade, reading only their shards and writing only their buckets
+        aggregates = {'exams': {}, 'students': {}}
+
+        def replace(kind):
+            def change(bucket, key):
+                if aggregates[kind][key]['count']:
+                    bucket[key] = aggregates[kind][key]
+                else:
+                    bucket.pop(key, None)
+            return change
+
+        with cls._lock:
+            if cls._ensure():
+                return
+            for exam_id in exam_ids:
+                aggregate = cls.new_aggregate()
+                for row in ResultIndex.shard(exam_id)['rows']:
+                    cls.add_score(aggregate, row['score'])
+                aggregates['exams'][exam_id] = aggregate
+            for username in usernames:
+                aggregate = cls.new_aggregate()
+                for result in ResultIndex.query(student_username=username):
+                    cls.add_score(aggregate, result.score)
+                aggregates['students'][username] = aggregate
+            for kind in aggregates:
+                cls._update(kind, aggregates[kind], replace(kind))
+
+    @classmethod
+    def for_exam(cls, exam_id):
+        with cls._lock:
+            cls._ensure()
+            return cls.summarize(cls._bucket(cls.bucket_file('exams', exam_id)).get(exam_id))
+
+    @classmethod
+    def for_student(cls, username):
+        with cls._lock:
+            cls._ensure()
+            return cls.summarize(
+                cls._bucket(cls.bucket_file('students', username)).get(username))
+
+    @staticmethod
+    def format_summary(summary):
+        if not summary:
+            return "No results yet"
+        return (f"Results: {summary['count']}   Mean: {summary['mean']}%   "
+                f"Median: ~{summary['median']:.0f}%   Min/Max: {summary['min']}% / {summary['max']}%   "
+                f"Pass rate: {summary['pass_rate']}%")
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+# Load test for ems_server, e.g. python -m ems_loadtest --users 500 --setup
+# Every simulated student logs in, opens an exam, autosaves one answer per
+# question and submits, all over one keep-alive connection. --login-only
+# measures login throughput at the server's real password KDF cost: each
+# student logs in once and makes one token-authenticated request
+
+
+class Client:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.token = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write((head + "\r\n").encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        data = json.loads(await self.reader.readexactly(length)) if length else {}
+        if status != 200:
+            raise RuntimeError(f"{method} {path}: {status} {data.get('error', '')}")
+        return data
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def exam_taker(host, port, username, password, exam_id, latencies, login_latencies,
+                     think_time, login_only=False):
+    client = Client(host, port)
+
+    async def timed(method, path, payload=None):
+        start = time.perf_counter()
+        data = await client.request(method, path, payload)
+        latencies.append(time.perf_counter() - start)
+        return data
+
+    try:
+        await client.connect()
+        start = time.perf_counter()
+        client.token = (await client.request('POST', '/login',
+                                             {'username': username, 'password': password}))['token']
+        login_latencies.append(time.perf_counter() - start)
+        exams = (await timed('GET', '/exams'))['exams']
+        if login_only:
+            return None
+        if not exams:
+            raise RuntimeError("No exams on the server")
+        exam_id = exam_id or exams[0]['id']
+
+        exam = await timed('GET', f"/exams/{exam_id}")
+        for position, question in enumerate(exam['questions']):
+            if think_time:
+                await asyncio.sleep(random.uniform(0, 2 * think_time))
+            answer = {str(position): random.randrange(len(question['options']))}
+            await timed('POST', f"/exams/{exam_id}/answers", {'answers': answer})
+        return (await timed('POST', f"/exams/{exam_id}/submit", {}))['score']
+    finally:
+        client.close()
+
+
+def create_students(count, password):
+    # Local setup only: adds load-test accounts straight to data/users.json.
+    # Every password is hashed with the real KDF, so this takes a while
+    from ems_core import Database, Student
+    data = Database.load_data('users.json')
+    existing = {student['username'] for student in data['students']}
+    for i in range(count):
+        username = f"load_{i}"
+        if username not in existing:
+            data['students'].append(Student(username, password, f"Load Test {i}").to_dict())
+    Database.save_data('users.json', data)
+
+
+def format_latencies(latencies):
+    # Sorted latencies in seconds as a percentile summary in milliseconds
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    return (f"p50 {percentile(50):.1f}   p95 {percentile(95):.1f}   "
+            f"p99 {percentile(99):.1f}   max {latencies[-1] * 1000:.1f}")
+
+
+async def run(args):
+    latencies = []
+    login_latencies = []
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(
+        exam_taker(args.host, args.port, f"load_{i}", args.password, args.exam,
+                   latencies, login_latencies, args.think_time, args.login_only)
+        for i in range(args.users)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    latencies.sort()
+    login_latencies.sort()
+
+    print(f"Exam-takers:  {args.users} ({len(errors)} failed)")
+    print(f"Logins:       {len(login_latencies)} in {elapsed:.2f}s "
+          f"({len(login_latencies) / elapsed:.1f}/s)")
+    if login_latencies:
+        print(f"Login (ms):   {format_latencies(login_latencies)}")
+    print(f"Requests:     {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s)")
+    if not args.login_only:
+        print(f"Submissions:  {args.users - len(errors)} ({(args.users - len(errors)) / elapsed:.0f}/s)")
+    if latencies:
+        print(f"Latency (ms): {format_latencies(latencies)}")
+    for error in errors[:5]:
+        print(f"Error: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ems_loadtest", description="Load test for ems_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--users", type=int, default=500, help="concurrent exam-takers")
+    parser.add_argument("--password", default="load")
+    parser.add_argument("--exam", help="exam id (default: the first exam)")
+    parser.add_argument("--think-time", type=float, default=0,
+                        help="mean seconds between answers")
+    parser.add_argument("--setup", action="store_true",
+                        help="create the load_<n> student accounts first")
+    parser.add_argument("--login-only", action="store_true",
+                        help="only log in (plus one authenticated request) per student")
+    args = parser.parse_args(argv)
+
+    if args.setup:
+        create_students(args.users, args.password)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,488 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import secrets
+import sys
+import time
+from ems_core import Attempt, AttemptJournal, Database, ExamVariant, GradingEngine, Result
+
+# Exam server, e.g. python -m ems_server --port 8080
+# HTTP/JSON API for sitting exams without one Tk process per student:
+#   POST /login                  {"username", "password"} -> {"token", ...}
+#   GET  /exams                  exams available to take
+#   GET  /exams/<id>             the student's shuffled variant of an exam
+#   POST /exams/<id>/answers     autosave {"answers": {position: option}}
+#   POST /exams/<id>/submit      grade and store the attempt
+# The server's clock is authoritative: opening an exam starts (or resumes) a
+# persisted attempt, autosaves after the deadline are refused and a late
+# submit is graded on the answers saved in time. Autosaves go to the attempt
+# journal, so a restarted server picks up where students left off. Autosaves
+# and submits need an open attempt, an attempt is submitted once (409 otherwise)
+# Requests other than /login need an "Authorization: Bearer <token>" header,
+# tokens expire after 30 idle minutes.
+# Runs from the application directory (where data/ lives)
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# Sessions
+
+
+class SessionStore:
+    # Bearer tokens handed out at login, so later requests never run the
+    # password KDF again. A token expires TTL seconds after its last use
+    TTL = 30 * 60
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or SessionStore.TTL
+        self.sessions = {}  # token -> [username, expires_at]
+        self.pruned_at = time.monotonic()
+
+    def create(self, username):
+        now = time.monotonic()
+        if now - self.pruned_at > self.ttl:
+            self.prune(now)
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = [username, now + self.ttl]
+        return token
+
+    def get(self, token):
+        session = self.sessions.get(token)
+        now = time.monotonic()
+        if session is None or session[1] < now:
+            self.sessions.pop(token, None)
+            return None
+        session[1] = now + self.ttl
+        return session[0]
+
+    def revoke(self, token):
+        self.sessions.pop(token, None)
+
+    def prune(self, now=None):
+        now = now or time.monotonic()
+        self.sessions = {token: session for token, session in self.sessions.items()
+                         if session[1] >= now}
+        self.pruned_at = now
+
+# Hot data
+
+
+class HotData:
+    # In-memory copies of exams and questions, reloaded when their files
+    # change on disk. The files are checked at most once per interval
+    RELOAD_INTERVAL = 1.0
+    FILES = ('exams.json', 'questions.json')
+
+    def __init__(self):
+        self.versions = None
+        self.checked_at = 0
+        self.exams = {}
+        self.questions = {}
+        self.prepared = {}
+        self.refresh(force=True)
+
+    @staticmethod
+    def file_versions():
+        versions = []
+        for filename in HotData.FILES:
+            try:
+                stat = os.stat(os.path.join('data', filename))
+                versions.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                versions.append(None)
+        return versions
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.RELOAD_INTERVAL:
+            return
+        self.checked_at = now
+        versions = self.file_versions()
+        if versions == self.versions:
+            return
+
+        self.versions = versions
+        self.exams = {exam.id: exam for exam in Database.get_all_exams()}
+        self.questions = {question.id: question for question in Database.get_all_questions()}
+        self.prepared = {}
+
+    def prepare(self, exam):
+        # Questions, option counts and answer key of an exam, built once per reload
+        prepared = self.prepared.get(exam.id)
+        if prepared is None:
+            questions = [self.questions[q] for q in exam.questions if q in self.questions]
+            option_counts = [len(question.options) for question in questions]
+            prepared = self.prepared[exam.id] = (questions, option_counts,
+                                                 GradingEngine(questions))
+        return prepared
+
+# Batched result writes
+
+
+class ResultBatcher:
+    # Submissions wait on a future while they are collected into batches that
+    # are written with one Database.add_results call on a worker thread, so the
+    # event loop never blocks on disk and each exam's result shard is
+    # rewritten once per batch
+    def __init__(self, interval=0.5, max_batch=500):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.batches = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def submit(self, result):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((result, future))
+        if len(self.pending) >= self.max_batch:
+            self.wakeup.set()
+        await future
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            await asyncio.to_thread(Database.add_results, [result for result, future in batch])
+        except Exception as e:
+            for result, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        for result, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        await self.flush()
+
+# Exam server
+
+
+class ExamServer:
+    MAX_BODY = 1 << 20
+    REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+               405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+
+    def __init__(self, batch_interval=0.5, max_batch=500):
+        self.data = HotData()
+        self.batcher = ResultBatcher(batch_interval, max_batch)
+        self.sessions = SessionStore()
+        self.attempts = {}
+        # Password KDFs run here, one core is left to the event loop
+        self.kdf_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, (os.cpu_count() or 1) - 1))
+        # attempts.json is rewritten on this one thread, so the event loop
+        # never waits on it and its read-modify-writes never interleave
+        self.attempt_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    # HTTP plumbing
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "Malformed request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "Invalid Content-Length"}, False)
+                    break
+                if length > self.MAX_BODY:
+                    await self.respond(writer, 413, {'error': "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                keep_alive = (version == 'HTTP/1.1' and
+                              headers.get('connection', '').lower() != 'close')
+                try:
+                    status, payload = 200, await self.dispatch(method, target, headers, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, body):
+        parts = [part for part in target.split('?', 1)[0].split('/') if part]
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            raise HttpError(400, "Body must be JSON")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "Body must be a JSON object")
+
+        self.data.refresh()
+        if parts == ['login']:
+            self.require_method(method, 'POST')
+            return await self.login(payload)
+
+        username = self.authenticate(headers)
+        if parts == ['exams']:
+            self.require_method(method, 'GET')
+            return self.list_exams()
+        if len(parts) == 2 and parts[0] == 'exams':
+            self.require_method(method, 'GET')
+            return await self.get_exam(username, parts[1])
+        if len(parts) == 3 and parts[0] == 'exams' and parts[2] == 'answers':
+            self.require_method(method, 'POST')
+            return await self.save_answers(username, parts[1], payload)
+        if len(parts) == 3 and parts[0] == 'exams' and parts[2] == 'submit':
+            self.require_method(method, 'POST')
+            return await self.submit(username, parts[1], payload)
+        raise HttpError(404, "Not found")
+
+    @staticmethod
+    def require_method(method, expected):
+        if method != expected:
+            raise HttpError(405, f"Use {expected}")
+
+    # Sessions
+
+    async def login(self, payload):
+        username = payload.get('username', '')
+        password = payload.get('password', '')
+        if not isinstance(username, str) or not isinstance(password, str):
+            raise HttpError(400, "username and password must be strings")
+        # The password KDF runs on a worker thread so it never stalls other requests
+        user = await asyncio.get_running_loop().run_in_executor(
+            self.kdf_pool, Database.authenticate_user, username, password)
+        if not user or user.role != 'student':
+            raise HttpError(401, "Invalid username or password")
+        token = self.sessions.create(username)
+        return {'token': token, 'username': username, 'full_name': user.full_name}
+
+    def authenticate(self, headers):
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        username = self.sessions.get(token) if scheme.lower() == 'bearer' else None
+        if username is None:
+            raise HttpError(401, "Login required")
+        return username
+
+    # Exams and attempts
+
+    def find_exam(self, exam_id):
+        exam = self.data.exams.get(exam_id)
+        if exam is None:
+            raise HttpError(404, "Exam not found")
+        return exam
+
+    def list_exams(self):
+        return {'exams': [{
+            'id': exam.id,
+            'title': exam.title,
+            'description': exam.description,
+            'question_count': len(exam.questions),
+            'time_limit': exam.time_limit
+        } for exam in self.data.exams.values()]}
+
+    @staticmethod
+    def load_attempt(username, exam, create):
+        # Runs on attempt_pool: the open attempt record (started if create)
+        # and its replayed journal, or None
+        if create:
+            record = Database.start_attempt(username, exam)
+        else:
+            record = Database.get_open_attempt(username, exam.id)
+        if record is None:
+            return None
+        return record, AttemptJournal.replay(record.id, record.deadline + Attempt.GRACE)
+
+    async def attempt(self, username, exam, renew=False, create=True):
+        # Autosaved answers, the student's variant and the persisted attempt
+        # record, keyed by (student, exam). renew replaces an expired attempt,
+        # without create only an open attempt is returned (or None)
+        key = (username, exam.id)
+        attempt = self.attempts.get(key)
+        if (attempt is not None and renew and not attempt['submitting'] and
+                attempt['record'].is_overdue()):
+            attempt['journal'].close()
+            del self.attempts[key]
+            attempt = None
+        if attempt is None:
+            loaded = await asyncio.get_running_loop().run_in_executor(
+                self.attempt_pool, self.load_attempt, username, exam, create)
+            # Another request may have loaded it while this one waited
+            attempt = self.attempts.get(key)
+            if attempt is None and loaded is not None:
+                record, replayed = loaded
+                questions, option_counts, engine = self.data.prepare(exam)
+                attempt = self.attempts[key] = {
+                    'record': record,
+                    'variant': ExamVariant(exam.id, username, len(questions)),
+                    'answers': {position: option for position, option in replayed.items()
+                                if position < len(questions)},
+                    'journal': AttemptJournal(record.id),
+                    'submitting': False
+                }
+        return attempt
+
+    async def get_exam(self, username, exam_id):
+        exam = self.find_exam(exam_id)
+        attempt = await self.attempt(username, exam, renew=True)
+        questions, option_counts, engine = self.data.prepare(exam)
+        variant = attempt['variant']
+
+        displayed = []
+        for index in variant.question_order:
+            question = questions[index]
+            order = variant.option_order(index, len(question.options))
+            displayed.append({
+                'text': question.text,
+                'options': [question.options[i] for i in order]
+            })
+        return {
+            'id': exam.id,
+            'title': exam.title,
+            'description': exam.description,
+            'time_limit': exam.time_limit,
+            'started_at': attempt['record'].started_at,
+            'remaining': attempt['record'].remaining(),
+            'questions': displayed,
+            'answers': attempt['answers']
+        }
+
+    def parse_answers(self, exam, attempt, payload):
+        # {"position": option} with both indices in the displayed order
+        questions, option_counts, engine = self.data.prepare(exam)
+        question_order = attempt['variant'].question_order
+        answers = payload.get('answers', {})
+        if not isinstance(answers, dict):
+            raise HttpError(400, "answers must be an object")
+        parsed = {}
+        try:
+            for position, option in answers.items():
+                position, option = int(position), int(option)
+                if not 0 <= position < len(questions):
+                    raise ValueError
+                if not 0 <= option < option_counts[question_order[position]]:
+                    raise ValueError
+                parsed[position] = option
+        except (TypeError, ValueError):
+            raise HttpError(400, "Invalid answer")
+        return parsed
+
+    async def save_answers(self, username, exam_id, payload):
+        exam = self.find_exam(exam_id)
+        attempt = await self.attempt(username, exam, create=False)
+        if attempt is None or attempt['submitting']:
+            raise HttpError(409, "No open attempt on this exam")
+        if attempt['record'].is_overdue():
+            raise HttpError(409, "Time is up")
+        for position, option in self.parse_answers(exam, attempt, payload).items():
+            if attempt['answers'].get(position) != option:
+                attempt['answers'][position] = option
+                attempt['journal'].append(position, option)
+        return {'saved': len(attempt['answers']), 'remaining': attempt['record'].remaining()}
+
+    async def submit(self, username, exam_id, payload):
+        exam = self.find_exam(exam_id)
+        attempt = await self.attempt(username, exam, create=False)
+        if attempt is None or attempt['submitting']:
+            raise HttpError(409, "No open attempt on this exam")
+        questions, option_counts, engine = self.data.prepare(exam)
+        answers = dict(attempt['answers'])
+        # Past the deadline only the answers autosaved in time count
+        if not attempt['record'].is_overdue():
+            answers.update(self.parse_answers(exam, attempt, payload))
+
+        canonical = attempt['variant'].to_canonical(answers, option_counts)
+        result = Result(student_username=username, exam_id=exam.id,
+                        score=engine.score(canonical), answers=canonical,
+                        question_ids=[question.id for question in questions])
+        # Set before the first await, so a concurrent submit gets a 409
+        attempt['submitting'] = True
+        try:
+            await self.batcher.submit(result)
+        except BaseException:
+            attempt['submitting'] = False
+            raise
+        self.attempts.pop((username, exam.id), None)
+        attempt['journal'].close()
+        await asyncio.get_running_loop().run_in_executor(
+            self.attempt_pool, Database.finish_attempt, attempt['record'].id)
+        return {'result_id': result.id, 'score': result.score}
+
+    async def serve(self, host, port):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+        print(f"Serving on {host}:{port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ems_server", description="Exam Management System server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batch-interval", type=float, default=0.5,
+                        help="seconds between batched result writes")
+    parser.add_argument("--max-batch", type=int, default=500,
+                        help="write early once this many results are waiting")
+    args = parser.parse_args(argv)
+
+    server = ExamServer(args.batch_interval, args.max_batch)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
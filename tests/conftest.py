@@ -0,0 +1,32 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module', autouse=True)
+def data_directory(request, tmp_path_factory):
+    # ems_core keeps its data in ./data, so every test module works in its own
+    # scratch directory. The module is imported there and handed to the test
+    # module as its ems_core global
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('ems'))
+    os.makedirs('data', exist_ok=True)
+    request.module.ems_core = importlib.import_module('ems_core')
+    yield
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope='module')
+def gui(data_directory):
+    # The Tk application module, its file name is not importable as is. It
+    # imports ems_core, so the data directory comes first
+    spec = importlib.util.spec_from_file_location(
+        'ems_gui', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'EMS 27-4.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
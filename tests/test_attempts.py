@@ -0,0 +1,67 @@
+import os
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+class OverdueAttemptTest(unittest.TestCase):
+    def setUp(self):
+        Database, Question, Exam = ems_core.Database, ems_core.Question, ems_core.Exam
+        self.questions = [Question(text=f'Q{i}', options=['a', 'b', 'c'], correct_answer=i % 3)
+                          for i in range(4)]
+        for question in self.questions:
+            Database.add_question(question)
+        self.exam = Exam(title='Timed', questions=[q.id for q in self.questions], time_limit=1)
+        Database.add_exam(self.exam)
+        self.username = f'student_{self.exam.id}'
+
+    def answer_and_expire(self):
+        # Journal correct answers to the first two displayed questions, then
+        # move the start back so the attempt is past its deadline
+        Database = ems_core.Database
+        attempt = Database.start_attempt(self.username, self.exam)
+        variant = ems_core.ExamVariant(self.exam.id, self.username, len(self.questions))
+        journal = ems_core.AttemptJournal(attempt.id)
+        for position in range(2):
+            index = variant.question_order[position]
+            order = variant.option_order(index, 3)
+            journal.append(position, order.index(self.questions[index].correct_answer))
+        journal.close()
+
+        data = Database.load_data('attempts.json')
+        for row in data['attempts']:
+            if row['id'] == attempt.id:
+                row['started_at'] -= 3600
+        Database.save_data('attempts.json', data)
+        # The journal lines were written before the moved deadline
+        with open(ems_core.AttemptJournal.path(attempt.id), 'rb') as f:
+            lines = [line.split() for line in f]
+        with open(ems_core.AttemptJournal.path(attempt.id), 'wb') as f:
+            for parts in lines:
+                parts[3] = f"{float(parts[3]) - 3600:.3f}".encode()
+                f.write(b' '.join(parts) + b'\n')
+        return attempt
+
+    def test_start_attempt_grades_overdue_attempt(self):
+        Database = ems_core.Database
+        overdue = self.answer_and_expire()
+
+        attempt = Database.start_attempt(self.username, self.exam)
+
+        self.assertNotEqual(attempt.id, overdue.id)
+        self.assertFalse(os.path.exists(ems_core.AttemptJournal.path(overdue.id)))
+        results = Database.get_results_by_exam(self.exam.id)
+        self.assertEqual([result.score for result in results], [50.0])
+        self.assertEqual(len(results[0].answers), 2)
+
+    def test_get_open_attempt_grades_overdue_attempt(self):
+        Database = ems_core.Database
+        self.answer_and_expire()
+
+        self.assertIsNone(Database.get_open_attempt(self.username, self.exam.id))
+        self.assertEqual([result.score for result in Database.get_results_by_exam(self.exam.id)],
+                         [50.0])
+        self.assertEqual([row for row in Database.load_data('attempts.json')['attempts']
+                          if row['student_username'] == self.username], [])
+
@@ -0,0 +1,38 @@
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+class ColumnarExportTest(unittest.TestCase):
+    def test_answers_are_grouped_by_the_questions_they_were_taken_with(self):
+        Database, Question, Exam, Result = (ems_core.Database, ems_core.Question,
+                                            ems_core.Exam, ems_core.Result)
+        q0, q1, q2 = (Question(text=f'Q{i}', options=['a', 'b', 'c']) for i in range(3))
+        for question in (q0, q1, q2):
+            Database.add_question(question)
+        exam = Exam(title='Columnar', questions=[q0.id, q1.id, q2.id])
+        Database.add_exam(exam)
+        Database.add_result(Result('jack', exam.id, 0.0, answers={0: 0, 2: 1},
+                                   question_ids=[q0.id, q1.id, q2.id]))
+        Database.add_result(Result('kate', exam.id, 0.0, answers={0: 2},
+                                   date='2000-01-01 00:00:00'))
+        Database.delete_question(q0.id)
+        Database.add_result(Result('liam', exam.id, 0.0, answers={1: 2},
+                                   question_ids=[q1.id, q2.id]))
+
+        rows = ems_core.ColumnarExport.write('columnar', exam_id=exam.id)
+        manifest, columns = ems_core.ColumnarExport.load('columnar')
+
+        self.assertEqual(rows, 3)
+        self.assertEqual(manifest['version'], 2)
+        groups = {tuple(group['question_ids']): group['code']
+                  for group in manifest['answer_groups']}
+        self.assertEqual(set(groups), {(q0.id, q1.id, q2.id), (q1.id, q2.id)})
+        self.assertEqual(columns['answer_groups'].tolist(),
+                         [groups[(q0.id, q1.id, q2.id)], -1, groups[(q1.id, q2.id)]])
+        old, new = groups[(q0.id, q1.id, q2.id)], groups[(q1.id, q2.id)]
+        self.assertEqual(columns[f'answers_{old}'].tolist(), [[0, -1, 1]])
+        self.assertEqual(columns[f'rows_{old}'].tolist(), [0])
+        self.assertEqual(columns[f'answers_{new}'].tolist(), [[-1, 2]])
+        self.assertEqual(columns[f'rows_{new}'].tolist(), [2])
@@ -0,0 +1,41 @@
+import csv
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+class ExportAnswersTest(unittest.TestCase):
+    def setUp(self):
+        Database, Question, Exam = ems_core.Database, ems_core.Question, ems_core.Exam
+        self.questions = [Question(text=f'Q{i}', options=['a', 'b', 'c'], correct_answer=0)
+                          for i in range(3)]
+        for question in self.questions:
+            Database.add_question(question)
+        self.exam = Exam(title='Export', questions=[q.id for q in self.questions])
+        Database.add_exam(self.exam)
+
+    def test_answers_follow_the_questions_after_an_edit(self):
+        Database, Result = ems_core.Database, ems_core.Result
+        q0, q1, q2 = (q.id for q in self.questions)
+        Database.add_result(Result('gina', self.exam.id, 0.0, answers={0: 0, 2: 1},
+                                   question_ids=[q0, q1, q2], date='2020-01-01 00:00:00'))
+        Database.add_result(Result('hank', self.exam.id, 0.0, answers={0: 2},
+                                   date='2020-01-01 00:00:00'))
+        Database.delete_question(q0)
+        Database.add_result(Result('ivan', self.exam.id, 0.0, answers={0: 2, 1: 0},
+                                   question_ids=[q1, q2]))
+
+        records = {record['student_username']: record['answers']
+                   for record in ems_core.ExportJob.iter_records(True, exam_id=self.exam.id)}
+        self.assertEqual(records, {'gina': [None, 'B'], 'hank': None, 'ivan': ['C', 'A']})
+
+        job = ems_core.ExportJob('answers.csv', 'csv', include_answers=True,
+                                 exam_id=self.exam.id)
+        job.run()
+        self.assertEqual(job.queue.get()[0], 'progress')
+        with open('answers.csv', newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][-2:], ['Q1', 'Q2'])
+        self.assertEqual(sorted(row[-2:] for row in rows[1:]),
+                         [['', ''], ['', 'B'], ['C', 'A']])
@@ -0,0 +1,64 @@
+import random
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+def loop_score(key, answers):
+    # The per-question grading loop GradingEngine replaced
+    correct = sum(1 for question, option in answers.items()
+                  if 0 <= question < len(key) and option == key[question])
+    return round(correct / len(key) * 100, 2) if key else 0
+
+
+class ExamVariantTest(unittest.TestCase):
+    def test_to_canonical_inverts_the_displayed_order(self):
+        option_counts = [4, 2, 5, 4, 3, 4]
+        variant = ems_core.ExamVariant('e_variant', 'ivy', len(option_counts))
+        # Same exam and student, same variant
+        self.assertEqual(ems_core.ExamVariant('e_variant', 'ivy', 6).question_order,
+                         variant.question_order)
+
+        canonical = {index: (index * 3) % count for index, count in enumerate(option_counts)}
+        displayed = {}
+        for index, option in canonical.items():
+            order = variant.option_order(index, option_counts[index])
+            displayed[variant.question_order.index(index)] = order.index(option)
+        self.assertEqual(variant.to_canonical(displayed, option_counts), canonical)
+
+    def test_options_are_shuffled_per_question(self):
+        variant = ems_core.ExamVariant('e_variant', 'jack', 40)
+        orders = [variant.option_order(index, 4) for index in range(40)]
+        self.assertTrue(all(sorted(order) == [0, 1, 2, 3] for order in orders))
+        self.assertTrue(any(order != [0, 1, 2, 3] for order in orders))
+        self.assertNotEqual(variant.question_order, list(range(40)))
+        # Skipped questions stay unanswered
+        self.assertEqual(variant.to_canonical({}, [4] * 40), {})
+
+
+class GradingEngineTest(unittest.TestCase):
+    def test_score_and_pack_match_the_per_question_loop(self):
+        rng = random.Random(7)
+        questions = [ems_core.Question(text=f'G{i}', options=['a', 'b', 'c', 'd'],
+                                       correct_answer=rng.randrange(4)) for i in range(7)]
+        key = [question.correct_answer for question in questions]
+        engine = ems_core.GradingEngine(questions)
+
+        answer_dicts = [{}, {0: key[0]}, {i: key[i] for i in range(7)}, {9: 0, -1: 1, 2: key[2]}]
+        for _ in range(50):
+            answer_dicts.append({question: rng.randrange(4)
+                                 for question in rng.sample(range(7), rng.randrange(8))})
+
+        for answers in answer_dicts:
+            self.assertEqual(engine.score(answers), loop_score(key, answers), answers)
+        self.assertEqual(engine.grade(answer_dicts).scores,
+                         [loop_score(key, answers) for answers in answer_dicts])
+
+        matrix = ems_core.GradingEngine.pack(answer_dicts, 7)
+        for row, answers in zip(matrix.tolist(), answer_dicts):
+            self.assertEqual(row, [answers.get(i, ems_core.GradingEngine.UNANSWERED)
+                                   for i in range(7)])
+
+    def test_empty_exam_scores_zero(self):
+        self.assertEqual(ems_core.GradingEngine([]).score({0: 1}), 0)
@@ -0,0 +1,50 @@
+import threading
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+def test_ids_are_unique_and_sorted_across_threads():
+    ids = []
+
+    def make():
+        local = [ems_core.IdGenerator.next_id('q') for _ in range(500)]
+        # Each thread sees its own ids in creation order
+        assert local == sorted(local)
+        ids.extend(local)
+
+    threads = [threading.Thread(target=make) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == 2000
+    assert all(id_value.startswith('q_') and len(id_value.split('_')[1]) == 17 for id_value in ids)
+
+
+def test_ids_stay_ordered_when_the_clock_moves_back(monkeypatch):
+    IdGenerator = ems_core.IdGenerator
+    # The generator's state is restored for the ids made after this test
+    monkeypatch.setattr(IdGenerator, '_last_ms', IdGenerator._last_ms)
+    monkeypatch.setattr(IdGenerator, '_counter', IdGenerator._counter)
+    clock = [2_000_000_000_000 * 1_000_000]
+    monkeypatch.setattr(ems_core.time, 'time_ns', lambda: clock[0])
+
+    ids = [IdGenerator.next_id('e')]
+    clock[0] -= 5_000 * 1_000_000
+    ids += [IdGenerator.next_id('e') for _ in range(3)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 4
+
+
+def test_counter_overflow_moves_to_the_next_millisecond(monkeypatch):
+    IdGenerator = ems_core.IdGenerator
+    # The generator's state is restored for the ids made after this test
+    monkeypatch.setattr(IdGenerator, '_last_ms', IdGenerator._last_ms)
+    monkeypatch.setattr(IdGenerator, '_counter', IdGenerator._counter)
+    monkeypatch.setattr(ems_core.time, 'time_ns', lambda: 2_100_000_000_000 * 1_000_000)
+
+    ids = [IdGenerator.next_id('e') for _ in range(IdGenerator.COUNTER_LIMIT + 1)]
+    assert ids == sorted(ids)
+    assert ids[0].split('_')[1] != ids[-1].split('_')[1]
+    assert ids[-1].split('_')[2].startswith('0000')
@@ -0,0 +1,73 @@
+import json
+import sys
+import types
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+def fake_requests(body, on_chunk):
+    # A requests module whose response yields body in two chunks
+    class Response:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def iter_content(self, chunk_size):
+            half = len(body) // 2
+            for chunk in (body[:half], body[half:]):
+                on_chunk()
+                yield chunk
+
+    module = types.ModuleType('requests')
+    module.get = lambda *args, **kwargs: Response()
+    return module
+
+
+def trivia_payload():
+    return json.dumps({'response_code': 0, 'results': [{
+        'question': 'Q &amp; A?', 'correct_answer': 'a',
+        'incorrect_answers': ['b', 'c', 'd'], 'category': 'General'}]}).encode('utf-8')
+
+
+def test_fetch_reads_the_response_in_chunks(monkeypatch):
+    chunks = []
+    monkeypatch.setitem(sys.modules, 'requests',
+                        fake_requests(trivia_payload(), lambda: chunks.append(1)))
+    items = ems_core.DataCrawler.fetch_trivia_items(1, use_cache=False, replay=False)
+    assert len(chunks) == 2
+    assert items[0]['question'] == 'Q &amp; A?'
+
+
+def test_cancel_stops_the_fetch_between_chunks(monkeypatch):
+    job = ems_core.ImportJob(1, use_cache=False)
+    chunks = []
+
+    def on_chunk():
+        chunks.append(1)
+        job.cancel()
+
+    monkeypatch.setitem(sys.modules, 'requests', fake_requests(trivia_payload(), on_chunk))
+    monkeypatch.setattr(ems_core.DataCrawler, 'replay', False)
+    job.run()
+    assert len(chunks) == 1
+    assert job.queue.get_nowait() == ('cancelled',)
+    assert job.queue.empty()
+
+
+def test_import_skips_questions_stored_before_normalization(monkeypatch):
+    # Saved raw by an older import, entities and spacing included
+    ems_core.Database.add_question(ems_core.Question(
+        text='Q  &amp; A?', options=['a', 'b', 'c', 'd'], correct_answer=0))
+    monkeypatch.setitem(sys.modules, 'requests', fake_requests(trivia_payload(), lambda: None))
+    monkeypatch.setattr(ems_core.DataCrawler, 'replay', False)
+
+    job = ems_core.ImportJob(1, use_cache=False)
+    job.run()
+    messages = []
+    while not job.queue.empty():
+        messages.append(job.queue.get_nowait())
+    assert messages[-1] == ('done', 0, 1)
+    assert [q.text for q in ems_core.Database.get_all_questions()].count('Q & A?') == 0
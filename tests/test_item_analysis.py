@@ -0,0 +1,53 @@
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+class ItemAnalysisAfterEditTest(unittest.TestCase):
+    def setUp(self):
+        Database, Question, Exam = ems_core.Database, ems_core.Question, ems_core.Exam
+        self.questions = [Question(text=f'Q{i}', options=['a', 'b', 'c'], correct_answer=0)
+                          for i in range(3)]
+        for question in self.questions:
+            Database.add_question(question)
+        self.exam = Exam(title='Items', questions=[q.id for q in self.questions])
+        Database.add_exam(self.exam)
+
+    def add_result(self, answers, question_ids):
+        ems_core.Database.add_result(ems_core.Result(
+            'student', self.exam.id, 0.0, answers=answers, question_ids=question_ids))
+
+    def test_results_before_an_edit_keep_their_columns(self):
+        Database = ems_core.Database
+        q0, q1, q2 = (q.id for q in self.questions)
+        # Before the edit: Q0 always right, Q1 always wrong, Q2 always blank
+        for _ in range(3):
+            self.add_result({0: 0, 1: 2}, [q0, q1, q2])
+
+        Database.delete_question(q0)
+        self.exam = Database.get_exam_by_id(self.exam.id)
+        self.exam.questions = [q2, q1]
+        Database.update_exam(self.exam)
+        self.add_result({0: 0, 1: 1}, [q2, q1])
+
+        report = ems_core.ItemAnalysis.for_exam(self.exam.id)
+        self.assertEqual([q.id for q in report.questions], [q2, q1])
+        self.assertEqual(report.student_count, 4)
+        self.assertEqual(report.excluded, 0)
+        # Q2 was left blank by the three older results, right in the new one
+        self.assertEqual(report.p_values.tolist(), [0.25, 0.0])
+        self.assertEqual(report.unanswered.tolist(), [3, 0])
+        self.assertEqual(report.option_counts[1].tolist(), [0, 1, 3])
+
+    def test_results_missing_a_current_question_are_left_out(self):
+        Database = ems_core.Database
+        q0, q1, q2 = (q.id for q in self.questions)
+        self.add_result({0: 0, 1: 0}, [q0, q1])
+        self.add_result({0: 0, 1: 0, 2: 0}, [q0, q1, q2])
+
+        report = ems_core.ItemAnalysis.for_exam(self.exam.id)
+        self.assertEqual(report.student_count, 1)
+        self.assertEqual(report.excluded, 1)
+        self.assertEqual(report.p_values.tolist(), [1.0, 1.0, 1.0])
+        Database.delete_exam(self.exam.id)
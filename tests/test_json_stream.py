@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+def write(name, text):
+    path = os.path.join('data', name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+ROWS = [
+    {'id': 'r1', 'student_username': 'kim', 'answers': {'0': 1}, 'note': 'commas, ] and [ inside'},
+    {'id': 'r2', 'student_username': 'lê', 'answers': {}, 'note': 'multi-byte ✓ 𝄞 text'},
+    {'id': 'r3', 'student_username': 'mo', 'answers': {'1': 0, '2': 3}, 'note': '"quoted" \\ slash'},
+]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 20])
+def test_rows_match_json_load_at_any_chunk_size(chunk_size):
+    path = write('stream.json', json.dumps({'results': ROWS}, ensure_ascii=False, indent=2))
+    progress = []
+    rows = list(ems_core.Database.iter_json_rows(
+        path, lambda done, total: progress.append((done, total)), chunk_size))
+    assert rows == ROWS
+    total = os.path.getsize(path)
+    assert progress[-1] == (total, total)
+    assert [done for done, _ in progress] == sorted(done for done, _ in progress)
+
+
+def test_empty_and_missing_files_yield_nothing():
+    assert list(ems_core.Database.iter_json_rows(write('empty.json', '{"results": []}'))) == []
+    assert list(ems_core.Database.iter_json_rows(os.path.join('data', 'missing.json'))) == []
+
+
+def test_truncated_file_raises():
+    text = json.dumps({'results': ROWS})
+    path = write('truncated.json', text[:len(text) // 2])
+    with pytest.raises(ValueError):
+        list(ems_core.Database.iter_json_rows(path, chunk_size=5))
@@ -0,0 +1,96 @@
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+class RegradeAfterDeleteTest(unittest.TestCase):
+    def setUp(self):
+        Database, Question, Exam = ems_core.Database, ems_core.Question, ems_core.Exam
+        self.q1 = Question(text='One', options=['a', 'b'], correct_answer=0)
+        self.q2 = Question(text='Two', options=['a', 'b'], correct_answer=1)
+        self.q3 = Question(text='Three', options=['a', 'b'], correct_answer=0)
+        for question in (self.q1, self.q2, self.q3):
+            Database.add_question(question)
+        self.exam = Exam(title='Regrade', questions=[self.q1.id, self.q2.id, self.q3.id])
+        Database.add_exam(self.exam)
+
+    def add_result(self, answers, **kwargs):
+        result = ems_core.Result(student_username='student', exam_id=self.exam.id,
+                                 score=100.0, answers=answers, **kwargs)
+        ems_core.Database.add_result(result)
+        return result.id
+
+    def test_regrade_after_delete_grades_against_recorded_questions(self):
+        Database = ems_core.Database
+        result_id = self.add_result({0: 0, 1: 1, 2: 0},
+                                    question_ids=[self.q1.id, self.q2.id, self.q3.id])
+
+        Database.delete_question(self.q1.id)
+        self.q3.correct_answer = 1
+        Database.update_question(self.q3)
+        counts = Database.regrade_question(self.q3.id)
+
+        # Positions still refer to the three questions the result was taken
+        # with, so only the third answer turns wrong. The first question is
+        # gone, so the result cannot be regraded and keeps its score
+        self.assertEqual(counts, {'changed': 0, 'skipped': 1})
+        self.assertEqual(Database.get_result_by_id(result_id).score, 100.0)
+
+    def test_regrade_after_removal_from_exam_keeps_answer_positions(self):
+        Database = ems_core.Database
+        result_id = self.add_result({0: 0, 1: 1, 2: 0},
+                                    question_ids=[self.q1.id, self.q2.id, self.q3.id])
+
+        self.exam.questions = [self.q2.id, self.q3.id]
+        Database.update_exam(self.exam)
+        self.q3.correct_answer = 1
+        Database.update_question(self.q3)
+        counts = Database.regrade_question(self.q3.id)
+
+        self.assertEqual(counts, {'changed': 1, 'skipped': 0})
+        self.assertAlmostEqual(Database.get_result_by_id(result_id).score, 200 / 3, places=1)
+
+    def test_regrade_question_reaches_results_after_removal_from_exam(self):
+        Database = ems_core.Database
+        result_id = self.add_result({0: 0, 1: 1, 2: 0},
+                                    question_ids=[self.q1.id, self.q2.id, self.q3.id])
+
+        self.exam.questions = [self.q2.id, self.q3.id]
+        Database.update_exam(self.exam)
+        self.q1.correct_answer = 1
+        Database.update_question(self.q1)
+        counts = Database.regrade_question(self.q1.id)
+
+        self.assertEqual(counts, {'changed': 1, 'skipped': 0})
+        self.assertAlmostEqual(Database.get_result_by_id(result_id).score, 200 / 3, places=1)
+
+    def test_taken_question_ids_and_realign(self):
+        Result = ems_core.Result
+        bank = {self.q1.id, self.q2.id, self.q3.id}
+        row = {'date': '2000-01-01 00:00:00', 'question_ids': [self.q3.id, self.q1.id]}
+        self.assertEqual(Result.taken_question_ids(row, self.exam, bank), [self.q3.id, self.q1.id])
+        legacy = {'date': '2000-01-01 00:00:00'}
+        self.assertEqual(Result.taken_question_ids(legacy, self.exam, bank - {self.q2.id}),
+                         [self.q1.id, self.q3.id])
+        self.exam.questions_changed_at = '2001-01-01 00:00:00'
+        self.assertIsNone(Result.taken_question_ids(legacy, self.exam, bank))
+
+        self.assertEqual(Result.realign({0: 1, '1': 0}, [self.q3.id, self.q1.id],
+                                        [self.q1.id, self.q2.id]), {0: 0})
+
+    def test_regrade_skips_legacy_results_older_than_question_change(self):
+        Database = ems_core.Database
+        legacy_id = self.add_result({0: 0, 1: 1, 2: 0}, date='2000-01-01 00:00:00')
+        Database.delete_question(self.q1.id)
+        current_id = self.add_result({0: 1, 1: 0},
+                                     question_ids=[self.q2.id, self.q3.id])
+
+        self.q2.correct_answer = 0
+        Database.update_question(self.q2)
+        counts = Database.regrade_question(self.q2.id)
+
+        self.assertEqual(counts, {'changed': 1, 'skipped': 1})
+        self.assertEqual(Database.get_result_by_id(legacy_id).score, 100.0)
+        self.assertEqual(Database.get_result_by_id(current_id).score, 50.0)
+
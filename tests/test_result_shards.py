@@ -0,0 +1,61 @@
+import json
+import os
+import threading
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+def legacy_row(id, exam_id, username, score):
+    return {'id': id, 'student_username': username, 'exam_id': exam_id, 'score': score,
+            'answers': {'0': 1}, 'date': '2024-01-01 10:00:00'}
+
+
+class ResultShardsTest(unittest.TestCase):
+    def test_query_by_exam_migrates_legacy_results(self):
+        os.makedirs('data', exist_ok=True)
+        with open(os.path.join('data', 'results.json'), 'w', encoding='utf-8') as f:
+            json.dump({'results': [legacy_row('r1', 'e_legacy1', 'alice', 50.0),
+                                   legacy_row('r2', 'e_legacy1', 'bob', 100.0),
+                                   legacy_row('r3', 'e_legacy2', 'alice', 0.0)]}, f)
+
+        results = ems_core.Database.get_results_by_exam('e_legacy1')
+
+        self.assertEqual(sorted(result.id for result in results), ['r1', 'r2'])
+        self.assertFalse(os.path.exists(os.path.join('data', 'results.json')))
+        self.assertTrue(os.path.exists(os.path.join('data', 'results.json.migrated')))
+        self.assertEqual(ems_core.Database.get_result_by_id('r3', 'e_legacy2').score, 0.0)
+        self.assertEqual(ems_core.Database.get_result_by_id('r3').exam_id, 'e_legacy2')
+        self.assertIsNone(ems_core.Database.get_result_by_id('r3', 'e_legacy1'))
+        self.assertEqual(
+            sorted(r.id for r in ems_core.Database.get_results_by_student('alice')), ['r1', 'r3'])
+
+    def test_reads_and_appends_do_not_deadlock(self):
+        Database, Result = ems_core.Database, ems_core.Result
+        errors = []
+
+        def append():
+            try:
+                for i in range(100):
+                    Database.add_result(Result('carol', 'e_busy', float(i)))
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                for i in range(100):
+                    Database.get_results_by_student('carol')
+                    Database.get_result_by_id('missing')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=append), threading.Thread(target=read)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(errors, [])
+        self.assertEqual(len(Database.get_results_by_exam('e_busy')), 100)
+
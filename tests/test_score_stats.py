@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import threading
+import unittest
+
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+class ScoreStatsTest(unittest.TestCase):
+    def test_record_touches_only_its_buckets_and_matches_rebuild(self):
+        Database, Result, ScoreStats = ems_core.Database, ems_core.Result, ems_core.ScoreStats
+        # A data directory from before the statistics buckets
+        shutil.rmtree(os.path.join('data', ScoreStats.DIRECTORY), ignore_errors=True)
+        with open(os.path.join('data', ScoreStats.LEGACY), 'w', encoding='utf-8') as f:
+            json.dump({'exams': {}, 'students': {}}, f)
+        Database.add_results([Result('dora', 'e_stats1', 40.0), Result('erin', 'e_stats2', 90.0)])
+        self.assertFalse(os.path.exists(os.path.join('data', ScoreStats.LEGACY)))
+
+        files = {filename: ems_core.ChangeBus.file_version(filename)
+                 for filename in (os.path.join(ScoreStats.DIRECTORY, name)
+                                  for name in os.listdir(os.path.join('data', ScoreStats.DIRECTORY)))}
+        Database.add_result(Result('dora', 'e_stats1', 80.0))
+        touched = {ScoreStats.bucket_file('exams', 'e_stats1'),
+                   ScoreStats.bucket_file('students', 'dora')}
+        for filename, version in files.items():
+            if filename not in touched:
+                self.assertEqual(ems_core.ChangeBus.file_version(filename), version, filename)
+
+        self.assertEqual(ScoreStats.for_exam('e_stats1')['count'], 2)
+        self.assertEqual(ScoreStats.for_exam('e_stats1')['mean'], 60.0)
+        self.assertEqual(ScoreStats.for_student('dora')['max'], 80.0)
+        before = (ScoreStats.for_exam('e_stats1'), ScoreStats.for_student('erin'))
+        ScoreStats.rebuild()
+        self.assertEqual((ScoreStats.for_exam('e_stats1'), ScoreStats.for_student('erin')), before)
+
+    def test_delete_exam_drops_its_statistics(self):
+        Database, Result, ScoreStats = ems_core.Database, ems_core.Result, ems_core.ScoreStats
+        Database.add_results([Result('fred', 'e_stats3', 70.0), Result('fred', 'e_stats4', 30.0)])
+
+        Database.delete_exam('e_stats3')
+
+        self.assertIsNone(ScoreStats.for_exam('e_stats3'))
+        self.assertEqual(ScoreStats.for_student('fred')['count'], 1)
+        self.assertEqual(ScoreStats.for_student('fred')['mean'], 30.0)
+
+
+    def test_rebuild_replaces_a_stale_old_directory(self):
+        Database, Result, ScoreStats = ems_core.Database, ems_core.Result, ems_core.ScoreStats
+        Database.add_result(Result('gina', 'e_stats5', 55.0))
+        os.makedirs(os.path.join('data', ScoreStats.DIRECTORY + '.old', 'leftover'), exist_ok=True)
+
+        ScoreStats.rebuild()
+
+        self.assertFalse(os.path.exists(os.path.join('data', ScoreStats.DIRECTORY + '.old')))
+        self.assertEqual(ScoreStats.for_exam('e_stats5')['count'], 1)
+
+    def test_results_added_during_a_rebuild_are_counted_once(self):
+        Database, Result, ScoreStats = ems_core.Database, ems_core.Result, ems_core.ScoreStats
+        Database.add_result(Result('hank', 'e_stats6', 20.0))
+        scanned, resume = threading.Event(), threading.Event()
+        iter_result_rows = Database.iter_result_rows
+
+        def slow_scan(*args, **kwargs):
+            rows = list(iter_result_rows(*args, **kwargs))
+            scanned.set()
+            resume.wait(5)
+            yield from rows
+
+        Database.iter_result_rows = slow_scan
+        try:
+            rebuild = threading.Thread(target=ScoreStats.rebuild)
+            rebuild.start()
+            # The append waits for the rebuild instead of landing in the
+            # directory it is about to replace
+            self.assertTrue(scanned.wait(5))
+            append = threading.Thread(
+                target=Database.add_result, args=(Result('hank', 'e_stats6', 60.0),))
+            append.start()
+            append.join(0.2)
+            resume.set()
+            rebuild.join(5)
+            append.join(5)
+        finally:
+            Database.iter_result_rows = iter_result_rows
+
+        self.assertEqual(ScoreStats.for_exam('e_stats6')['count'], 2)
+        self.assertEqual(ScoreStats.for_student('hank')['mean'], 40.0)
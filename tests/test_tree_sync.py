@@ -0,0 +1,85 @@
+# Set by the data_directory fixture in conftest.py
+ems_core = None
+
+
+class FakeTree:
+    # Just enough of ttk.Treeview for TreeSync
+    def __init__(self):
+        self.items = {}
+        self.children = []
+
+    def get_children(self):
+        return tuple(self.children)
+
+    def insert(self, parent, index, iid, values, tags):
+        self.children.insert(len(self.children) if index == 'end' else index, iid)
+        self.items[iid] = {'values': values, 'tags': tags}
+
+    def item(self, iid, values=None, tags=None):
+        if values is not None:
+            self.items[iid]['values'] = values
+        if tags is not None:
+            self.items[iid]['tags'] = tags
+
+    def move(self, iid, parent, index):
+        self.children.remove(iid)
+        self.children.insert(index, iid)
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.children.remove(iid)
+            del self.items[iid]
+
+    def stripes(self):
+        return [self.items[iid]['tags'][0] for iid in self.children]
+
+
+def zebra(count):
+    return ['evenrow' if i % 2 == 0 else 'oddrow' for i in range(count)]
+
+
+def test_apply_keeps_zebra_striping_after_middle_edits(gui):
+    tree = FakeTree()
+    sync = gui.TreeSync(tree)
+    sync.apply([(str(i), (i,)) for i in range(6)])
+    assert tree.stripes() == zebra(6)
+
+    sync.apply([(str(i), (i,)) for i in range(6) if i != 2])
+    assert tree.children == ['0', '1', '3', '4', '5']
+    assert tree.stripes() == zebra(5)
+
+    sync.apply([('0', (0,)), ('new', ('n',)), ('1', (1,)), ('3', (3,)), ('4', (4,)), ('5', (5,))])
+    assert tree.children == ['0', 'new', '1', '3', '4', '5']
+    assert tree.stripes() == zebra(6)
+
+    sync.apply([('5', (5,)), ('0', (0,))])
+    assert tree.children == ['5', '0']
+    assert tree.stripes() == zebra(2)
+
+
+def test_apply_events_touches_only_the_changed_rows(gui):
+    tree = FakeTree()
+    sync = gui.TreeSync(tree)
+    sync.apply([(str(i), (i,)) for i in range(4)], empty_values=('empty',))
+
+    def make_row(item):
+        return (item['id'], (item['value'],)) if item['value'] != 'hidden' else None
+
+    events = {
+        '1': ems_core.ChangeEvent('exam', '1', 'delete'),
+        '2': ems_core.ChangeEvent('exam', '2', 'update', {'id': '2', 'value': 'two'}),
+        '3': ems_core.ChangeEvent('exam', '3', 'update', {'id': '3', 'value': 'hidden'}),
+        '9': ems_core.ChangeEvent('exam', '9', 'insert', {'id': '9', 'value': 'nine'}),
+    }
+    assert sync.apply_events(events, make_row)
+    assert tree.children == ['0', '2', '9']
+    assert tree.items['2']['values'] == ('two',)
+    assert tree.stripes() == zebra(3)
+
+    # Emptying the list puts the empty row back
+    events = {iid: ems_core.ChangeEvent('exam', iid, 'delete') for iid in ('0', '2', '9')}
+    assert sync.apply_events(events, make_row)
+    assert tree.children == [gui.TreeSync.EMPTY_IID]
+
+    # An event without the written item asks the caller for a full reload
+    assert not sync.apply_events({'5': ems_core.ChangeEvent('exam', '5', 'update')}, make_row)